@@ -0,0 +1,1036 @@
+from main_app.extensions import db
+from hr_system.hr.models.hr_models import (
+    Employee, Department, Attendance, LateComputation, AttendanceImportBatch,
+    AttendanceImportJob, AttendancePunch, AttendanceDailySummary,
+    upsert_insert, late_upsert, compute_late_many, refresh_late_computations
+)
+from hr_system.hr.utils import unlock_xlsx
+from payroll_system.payroll.models.payroll_models import mark_payroll_changes
+from sqlalchemy import (
+    select, insert, update, delete, exists, and_, or_, func, case, literal, bindparam,
+    String, Integer, DateTime
+)
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from flask import current_app
+from datetime import datetime, time, timedelta
+from openpyxl import load_workbook
+import numpy as np
+import pandas as pd
+import io
+import multiprocessing
+import os
+import re
+import threading
+import uuid
+import zipfile
+
+
+# =========================================================
+# EMPLOYEE LOOKUP
+# =========================================================
+def load_employee_map():
+    """
+    id -> {"name", "department", "active"} for every employee, loaded in
+    one query so the parser never hits the database per line.
+    """
+    rows = (
+        db.session.query(
+            Employee.id, Employee.first_name, Employee.middle_name,
+            Employee.last_name, Employee.status, Department.name
+        )
+        .outerjoin(Department, Employee.department_id == Department.id)
+        .all()
+    )
+    return {
+        r.id: {
+            # Same format as Employee.get_full_name()
+            "name": f"{r.first_name} {r.middle_name or ''} {r.last_name}".strip(),
+            "department": r.name or "N/A",
+            "active": r.status == "Active",
+        }
+        for r in rows
+    }
+
+
+# =========================================================
+# WORKBOOK LINES
+# =========================================================
+def iter_sheet_lines(source, filename=None):
+    """
+    Yield each non-empty row of the first sheet as one space-joined line.
+    source is a path or a file-like object (then filename gives the type).
+    .xlsx is unlocked in memory and streamed with openpyxl read-only mode;
+    legacy .xls (which openpyxl cannot open) falls back to pandas.
+    """
+    name = filename or (source if isinstance(source, str) else "")
+    if name.lower().endswith(".xls"):
+        df = pd.read_excel(source, header=None)
+        rows = df.itertuples(index=False, name=None)
+        wb = None
+    else:
+        wb = load_workbook(unlock_xlsx(source), read_only=True, data_only=True)
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+
+    try:
+        for row in rows:
+            line = " ".join(str(x) for x in row if x is not None and str(x) != "nan").strip()
+            if line:
+                yield line
+    finally:
+        if wb is not None:
+            wb.close()
+
+
+# =========================================================
+# BIOMETRIC REPORT PARSER
+# =========================================================
+def _parse_user_line(line):
+    """'User ID: 12 Name: Juan Dela Cruz Department: IT' -> (id, name, dept)"""
+    uid_part = line.split("User ID:")[-1]
+    name_part = uid_part.split("Name:")
+    id_value = name_part[0].strip()
+
+    if len(name_part) > 1:
+        name_dept_part = name_part[1].split("Department:")
+        name = name_dept_part[0].strip()
+        dept = name_dept_part[1].strip() if len(name_dept_part) > 1 else "Unknown"
+    else:
+        name, dept = "Unknown", "Unknown"
+    return id_value, name, dept
+
+
+def _employee_key(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_biometric_lines(lines, employee_map):
+    """
+    State machine over the device report:
+      "Attendance date: ..."               -> sets the day for what follows
+      "User ID: .. Name: .. Department: .." -> starts an employee block
+      "08:01 17:05"                        -> time-in / time-out for that employee
+    Yields one preview record per times line.
+    """
+    current_id, current_name = None, None
+    attendance_date = None
+
+    for line in lines:
+        if "tabling date" in line.lower():
+            continue
+
+        if "Attendance date:" in line:
+            attendance_date = line.split(":")[-1].strip()
+            continue
+
+        if "User ID" in line and "Name" in line:
+            current_id, current_name, _ = _parse_user_line(line)
+            continue
+
+        if ":" in line:
+            times = line.split()
+            time_in = times[0] if len(times) > 0 else None
+            time_out = times[1] if len(times) > 1 else None
+
+            # Matched employees use the DB name / department, else the Excel name
+            emp = employee_map.get(_employee_key(current_id))
+            yield {
+                "Employee ID": current_id,
+                "Name": emp["name"] if emp else current_name or "Unknown",
+                "Department": emp["department"] if emp else "Unknown",
+                "Day": attendance_date or datetime.now().date().isoformat(),
+                "Time In": time_in if emp else None,
+                "Time Out": time_out if emp else None,
+                "Matched": emp is not None,
+            }
+
+
+def parse_biometric_workbook(filepath, employee_map=None):
+    """Stream preview records straight from an uploaded biometric report."""
+    if employee_map is None:
+        employee_map = load_employee_map()
+    return parse_biometric_lines(iter_sheet_lines(filepath), employee_map)
+
+
+def absent_records(employee_map, seen_ids, day=None):
+    """Active employees that have no matched line in the report."""
+    day = day or datetime.now().date().isoformat()
+    for emp_id, emp in employee_map.items():
+        if emp["active"] and emp_id not in seen_ids:
+            yield {
+                "Employee ID": emp_id,
+                "Name": emp["name"],
+                "Department": emp["department"],
+                "Day": day,
+                "Time In": None,
+                "Time Out": None,
+                "Matched": False,
+            }
+
+
+def _merge_preview(record_lists, employee_map):
+    """
+    Concatenate parsed records, dropping exact repeats (same employee,
+    day and times), then append the active employees missing from all of
+    them (marked absent). Returns (records, duplicates).
+    """
+    records, seen_ids, seen_rows = [], set(), set()
+    duplicates = 0
+    day = None
+
+    for record_list in record_lists:
+        for record in record_list:
+            emp_id = _employee_key(record["Employee ID"])
+            row_key = (emp_id, record["Day"], record["Time In"], record["Time Out"])
+            if emp_id is not None and row_key in seen_rows:
+                duplicates += 1
+                continue
+            seen_rows.add(row_key)
+
+            records.append(record)
+            day = record["Day"]
+            if record["Matched"]:
+                seen_ids.add(emp_id)
+
+    records.extend(absent_records(employee_map, seen_ids, day))
+    return records, duplicates
+
+
+def build_attendance_preview(filepath):
+    """
+    Full preview for an upload: parsed report lines followed by the active
+    employees missing from it (marked absent).
+    """
+    employee_map = load_employee_map()
+    records, _ = _merge_preview([parse_biometric_workbook(filepath, employee_map)], employee_map)
+    return records
+
+
+# =========================================================
+# MULTI-FILE / ZIP UPLOADS
+# =========================================================
+WORKBOOK_EXTENSIONS = {"xls", "xlsx"}
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def is_multi_upload(files):
+    """Several files, or a single ZIP archive."""
+    files = [f for f in files if f and f.filename]
+    return len(files) > 1 or (len(files) == 1 and files[0].filename.lower().endswith(".zip"))
+
+
+def collect_workbooks(files):
+    """
+    (filename, bytes) for every uploaded workbook, expanding ZIP archives.
+    Returns (workbooks, ignored file names).
+    """
+    workbooks, ignored = [], []
+    for f in files:
+        ext = f.filename.rsplit(".", 1)[-1].lower()
+        if ext == "zip":
+            with zipfile.ZipFile(f.stream) as zf:
+                for info in zf.infolist():
+                    name = os.path.basename(info.filename)
+                    if info.is_dir() or not name or name.startswith(".") or "__MACOSX" in info.filename:
+                        continue
+                    if name.rsplit(".", 1)[-1].lower() in WORKBOOK_EXTENSIONS:
+                        workbooks.append((name, zf.read(info)))
+                    else:
+                        ignored.append(name)
+        elif ext in WORKBOOK_EXTENSIONS:
+            workbooks.append((f.filename, f.read()))
+        else:
+            ignored.append(f.filename)
+    return workbooks, ignored
+
+
+def _get_parse_pool(max_workers=None):
+    """
+    One long-lived process pool for workbook parsing. Workers are started
+    with the spawn context, so they never inherit the web process's
+    threads, locks or database connections.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _parse_pool
+
+
+def _parse_workbook(filename, content, employee_map):
+    """Worker: parse one workbook held in memory (no database access)."""
+    lines = iter_sheet_lines(io.BytesIO(content), filename)
+    return list(parse_biometric_lines(lines, employee_map))
+
+
+def build_attendance_preview_many(workbooks, max_workers=None):
+    """
+    Combined preview for several workbooks. Each file is parsed on the
+    shared spawn-context parse pool, results are merged in upload order
+    and de-duplicated.
+    Returns (records, duplicates).
+    """
+    employee_map = load_employee_map()
+    if len(workbooks) < 2:
+        results = [_parse_workbook(name, content, employee_map) for name, content in workbooks]
+    else:
+        pool = _get_parse_pool(max_workers)
+        futures = [pool.submit(_parse_workbook, name, content, employee_map) for name, content in workbooks]
+        results = [f.result() for f in futures]
+
+    return _merge_preview(results, employee_map)
+
+
+# =========================================================
+# BULK WRITER
+# =========================================================
+ATTENDANCE_CHUNK_SIZE = 1000   # attendance rows per INSERT ... ON CONFLICT
+
+# Official hours, in seconds since midnight (same as Attendance.calculate_working_hours)
+WORK_START = 8 * 3600
+WORK_END = 17 * 3600
+
+
+def _parse_day(day, cache):
+    """'2025-03-03' or '2025-03-01 ~ 2025-03-07' -> list of dates."""
+    if day not in cache:
+        dates = []
+        if "~" in day:
+            start_str, end_str = day.split("~", 1)
+            start = pd.to_datetime(start_str.strip(), errors="coerce")
+            end = pd.to_datetime(end_str.strip(), errors="coerce")
+            if not pd.isna(start) and not pd.isna(end):
+                dates = [start.date() + timedelta(days=i) for i in range((end - start).days + 1)]
+        else:
+            single = pd.to_datetime(day.strip(), errors="coerce")
+            if not pd.isna(single):
+                dates = [single.date()]
+        cache[day] = dates
+    return cache[day]
+
+
+def _parse_times(values):
+    """Vectorized time parsing -> (list of time|None, seconds since midnight with NaN)."""
+    parsed = pd.to_datetime(
+        pd.Series([str(v) if v else None for v in values], dtype=object),
+        errors="coerce", format="mixed",
+    )
+    seconds = (parsed.dt.hour * 3600 + parsed.dt.minute * 60 + parsed.dt.second).to_numpy(dtype=float)
+    times = [None if pd.isna(t) else t.time() for t in parsed]
+    return times, seconds
+
+
+def _known_employee_ids(records):
+    """Employee ids referenced by the records that exist in the database."""
+    ids = sorted({_employee_key(r.get("Employee ID")) for r in records} - {None})
+    known = set()
+    for offset in range(0, len(ids), 500):
+        known.update(db.session.execute(
+            select(Employee.id).where(Employee.id.in_(ids[offset:offset + 500]))
+        ).scalars())
+    return known
+
+
+def working_hours_many(in_sec, out_sec):
+    """
+    Vectorized Attendance.calculate_working_hours over seconds since
+    midnight (NaN = missing): clamped to 8:00-17:00, minus the lunch hour
+    past 4 hours. Unrounded; callers round(x, 2) per value like the model.
+    """
+    in_sec = np.asarray(in_sec, dtype=float)
+    out_sec = np.asarray(out_sec, dtype=float)
+    both = ~np.isnan(in_sec) & ~np.isnan(out_sec)
+
+    start = np.maximum(np.nan_to_num(in_sec), WORK_START)
+    end = np.minimum(np.nan_to_num(out_sec), WORK_END)
+    hours = np.where(both & (end > start), (end - start) / 3600, 0.0)
+    return np.where(hours > 4, hours - 1, hours)
+
+
+def attendance_status_many(in_sec, late_hours, late_minutes):
+    """
+    The one status rule for punch-derived attendance, shared by import
+    and recompute: Absent without a time-in, Late when the late split is
+    non-zero (as in Attendance.check_late), Present otherwise.
+    """
+    late = (np.asarray(late_hours) > 0) | (np.asarray(late_minutes) > 0)
+    return np.where(np.isnan(in_sec), "Absent", np.where(late, "Late", "Present")).tolist()
+
+
+def compute_attendance_metrics(rows):
+    """
+    One vectorized pass over a batch: parses times and fills status,
+    working_hours and the late split used by late_computation.
+    Returns the late split arrays (late_hours, late_minutes, day_equivalent).
+    """
+    times_in, in_sec = _parse_times([r["time_in"] for r in rows])
+    times_out, out_sec = _parse_times([r["time_out"] for r in rows])
+
+    hours = working_hours_many(in_sec, out_sec)
+    late = compute_late_many(in_sec)
+    statuses = attendance_status_many(in_sec, late[0], late[1])
+
+    for i, r in enumerate(rows):
+        r["time_in"], r["time_out"] = times_in[i], times_out[i]
+        r["status"] = statuses[i]
+        r["working_hours"] = 0.0 if statuses[i] == "Absent" else round(float(hours[i]), 2)
+
+    return late
+
+
+def write_attendance(rows, overwrite=False, chunk_size=ATTENDANCE_CHUNK_SIZE, derived_only=False):
+    """
+    Bulk-write attendance rows with INSERT ... ON CONFLICT on
+    (employee_id, date): existing days are skipped, or updated when
+    overwrite is set. With derived_only, only existing rows whose status
+    is derived from punches (DERIVED_STATUSES) are overwritten; leave and
+    other curated statuses are skipped. Late computations and payroll
+    change marks are written for the affected rows. The caller commits.
+    Returns {"inserted", "updated", "skipped"}.
+    """
+    table = Attendance.__table__
+    connection = db.session.connection()
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+
+    for offset in range(0, len(rows), chunk_size):
+        chunk = rows[offset:offset + chunk_size]
+        compute_attendance_metrics(chunk)
+
+        keys = {(r["employee_id"], r["date"]) for r in chunk}
+        dates = [d for _, d in keys]
+        existing_status = {
+            (row.employee_id, row.date): row.status
+            for row in connection.execute(
+                select(table.c.employee_id, table.c.date, table.c.status).where(
+                    table.c.employee_id.in_({e for e, _ in keys}),
+                    table.c.date.between(min(dates), max(dates)),
+                )
+            )
+            if (row.employee_id, row.date) in keys
+        }
+        existing = set(existing_status)
+
+        stmt = upsert_insert(connection, table)
+        if overwrite:
+            curated = set()
+            derived = None
+            if derived_only:
+                curated = {k for k, status in existing_status.items()
+                           if status is not None and status not in DERIVED_STATUSES}
+                derived = or_(table.c.status.is_(None), *(table.c.status == s for s in DERIVED_STATUSES))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.employee_id, table.c.date],
+                set_={c: stmt.excluded[c] for c in ("time_in", "time_out", "status", "working_hours")},
+                where=derived,
+            )
+            if curated:
+                chunk = [r for r in chunk if (r["employee_id"], r["date"]) not in curated]
+            written = keys - curated
+            counts["updated"] += len(existing - curated)
+            counts["skipped"] += len(curated)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[table.c.employee_id, table.c.date])
+            written = keys - existing
+            counts["skipped"] += len(existing)
+        if chunk:
+            connection.execute(stmt, [dict(r, remarks="") for r in chunk])
+        counts["inserted"] += len(keys - existing)
+
+        # Core inserts bypass the flush listeners (late computation, payroll changes)
+        refresh_late_computations(connection, [
+            a.id for a in connection.execute(
+                select(table.c.id, table.c.employee_id, table.c.date).where(
+                    table.c.employee_id.in_({e for e, _ in written}),
+                    table.c.date.between(min(dates), max(dates)),
+                )
+            ) if (a.employee_id, a.date) in written
+        ] if written else [])
+        mark_payroll_changes(connection, attendance_keys=written)
+
+    return counts
+
+
+# =========================================================
+# BULK RECOMPUTE (schedule rule changes)
+# =========================================================
+RECOMPUTE_CHUNK_SIZE = 5000
+DERIVED_STATUSES = ("Present", "Late", "Absent")   # other statuses (e.g. leave) are kept
+
+
+def _seconds(values):
+    return np.array(
+        [np.nan if t is None else t.hour * 3600 + t.minute * 60 + t.second for t in values],
+        dtype=float,
+    )
+
+
+def recompute_attendance(start_date, end_date, department_id=None,
+                         chunk_size=RECOMPUTE_CHUNK_SIZE, progress=None):
+    """
+    Re-derive status, working_hours and late_computation for every
+    attendance row in [start_date, end_date] (optionally one department)
+    with the current rules. Rows are read in id order, chunk by chunk;
+    each chunk is computed in one numpy pass, changed rows are updated
+    with one executemany, late rows are refreshed and the chunk is
+    committed. progress(done, total) is called after each chunk.
+    Returns {"rows", "updated", "late"}.
+    """
+    att = Attendance.__table__
+    emp = Employee.__table__
+    connection = db.session.connection()
+
+    scope = [att.c.date.between(start_date, end_date)]
+    if department_id is not None:
+        scope.append(att.c.employee_id.in_(select(emp.c.id).where(emp.c.department_id == department_id)))
+
+    total = connection.execute(select(func.count()).select_from(att).where(*scope)).scalar()
+    result = {"rows": 0, "updated": 0, "late": 0}
+    last_id = 0
+
+    while True:
+        rows = connection.execute(
+            select(att.c.id, att.c.employee_id, att.c.date, att.c.time_in,
+                   att.c.time_out, att.c.status, att.c.working_hours)
+            .where(*scope, att.c.id > last_id)
+            .order_by(att.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        in_sec = _seconds(r.time_in for r in rows)
+        hours = working_hours_many(in_sec, _seconds(r.time_out for r in rows))
+        late_hours, late_minutes, _ = compute_late_many(in_sec)
+        derived = attendance_status_many(in_sec, late_hours, late_minutes)
+
+        changes = []
+        for i, r in enumerate(rows):
+            status = r.status
+            if status in DERIVED_STATUSES or status is None:
+                status = derived[i]
+            working_hours = 0.0 if status == "Absent" else round(float(hours[i]), 2)
+            if status != r.status or working_hours != r.working_hours:
+                changes.append({"_id": r.id, "status": status, "working_hours": working_hours})
+
+        if changes:
+            connection.execute(
+                update(att).where(att.c.id == bindparam("_id"))
+                .values(status=bindparam("status"), working_hours=bindparam("working_hours")),
+                changes,
+            )
+            by_id = {r.id: r for r in rows}
+            mark_payroll_changes(connection, attendance_keys={
+                (by_id[c["_id"]].employee_id, by_id[c["_id"]].date) for c in changes
+            })
+        refresh_late_computations(connection, [r.id for r in rows])
+
+        result["rows"] += len(rows)
+        result["updated"] += len(changes)
+        result["late"] += int(np.count_nonzero(late_hours + late_minutes))
+        db.session.commit()
+        connection = db.session.connection()
+        if progress:
+            progress(result["rows"], total)
+
+    return result
+
+
+# =========================================================
+# STAGING (attendance_import_batch)
+# =========================================================
+STAGING_CHUNK_SIZE = 1000             # staged rows per INSERT
+STAGING_MAX_AGE = timedelta(days=1)  # unconfirmed batches older than this are purged
+PREVIEW_PAGE_SIZE = 50               # staged rows per preview page
+
+
+def stage_attendance_batch(records, created_by=None, chunk_size=STAGING_CHUNK_SIZE):
+    """
+    Write preview records to attendance_import_batch under a new batch id.
+    Day ranges are expanded to one row per date, metrics are computed per
+    chunk, and a later row for the same employee and date replaces an
+    earlier one. Rows for unknown employees or unreadable days are kept
+    for the preview with employee_id / date NULL. The caller commits.
+    Returns the batch id.
+    """
+    purge_stale_attendance_batches()
+
+    records = list(records)
+    known_ids = _known_employee_ids(records)
+    batch_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+
+    day_cache, staged = {}, {}
+    for i, r in enumerate(records):
+        emp_id = _employee_key(r.get("Employee ID"))
+        day = r.get("Day")
+        base = {
+            "batch_id": batch_id,
+            "employee_ref": None if r.get("Employee ID") is None else str(r.get("Employee ID")),
+            "name": r.get("Name"),
+            "department": r.get("Department"),
+            "day": None if day is None else str(day),
+            "matched": bool(r.get("Matched")),
+            "time_in": r.get("Time In"),
+            "time_out": r.get("Time Out"),
+            "created_by": created_by,
+            "created_at": now,
+        }
+
+        dates = []
+        if emp_id in known_ids and day and "Tabling" not in str(day):
+            dates = _parse_day(str(day), day_cache)
+        if not dates:
+            staged[("row", i)] = dict(base, employee_id=None, date=None)
+        for att_date in dates:
+            staged[(emp_id, att_date)] = dict(base, employee_id=emp_id, date=att_date)
+
+    rows = list(staged.values())
+    table = AttendanceImportBatch.__table__
+    for offset in range(0, len(rows), chunk_size):
+        chunk = rows[offset:offset + chunk_size]
+        late_hours, late_minutes, day_equivalent = compute_attendance_metrics(chunk)
+        for j, r in enumerate(chunk):
+            r["late_hours"] = int(late_hours[j])
+            r["late_minutes"] = int(late_minutes[j])
+            r["day_equivalent"] = float(day_equivalent[j])
+            r["already_exists"] = False
+        db.session.execute(insert(table), chunk)
+
+    return batch_id
+
+
+def attendance_batch_page(batch_id, page=1, per_page=PREVIEW_PAGE_SIZE):
+    """One page of a staged batch, in upload order."""
+    return (
+        AttendanceImportBatch.query
+        .filter_by(batch_id=batch_id)
+        .order_by(AttendanceImportBatch.id)
+        .paginate(page=page, per_page=per_page, error_out=False)
+    )
+
+
+def commit_attendance_batch(batch_id, overwrite=False):
+    """
+    Copy a staged batch into attendance with one INSERT ... SELECT ...
+    ON CONFLICT (skip, or update when overwrite is set), then upsert the
+    late computations from the same staging rows and drop the batch.
+    The caller commits. Returns {"inserted", "updated", "skipped"}, which
+    are also recorded on the import job that staged the batch.
+    """
+    staging = AttendanceImportBatch.__table__
+    att = Attendance.__table__
+    connection = db.session.connection()
+    now = datetime.utcnow()
+
+    in_batch = staging.c.batch_id == batch_id
+    importable = and_(in_batch, staging.c.employee_id.isnot(None), staging.c.date.isnot(None))
+    same_day = and_(att.c.employee_id == staging.c.employee_id, att.c.date == staging.c.date)
+
+    connection.execute(
+        update(staging).where(importable).values(already_exists=exists().where(same_day))
+    )
+    total, ready, existing = connection.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(case((staging.c.employee_id.isnot(None) & staging.c.date.isnot(None), 1), else_=0)), 0),
+            func.coalesce(func.sum(case((staging.c.already_exists.is_(True), 1), else_=0)), 0),
+        ).where(in_batch)
+    ).one()
+
+    columns = ["employee_id", "date", "time_in", "time_out", "status", "working_hours"]
+    stmt = upsert_insert(connection, att).from_select(
+        columns + ["remarks", "created_at"],
+        select(
+            *[staging.c[c] for c in columns],
+            literal("", String).label("remarks"),
+            literal(now, DateTime).label("created_at"),
+        ).where(importable),
+    )
+    if overwrite:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[att.c.employee_id, att.c.date],
+            set_={c: stmt.excluded[c] for c in ("time_in", "time_out", "status", "working_hours")},
+        )
+        written = importable
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[att.c.employee_id, att.c.date])
+        written = and_(importable, staging.c.already_exists.is_(False))
+    connection.execute(stmt)
+
+    late = LateComputation.__table__
+    connection.execute(late_upsert(upsert_insert(connection, late).from_select(
+        ["employee_id", "attendance_id", "date", "late_days", "late_hours",
+         "late_minutes", "day_equivalent", "remarks", "created_at"],
+        select(
+            staging.c.employee_id, att.c.id, staging.c.date, literal(0, Integer),
+            staging.c.late_hours, staging.c.late_minutes, staging.c.day_equivalent,
+            literal("Auto-generated from attendance", String), literal(now, DateTime),
+        )
+        .join_from(staging, att, same_day)
+        .where(written, (staging.c.late_hours > 0) | (staging.c.late_minutes > 0)),
+    )))
+    if overwrite:
+        # Overwritten days that are no longer late
+        connection.execute(delete(late).where(late.c.attendance_id.in_(
+            select(att.c.id).join_from(staging, att, same_day)
+            .where(written, staging.c.late_hours == 0, staging.c.late_minutes == 0)
+        )))
+
+    # INSERT ... SELECT bypasses the flush listeners that track payroll changes
+    mark_payroll_changes(connection, attendance_keys=[
+        (k.employee_id, k.date)
+        for k in connection.execute(select(staging.c.employee_id, staging.c.date).where(written))
+    ])
+
+    counts = {
+        "inserted": ready - existing,
+        "updated": existing if overwrite else 0,
+        "skipped": (total - ready) + (0 if overwrite else existing),
+    }
+    # Report the outcome on the background job that staged the batch, if any
+    db.session.execute(
+        update(AttendanceImportJob.__table__)
+        .where(AttendanceImportJob.batch_id == batch_id)
+        .values(rows_inserted=counts["inserted"], rows_updated=counts["updated"],
+                rows_skipped=counts["skipped"], updated_at=now)
+    )
+
+    discard_attendance_batch(batch_id)
+    return counts
+
+
+def discard_attendance_batch(batch_id):
+    """Drop a staged batch (no-op for None)."""
+    if batch_id:
+        db.session.execute(
+            delete(AttendanceImportBatch.__table__).where(AttendanceImportBatch.batch_id == batch_id)
+        )
+
+
+def purge_stale_attendance_batches(max_age=STAGING_MAX_AGE):
+    """Drop batches that were uploaded but never confirmed."""
+    db.session.execute(
+        delete(AttendanceImportBatch.__table__)
+        .where(AttendanceImportBatch.created_at < datetime.utcnow() - max_age)
+    )
+
+
+# =========================================================
+# RAW PUNCH LOGS (CSV / TXT / .dat)
+# =========================================================
+PUNCH_LOG_EXTENSIONS = {"csv", "txt", "dat"}
+PUNCH_CHUNK_SIZE = 5000
+PUNCH_EPOCH = datetime(1970, 1, 1)
+SECONDS_PER_DAY = 86400
+PUNCH_FLAG_CODES = {"in": 0, "out": 1}
+
+# "<user id> <yyyy-mm-dd hh:mm[:ss]> [field ...]", separated by tabs, commas, semicolons or spaces
+PUNCH_LINE = re.compile(
+    r"^\s*(\d+)[\s,;]+(\d{4}[-/]\d{1,2}[-/]\d{1,2}[ T]\d{1,2}:\d{2}(?::\d{2})?)\s*[,;]?\s*(.*)$"
+)
+PUNCH_TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M")
+IN_FLAGS = {"0", "i", "in", "c/in", "check in", "checkin"}
+OUT_FLAGS = {"1", "o", "out", "c/out", "check out", "checkout"}
+
+
+def _parse_punch_time(text):
+    text = text.replace("/", "-").replace("T", " ")
+    for fmt in PUNCH_TIME_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def iter_punch_log(lines, flag_field=0, stats=None):
+    """
+    Yield (employee_id, timestamp, flag) for each punch line, flag being
+    "in", "out" or None. flag_field is the position of the in/out flag
+    among the fields after the timestamp (ZKTeco attlog .dat files: 1,
+    after the verify mode). Header and malformed lines are counted and skipped.
+    """
+    stats = stats if stats is not None else {}
+    for line in lines:
+        match = PUNCH_LINE.match(line)
+        if not match:
+            if line.strip():
+                stats["malformed"] = stats.get("malformed", 0) + 1
+            continue
+
+        ts = _parse_punch_time(match.group(2))
+        if ts is None:
+            stats["malformed"] = stats.get("malformed", 0) + 1
+            continue
+
+        fields = [f.strip().lower() for f in re.split(r"[\t,;]+|\s{2,}", match.group(3).strip()) if f.strip()]
+        raw_flag = fields[flag_field] if len(fields) > flag_field else None
+        flag = "in" if raw_flag in IN_FLAGS else "out" if raw_flag in OUT_FLAGS else None
+
+        stats["punches"] = stats.get("punches", 0) + 1
+        yield int(match.group(1)), ts, flag
+
+
+def punch_epoch(ts):
+    """Device wall-clock datetime -> seconds since 1970-01-01 00:00 (no timezone shift)."""
+    return int((ts - PUNCH_EPOCH).total_seconds())
+
+
+def store_punches(connection, rows):
+    """
+    Append raw punches, ignoring ones already stored (same employee,
+    second and device). Returns (new punch count, the (employee_id, day
+    number) keys that received at least one new punch).
+    """
+    if not rows:
+        return 0, set()
+    table = AttendancePunch.__table__
+    stmt = (
+        upsert_insert(connection, table)
+        .on_conflict_do_nothing(index_elements=["employee_id", "punched_at", "device_id"])
+        .returning(table.c.employee_id, table.c.punched_at)
+    )
+    inserted = connection.execute(stmt, rows).all()
+    return len(inserted), {(emp_id, punched_at // SECONDS_PER_DAY) for emp_id, punched_at in inserted}
+
+
+def rebuild_daily_summaries(connection, day_keys):
+    """
+    Recompute attendance_daily_summary for the given (employee_id, day
+    number) keys from every stored punch of those days: first "in" punch
+    (else first punch) and last "out" punch (else last punch).
+    Returns the rebuilt days as attendance rows.
+    """
+    if not day_keys:
+        return []
+    emp_ids = sorted({k[0] for k in day_keys})
+    days = [k[1] for k in day_keys]
+    punches = pd.DataFrame(
+        connection.execute(
+            select(AttendancePunch.employee_id, AttendancePunch.punched_at, AttendancePunch.flag)
+            .where(
+                AttendancePunch.employee_id.in_(emp_ids),
+                AttendancePunch.punched_at >= min(days) * SECONDS_PER_DAY,
+                AttendancePunch.punched_at < (max(days) + 1) * SECONDS_PER_DAY,
+            )
+        ).all(),
+        columns=["employee_id", "punched_at", "flag"],
+    )
+    punches["day"] = punches["punched_at"] // SECONDS_PER_DAY
+    punches = punches.merge(pd.DataFrame(list(day_keys), columns=["employee_id", "day"]))
+
+    grouped = punches.groupby(["employee_id", "day"])
+    summary = pd.DataFrame({
+        "first": grouped["punched_at"].min(),
+        "last": grouped["punched_at"].max(),
+        "count": grouped["punched_at"].size(),
+        "first_in": punches[punches["flag"] == 0].groupby(["employee_id", "day"])["punched_at"].min(),
+        "last_out": punches[punches["flag"] == 1].groupby(["employee_id", "day"])["punched_at"].max(),
+    }).reset_index()
+
+    time_in = summary["first_in"].fillna(summary["first"]).to_numpy()
+    time_out = summary["last_out"].fillna(summary["last"]).to_numpy()
+    time_out = np.where(time_out != time_in, time_out, np.nan)
+
+    def clock(seconds):
+        if np.isnan(seconds):
+            return None
+        seconds = int(seconds) % SECONDS_PER_DAY
+        return time(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "employee_id": int(emp_id),
+            "date": (PUNCH_EPOCH + timedelta(days=int(day))).date(),
+            "time_in": clock(t_in),
+            "time_out": clock(t_out),
+            "punch_count": int(count),
+            "updated_at": now,
+        }
+        for emp_id, day, t_in, t_out, count in zip(
+            summary["employee_id"], summary["day"], time_in, time_out, summary["count"]
+        )
+    ]
+
+    table = AttendanceDailySummary.__table__
+    stmt = upsert_insert(connection, table)
+    connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["employee_id", "date"],
+            set_={c: stmt.excluded[c] for c in ("time_in", "time_out", "punch_count", "updated_at")},
+        ),
+        rows,
+    )
+    return [{k: row[k] for k in ("employee_id", "date", "time_in", "time_out")} for row in rows]
+
+
+def ingest_punch_log(filepath, device_id=0, chunk_size=PUNCH_CHUNK_SIZE, progress=None):
+    """
+    Stream a raw punch log: lines -> attendance_punch (append-only) ->
+    daily summaries of the employee-days that got new punches ->
+    attendance, overwritten from the summary. Re-importing the same log
+    changes nothing; a log that adds punches to a day recomputes that
+    day from all of its punches, unless the day's attendance carries a
+    leave or other non-derived status. Only one chunk is held in memory.
+    The caller commits; progress(counts) is called after each chunk.
+    Returns the writer counts plus punches / duplicates / malformed / unknown.
+    """
+    stats = {"punches": 0, "duplicates": 0, "malformed": 0, "unknown": 0}
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    known_ids = set(db.session.execute(select(Employee.id)).scalars())
+    flag_field = 1 if filepath.lower().endswith(".dat") else 0
+    connection = db.session.connection()
+
+    def flush(buffer):
+        inserted, day_keys = store_punches(connection, buffer)
+        stats["duplicates"] += len(buffer) - inserted
+        rows = rebuild_daily_summaries(connection, day_keys)
+
+        known = [row for row in rows if row["employee_id"] in known_ids]
+        stats["unknown"] += len(rows) - len(known)
+        # Days marked as leave (or otherwise curated) keep their attendance row
+        for key, value in write_attendance(known, overwrite=True, derived_only=True).items():
+            counts[key] += value
+        buffer.clear()
+        if progress:
+            progress(dict(counts, **stats))
+
+    with open(filepath, encoding="utf-8-sig", errors="replace") as fh:
+        buffer = []
+        for emp_id, ts, flag in iter_punch_log(fh, flag_field, stats):
+            buffer.append({
+                "employee_id": emp_id,
+                "punched_at": punch_epoch(ts),
+                "device_id": device_id,
+                "flag": PUNCH_FLAG_CODES.get(flag),
+            })
+            if len(buffer) >= chunk_size:
+                flush(buffer)
+        if buffer:
+            flush(buffer)
+
+    counts.update(stats)
+    return counts
+
+
+# =========================================================
+# BACKGROUND IMPORT JOBS
+# =========================================================
+# Uploads are parsed / ingested on a small thread pool inside the web
+# process; the import pages poll the job row for progress.
+JOB_STALE_AFTER = timedelta(hours=1)   # unfinished jobs not updated since then were interrupted
+
+_job_pool = None
+_job_pool_lock = threading.Lock()
+
+
+def _get_job_pool(max_workers=None):
+    global _job_pool
+    with _job_pool_lock:
+        if _job_pool is None:
+            _job_pool = ThreadPoolExecutor(
+                max_workers=max_workers or 2, thread_name_prefix="attendance-import"
+            )
+        return _job_pool
+
+
+def start_attendance_import_job(kind, filename=None, started_by=None):
+    """Create and commit a Pending job row ("workbook" or "punch_log")."""
+    # A restart loses queued work; stop the pages from polling those jobs forever
+    db.session.execute(
+        update(AttendanceImportJob.__table__)
+        .where(AttendanceImportJob.status.in_(("Pending", "Running")),
+               AttendanceImportJob.updated_at < datetime.utcnow() - JOB_STALE_AFTER)
+        .values(status="Failed", error="Interrupted before it finished.", finished_at=datetime.utcnow())
+    )
+    job = AttendanceImportJob(kind=kind, filename=filename, status="Pending", started_by=started_by)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def submit_attendance_import_job(job, source):
+    """
+    Queue a job on the worker pool. source is the saved upload path, or
+    a list of (name, bytes) workbooks for multi-file / ZIP uploads.
+    """
+    app = current_app._get_current_object()
+    _get_job_pool(app.config.get("ATTENDANCE_JOB_WORKERS")).submit(
+        _run_attendance_import_job, app, job.id, source
+    )
+
+
+def _run_attendance_import_job(app, job_id, source):
+    with app.app_context():
+        job = db.session.get(AttendanceImportJob, job_id)
+        job.status = "Running"
+        db.session.commit()
+        try:
+            execute_attendance_import_job(job, source)
+            job.status = "Completed"
+        except Exception as e:
+            app.logger.exception(f"Attendance import job {job_id} failed")
+            db.session.rollback()
+            job = db.session.get(AttendanceImportJob, job_id)
+            job.status = "Failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            if isinstance(source, str) and os.path.exists(source):
+                os.remove(source)
+
+
+def execute_attendance_import_job(job, source):
+    """
+    Do the work of one job in the current app context, committing progress
+    as it goes. Workbook jobs stage a preview batch (job.batch_id) that
+    the user confirms; punch-log jobs write attendance directly.
+    """
+    if job.kind == "punch_log":
+        def progress(counts):
+            job.rows_parsed = counts["punches"]
+            job.rows_matched = counts["inserted"] + counts["updated"] + counts["skipped"]
+            job.rows_inserted = counts["inserted"]
+            job.rows_updated = counts["updated"]
+            job.rows_skipped = counts["skipped"] + counts["unknown"]
+            db.session.commit()
+
+        counts = ingest_punch_log(source, progress=progress)
+        progress(counts)
+        job.message = (
+            f"Read {counts['punches']} punch(es) ({counts['duplicates']} already stored). "
+            f"Imported {counts['inserted']} new, updated {counts['updated']} and skipped "
+            f"{counts['skipped'] + counts['unknown']} attendance record(s)."
+        )
+        return
+
+    if isinstance(source, str):
+        records, duplicates = build_attendance_preview(source), 0
+        message = "Preview loaded. Please confirm import."
+    else:
+        records, duplicates = build_attendance_preview_many(
+            source, max_workers=current_app.config.get("ATTENDANCE_IMPORT_WORKERS")
+        )
+        message = (
+            f"Preview loaded from {len(source)} file(s): {duplicates} duplicate row(s) removed. "
+            f"Please confirm import."
+        )
+    if not records:
+        raise ValueError("No valid attendance records found. Please check the Excel format.")
+
+    job.rows_parsed = len(records)
+    job.rows_matched = sum(1 for r in records if r["Matched"])
+    db.session.commit()
+
+    job.batch_id = stage_attendance_batch(records, created_by=job.started_by)
+    job.message = message
@@ -0,0 +1,92 @@
+from main_app.extensions import db
+from hr_system.hr.models.hr_models import Holiday
+from sqlalchemy import select, func, extract, cast, Float
+from datetime import date
+import numpy as np
+
+
+# =========================================================
+# BUSINESS CALENDAR (Mon-Fri minus holidays)
+# =========================================================
+class BusinessCalendar:
+    """
+    Working-day prefix sums over [start, end]:
+    prefix[i] = working days in start .. start + i - 1, so any range
+    count is one subtraction.
+    """
+
+    def __init__(self, start, end, holidays=()):
+        self.start = start
+        self.end = end
+        self.holidays = sorted(holidays)
+
+        days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+        working = np.is_busday(days, holidays=np.array(self.holidays, dtype="datetime64[D]"))
+        self.prefix = np.concatenate(([0], np.cumsum(working, dtype=np.int64)))
+
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+
+    def working_days(self, start, end):
+        """Working days from start to end inclusive."""
+        if start > end:
+            return 0
+        return int(self.prefix[(end - self.start).days + 1] - self.prefix[(start - self.start).days])
+
+    def is_working_day(self, day):
+        return self.working_days(day, day) == 1
+
+
+# =========================================================
+# CACHE
+# =========================================================
+# Built for whole years and widened on demand; rebuilt when the holiday
+# version changes, so edits made by other processes are picked up too
+_calendar = {"version": None, "calendar": None}
+
+
+def holiday_version(session=None):
+    """Cheap version of the holiday table: row count, max id and a date checksum (one query)."""
+    session = session or db.session
+    holiday = Holiday.__table__
+    day = (extract("year", holiday.c.date) * 10000 + extract("month", holiday.c.date) * 100
+           + extract("day", holiday.c.date))
+    return tuple(session.execute(select(
+        func.count(), func.max(holiday.c.id), cast(func.sum((holiday.c.id + 1) * day), Float)
+    )).one())
+
+
+def get_business_calendar(start, end):
+    """Cached calendar covering at least [start, end]."""
+    version = holiday_version()
+    if _calendar["version"] != version:
+        _calendar.update(version=version, calendar=None)
+
+    calendar = _calendar["calendar"]
+    if calendar is not None and calendar.covers(start, end):
+        return calendar
+
+    if calendar is not None:
+        start, end = min(start, calendar.start), max(end, calendar.end)
+    start, end = date(start.year, 1, 1), date(end.year, 12, 31)
+
+    holidays = [
+        h.date for h in db.session.query(Holiday.date)
+        .filter(Holiday.date >= start, Holiday.date <= end)
+    ]
+    calendar = _calendar["calendar"] = BusinessCalendar(start, end, holidays)
+    return calendar
+
+
+# =========================================================
+# PUBLIC HELPERS
+# =========================================================
+def working_days_between(start_date, end_date):
+    """Working days (weekdays that are not holidays) from start to end inclusive."""
+    if start_date > end_date:
+        return 0
+    return get_business_calendar(start_date, end_date).working_days(start_date, end_date)
+
+
+def is_working_day(day):
+    return get_business_calendar(day, day).is_working_day(day)
@@ -1,6 +1,10 @@
 from main_app.extensions import db
 from datetime import datetime, date, time
-from sqlalchemy import event
+from itertools import chain
+from sqlalchemy import event, select, delete
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import sqlite, postgresql
+import numpy as np
 # =========================================================
 # HR MODELS
 # =========================================================
@@ -118,6 +122,9 @@ class Employee(db.Model):
 # =========================================================
 class Attendance(db.Model):
     __tablename__ = "attendance"
+    __table_args__ = (
+        db.Index("uq_attendance_employee_date", "employee_id", "date", unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey("employee.id"), nullable=False)
@@ -315,6 +322,141 @@ class LeaveCredit(db.Model):
 
 
 
+# =========================================================
+# BUSINESS CALENDAR (holidays)
+# =========================================================
+class Holiday(db.Model):
+    __tablename__ = "holiday"
+
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    holiday_type = db.Column(db.String(50), default="Regular")   # Regular, Special
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Holiday {self.date} {self.name}>"
+
+
+
+# =========================================================
+# ATTENDANCE IMPORT STAGING
+# =========================================================
+class AttendanceImportBatch(db.Model):
+    """One parsed upload row, kept server-side until the import is confirmed."""
+    __tablename__ = "attendance_import_batch"
+
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.String(32), nullable=False, index=True)
+
+    # As shown in the preview
+    employee_ref = db.Column(db.String(50))                 # ID as written in the file
+    name = db.Column(db.String(255))
+    department = db.Column(db.String(100))
+    day = db.Column(db.String(50))
+    matched = db.Column(db.Boolean, default=False)
+
+    # Ready to copy into attendance (employee_id / date NULL -> not importable)
+    employee_id = db.Column(db.Integer, db.ForeignKey("employee.id"))
+    date = db.Column(db.Date)
+    time_in = db.Column(db.Time)
+    time_out = db.Column(db.Time)
+    status = db.Column(db.String(50))
+    working_hours = db.Column(db.Float, default=0.0)
+    late_hours = db.Column(db.Integer, default=0)
+    late_minutes = db.Column(db.Integer, default=0)
+    day_equivalent = db.Column(db.Float, default=0.0)
+    already_exists = db.Column(db.Boolean, default=False)   # set when the batch is confirmed
+
+    created_by = db.Column(db.Integer, db.ForeignKey("user.id"))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<AttendanceImportBatch {self.batch_id} {self.employee_ref} {self.day}>"
+
+
+class AttendanceImportJob(db.Model):
+    """An upload parsed / ingested in the background, polled by the import pages."""
+    __tablename__ = "attendance_import_job"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)                # workbook, punch_log
+    filename = db.Column(db.String(255))
+    status = db.Column(db.String(20), default="Pending")           # Pending, Running, Failed, Completed
+
+    rows_parsed = db.Column(db.Integer, nullable=False, default=0)
+    rows_matched = db.Column(db.Integer, nullable=False, default=0)
+    rows_inserted = db.Column(db.Integer, nullable=False, default=0)
+    rows_updated = db.Column(db.Integer, nullable=False, default=0)
+    rows_skipped = db.Column(db.Integer, nullable=False, default=0)
+
+    batch_id = db.Column(db.String(32), index=True)                # staged preview (workbook jobs)
+    message = db.Column(db.String(255))
+    error = db.Column(db.Text)
+    started_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "filename": self.filename,
+            "status": self.status,
+            "rows_parsed": self.rows_parsed,
+            "rows_matched": self.rows_matched,
+            "rows_inserted": self.rows_inserted,
+            "rows_updated": self.rows_updated,
+            "rows_skipped": self.rows_skipped,
+            "message": self.message,
+            "error": self.error,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<AttendanceImportJob {self.id} {self.kind} {self.status}>"
+
+
+# =========================================================
+# RAW PUNCHES (append-only) + DAILY SUMMARY
+# =========================================================
+class AttendancePunch(db.Model):
+    """
+    One raw device punch, never updated or deleted. punched_at is the
+    device wall-clock time as seconds since 1970-01-01 00:00, so
+    punched_at // 86400 is the day number.
+    """
+    __tablename__ = "attendance_punch"
+    __table_args__ = (
+        db.UniqueConstraint("employee_id", "punched_at", "device_id", name="uq_attendance_punch"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, nullable=False)            # device user id
+    punched_at = db.Column(db.Integer, nullable=False)
+    device_id = db.Column(db.SmallInteger, nullable=False, default=0)
+    flag = db.Column(db.SmallInteger)                               # 0 = in, 1 = out, NULL = unknown
+
+    def __repr__(self):
+        return f"<AttendancePunch {self.employee_id} @ {self.punched_at}>"
+
+
+class AttendanceDailySummary(db.Model):
+    """First-in / last-out per employee-day, rebuilt from attendance_punch."""
+    __tablename__ = "attendance_daily_summary"
+
+    employee_id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    time_in = db.Column(db.Time)
+    time_out = db.Column(db.Time)
+    punch_count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<AttendanceDailySummary {self.employee_id} {self.date}>"
+
+
 # =========================================================
 # CONSTANTS (MATCHES EXCEL FILE)
 # =========================================================
@@ -403,34 +545,97 @@ def extract_late_from_attendance(attendance: Attendance):
 
 
 # =========================================================
-# EVENT LISTENER – AUTO CREATE / UPDATE LATE RECORD
+# BATCH LATE COMPUTATION
 # =========================================================
-@event.listens_for(Attendance, "after_insert")
-@event.listens_for(Attendance, "after_update")
-def generate_late_computation(mapper, connection, target):
-    late_data = extract_late_from_attendance(target)
+OFFICIAL_TIME_IN = 8 * 3600     # 8:00 AM, seconds since midnight
 
-    if not late_data:
+_UPSERT_INSERT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def upsert_insert(connection, table):
+    """Dialect insert() that supports on_conflict_do_nothing / _update."""
+    return _UPSERT_INSERT[connection.dialect.name](table)
+
+
+def late_upsert(stmt):
+    """ON CONFLICT (attendance_id) refreshes the late split of an existing row."""
+    return stmt.on_conflict_do_update(
+        index_elements=[LateComputation.__table__.c.attendance_id],
+        set_={
+            "late_hours": stmt.excluded.late_hours,
+            "late_minutes": stmt.excluded.late_minutes,
+            "day_equivalent": stmt.excluded.day_equivalent,
+            "remarks": "Updated from attendance",
+        },
+    )
+
+
+def compute_late_many(time_in_seconds):
+    """
+    Vectorized extract_late_from_attendance.
+    time_in_seconds: seconds since midnight, NaN for no time-in.
+    Returns (late_hours, late_minutes, day_equivalent) arrays, zero when on time.
+    """
+    seconds = np.asarray(time_in_seconds, dtype=float)
+    late = seconds > OFFICIAL_TIME_IN
+    total = np.where(late, (np.where(late, seconds, 0) - OFFICIAL_TIME_IN) // 60, 0).astype(int)
+    hours, minutes = total // 60, total % 60
+    return hours, minutes, np.round(hours * HOUR_TO_DAY + minutes * MINUTE_TO_DAY, 3)
+
+
+def refresh_late_computations(connection, attendance_ids):
+    """
+    Recompute late_computation for the given attendance rows: late rows
+    are upserted in one statement, rows no longer late are removed.
+    """
+    attendance_ids = list(attendance_ids)
+    if not attendance_ids:
+        return
+
+    att = Attendance.__table__
+    late = LateComputation.__table__
+    rows = connection.execute(
+        select(att.c.id, att.c.employee_id, att.c.date, att.c.time_in)
+        .where(att.c.id.in_(attendance_ids))
+    ).all()
+    if not rows:
         return
 
-    existing = LateComputation.query.filter_by(attendance_id=target.id).first()
-
-    if existing:
-        existing.late_hours = late_data["late_hours"]
-        existing.late_minutes = late_data["late_minutes"]
-        existing.day_equivalent = late_data["day_equivalent"]
-        existing.remarks = "Updated from attendance"
-    else:
-        record = LateComputation(
-            employee_id=target.employee_id,
-            attendance_id=target.id,
-            date=target.date,
-            late_days=0,
-            late_hours=late_data["late_hours"],
-            late_minutes=late_data["late_minutes"],
-            day_equivalent=late_data["day_equivalent"],
-            remarks="Auto-generated from attendance"
-        )
-        db.session.add(record)
-
-    db.session.commit()
+    hours, minutes, equivalent = compute_late_many([
+        np.nan if r.time_in is None
+        else r.time_in.hour * 3600 + r.time_in.minute * 60 + r.time_in.second
+        for r in rows
+    ])
+    now = datetime.utcnow()
+    values = [
+        {
+            "employee_id": r.employee_id,
+            "attendance_id": r.id,
+            "date": r.date,
+            "late_days": 0,
+            "late_hours": int(hours[i]),
+            "late_minutes": int(minutes[i]),
+            "day_equivalent": float(equivalent[i]),
+            "remarks": "Auto-generated from attendance",
+            "created_at": now,
+        }
+        for i, r in enumerate(rows) if hours[i] or minutes[i]
+    ]
+    if values:
+        connection.execute(late_upsert(upsert_insert(connection, late)), values)
+
+    on_time = [r.id for i, r in enumerate(rows) if not (hours[i] or minutes[i])]
+    if on_time:
+        connection.execute(delete(late).where(late.c.attendance_id.in_(on_time)))
+
+
+@event.listens_for(Session, "after_flush")
+def track_late_computations(session, flush_context):
+    """Refresh late_computation once per flush for every attendance row written."""
+    modified = (obj for obj in session.dirty if session.is_modified(obj))
+    attendance_ids = {
+        obj.id for obj in chain(session.new, modified)
+        if isinstance(obj, Attendance) and obj.id is not None
+    }
+    if attendance_ids:
+        refresh_late_computations(session.connection(), attendance_ids)
@@ -0,0 +1,350 @@
+from main_app.extensions import db
+from hr_system.hr.models.hr_models import Employee, Department, Attendance, Leave, LeaveType
+from sqlalchemy import func, case, and_
+from sqlalchemy.orm import contains_eager, joinedload
+from calendar import monthrange
+from datetime import date
+from io import BytesIO
+from openpyxl import Workbook
+import numpy as np
+
+
+# =========================================================
+# ATTENDANCE REPORT AGGREGATE
+# =========================================================
+PRESENT_STATUSES = ("Present", "Late")
+
+
+def _rate(days, employees, total_days):
+    """Attendance rate in percent for employees over total_days."""
+    possible = employees * total_days
+    return round(days / possible * 100, 2) if possible > 0 else 0
+
+
+def attendance_report_aggregate(start_date, end_date, department_id=None, employee_filter=None):
+    """
+    Per-employee attendance totals for a period in one grouped query
+    (conditional sums over attendance, LEFT JOINed so employees without
+    logs still appear), with the department rollup and overall totals
+    accumulated in the same pass over the rows.
+
+    employee_filter is a criterion on Employee (default: active employees).
+    Returns a dict with:
+    - employees: [{employee_id, employee_name, department_id, department_name,
+      days_present, days_absent, late_count, total_hours}]
+    - departments: [{id, name, employees, days_present, total_hours,
+      avg_attendance, avg_hours}] ordered by department id
+    - total_employees, total_days, total_present_days, total_hours,
+      avg_attendance_rate, avg_hours_per_employee
+    """
+    if employee_filter is None:
+        employee_filter = Employee.status == "Active"
+    total_days = (end_date - start_date).days + 1
+
+    query = (
+        db.session.query(
+            Employee.id, Employee.first_name, Employee.middle_name, Employee.last_name,
+            Employee.department_id, Department.name.label("department_name"),
+            func.coalesce(func.sum(case((Attendance.status.in_(PRESENT_STATUSES), 1), else_=0)), 0).label("days_present"),
+            func.coalesce(func.sum(case((Attendance.status == "Absent", 1), else_=0)), 0).label("days_absent"),
+            func.coalesce(func.sum(case((Attendance.status == "Late", 1), else_=0)), 0).label("late_count"),
+            func.coalesce(func.sum(Attendance.working_hours), 0).label("total_hours"),
+        )
+        .outerjoin(Department, Employee.department_id == Department.id)
+        .outerjoin(Attendance, and_(
+            Attendance.employee_id == Employee.id,
+            Attendance.date >= start_date,
+            Attendance.date <= end_date,
+        ))
+        .filter(employee_filter)
+        .group_by(
+            Employee.id, Employee.first_name, Employee.middle_name, Employee.last_name,
+            Employee.department_id, Department.name,
+        )
+        .order_by(Employee.id)
+    )
+    if department_id:
+        query = query.filter(Employee.department_id == department_id)
+
+    employees = []
+    departments = {}
+    total_present_days = 0
+    total_hours = 0.0
+
+    for row in query:
+        hours = float(row.total_hours or 0)
+        employees.append({
+            "employee_id": row.id,
+            "employee_name": f"{row.first_name} {row.middle_name or ''} {row.last_name}".strip(),
+            "department_id": row.department_id,
+            "department_name": row.department_name or "",
+            "days_present": row.days_present,
+            "days_absent": row.days_absent,
+            "late_count": row.late_count,
+            "total_hours": round(hours, 2),
+        })
+        total_present_days += row.days_present
+        total_hours += hours
+
+        if row.department_name is not None:
+            dept = departments.setdefault(row.department_id, {
+                "id": row.department_id, "name": row.department_name,
+                "employees": 0, "days_present": 0, "total_hours": 0.0,
+            })
+            dept["employees"] += 1
+            dept["days_present"] += row.days_present
+            dept["total_hours"] += hours
+
+    department_summary = []
+    for dept_id in sorted(departments):
+        dept = departments[dept_id]
+        dept["avg_attendance"] = _rate(dept["days_present"], dept["employees"], total_days)
+        dept["avg_hours"] = round(dept["total_hours"] / dept["employees"], 2)
+        dept["total_hours"] = round(dept["total_hours"], 2)
+        department_summary.append(dept)
+
+    return {
+        "employees": employees,
+        "departments": department_summary,
+        "total_employees": len(employees),
+        "total_days": total_days,
+        "total_present_days": total_present_days,
+        "total_hours": round(total_hours, 2),
+        "avg_attendance_rate": _rate(total_present_days, len(employees), total_days),
+        "avg_hours_per_employee": round(total_hours / len(employees), 2) if employees else 0,
+    }
+
+
+# =========================================================
+# LEAVE ANALYTICS
+# =========================================================
+def _leave_criteria(start_date, end_date, department_id, status, employee_filter):
+    criteria = []
+    if start_date:
+        criteria.append(Leave.start_date >= start_date)
+    if end_date:
+        criteria.append(Leave.end_date <= end_date)
+    if department_id:
+        criteria.append(Employee.department_id == department_id)
+    if status:
+        criteria.append(Leave.status == status)
+    if employee_filter is not None:
+        criteria.append(employee_filter)
+    return criteria
+
+
+def _summary(total, days):
+    return {"total": total, "days": days, "avg_days": round(days / total, 2) if total else 0}
+
+
+def leave_analytics(start_date=None, end_date=None, department_id=None, status=None,
+                    employee_filter=None, newest_first=False):
+    """
+    Filtered leave rows plus their totals, in two statements: the rows
+    with employee, department and leave type eager-loaded, and one
+    GROUP BY department / leave type that every total is rolled up from.
+    Every filter applies to both, including the most common leave type.
+
+    Returns a dict with:
+    - leaves: Leave objects ordered by start date
+    - total_leaves, total_days, avg_days_per_leave
+    - most_common_leave_type: name, or None without leaves
+    - by_department / by_type: {name: {total, days, avg_days}}, departments
+      in id order, types most used first
+    """
+    criteria = _leave_criteria(start_date, end_date, department_id, status, employee_filter)
+
+    leaves = (
+        Leave.query
+        .join(Leave.employee)
+        .options(
+            contains_eager(Leave.employee).joinedload(Employee.department),
+            joinedload(Leave.leave_type),
+        )
+        .filter(*criteria)
+        .order_by(Leave.start_date.desc() if newest_first else Leave.start_date.asc(), Leave.id)
+        .all()
+    )
+
+    groups = (
+        db.session.query(
+            Department.id.label("department_id"), Department.name.label("department_name"),
+            LeaveType.name.label("leave_type_name"),
+            func.count(Leave.id).label("total"),
+            func.coalesce(func.sum(Leave.days_requested), 0).label("days"),
+        )
+        .select_from(Leave)
+        .join(Employee, Leave.employee_id == Employee.id)
+        .outerjoin(Department, Employee.department_id == Department.id)
+        .outerjoin(LeaveType, Leave.leave_type_id == LeaveType.id)
+        .filter(*criteria)
+        .group_by(Department.id, Department.name, LeaveType.id, LeaveType.name)
+        .all()
+    )
+
+    departments, types = {}, {}
+    total_leaves = total_days = 0
+    for g in groups:
+        total_leaves += g.total
+        total_days += g.days
+        if g.department_name is not None:
+            dept = departments.setdefault(g.department_id, [g.department_name, 0, 0])
+            dept[1] += g.total
+            dept[2] += g.days
+        if g.leave_type_name is not None:
+            counts = types.setdefault(g.leave_type_name, [0, 0])
+            counts[0] += g.total
+            counts[1] += g.days
+
+    by_type = {
+        name: _summary(*types[name])
+        for name in sorted(types, key=lambda name: (-types[name][0], name))
+    }
+    return {
+        "leaves": leaves,
+        "total_leaves": total_leaves,
+        "total_days": total_days,
+        "avg_days_per_leave": round(total_days / total_leaves, 2) if total_leaves else 0,
+        "most_common_leave_type": next(iter(by_type), None),
+        "by_department": {
+            departments[dept_id][0]: _summary(*departments[dept_id][1:])
+            for dept_id in sorted(departments)
+        },
+        "by_type": by_type,
+    }
+
+
+# =========================================================
+# LATE / UNDERTIME MONTH MATRIX
+# =========================================================
+MATRIX_TIME_IN = 8 * 3600      # official time in / out, seconds since midnight
+MATRIX_TIME_OUT = 17 * 3600
+MINUTES_PER_DAY = 480          # minutes -> day equivalent
+
+
+def _clock_seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def build_late_matrix(year, month, employees=None):
+    """
+    Late and undertime minutes for a month as employees x days arrays.
+    The month's attendance is loaded in one query and scattered into the
+    arrays by (employee row, day - 1); employees default to everyone by
+    last name, with employment type eager-loaded for the report columns.
+
+    Returns a dict with employees, days_in_month, present (bool), late and
+    undertime (int minutes), time_in / time_out (display strings or None),
+    and late_totals / undertime_totals (per-employee row sums).
+    """
+    days_in_month = monthrange(year, month)[1]
+    if employees is None:
+        employees = (
+            Employee.query.options(joinedload(Employee.employment_type))
+            .order_by(Employee.last_name).all()
+        )
+    shape = (len(employees), days_in_month)
+    position = {emp.id: i for i, emp in enumerate(employees)}
+
+    rows = db.session.query(
+        Attendance.employee_id, Attendance.date, Attendance.time_in, Attendance.time_out
+    ).filter(
+        Attendance.date >= date(year, month, 1),
+        Attendance.date <= date(year, month, days_in_month),
+    ).all()
+    rows = [r for r in rows if r.employee_id in position]
+
+    emp_idx = np.array([position[r.employee_id] for r in rows], dtype=np.int64)
+    day_idx = np.array([r.date.day - 1 for r in rows], dtype=np.int64)
+    in_sec = np.array([_clock_seconds(r.time_in) if r.time_in else np.nan for r in rows], dtype=float)
+    out_sec = np.array([_clock_seconds(r.time_out) if r.time_out else np.nan for r in rows], dtype=float)
+
+    # Whole minutes past official time in / before official time out (0 when missing)
+    late_minutes = np.floor(np.nan_to_num(np.maximum(in_sec - MATRIX_TIME_IN, 0)) / 60).astype(np.int64)
+    undertime_minutes = np.floor(np.nan_to_num(np.maximum(MATRIX_TIME_OUT - out_sec, 0)) / 60).astype(np.int64)
+
+    present = np.zeros(shape, dtype=bool)
+    late = np.zeros(shape, dtype=np.int64)
+    undertime = np.zeros(shape, dtype=np.int64)
+    time_in = np.full(shape, None, dtype=object)
+    time_out = np.full(shape, None, dtype=object)
+
+    present[emp_idx, day_idx] = True
+    late[emp_idx, day_idx] = late_minutes
+    undertime[emp_idx, day_idx] = undertime_minutes
+    time_in[emp_idx, day_idx] = [r.time_in.strftime("%I:%M %p") if r.time_in else "" for r in rows]
+    time_out[emp_idx, day_idx] = [r.time_out.strftime("%I:%M %p") if r.time_out else "" for r in rows]
+
+    return {
+        "employees": employees,
+        "days_in_month": days_in_month,
+        "present": present,
+        "late": late,
+        "undertime": undertime,
+        "time_in": time_in,
+        "time_out": time_out,
+        "late_totals": late.sum(axis=1),
+        "undertime_totals": undertime.sum(axis=1),
+    }
+
+
+def late_matrix_rows(matrix):
+    """Template rows: {employee, days: {day: {...}}, total_late_minutes, total_undertime_minutes}."""
+    data = []
+    for i, emp in enumerate(matrix["employees"]):
+        days = {}
+        for d in np.flatnonzero(matrix["present"][i]):
+            days[int(d) + 1] = {
+                "time_in": matrix["time_in"][i, d],
+                "late": int(matrix["late"][i, d]),
+                "time_out": matrix["time_out"][i, d],
+                "undertime": int(matrix["undertime"][i, d]),
+            }
+        data.append({
+            "employee": emp,
+            "days": days,
+            "total_late_minutes": int(matrix["late_totals"][i]),
+            "total_undertime_minutes": int(matrix["undertime_totals"][i]),
+        })
+    return data
+
+
+def late_matrix_workbook(matrix, title):
+    """The month matrix as an .xlsx file (BytesIO): totals, then in / late / out / undertime per day."""
+    days_in_month = matrix["days_in_month"]
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title="Late Computation")
+
+    ws.append([title])
+    header = [
+        "NAME", "CATEGORY", "TOTAL LATE", "NO. OF DAYS LATE", "TOTAL UNDERTIME",
+        "NO. OF DAYS UNDERTIME", "OVER-ALL TOTAL UNDERTIME/LATE", "OVER-ALL TOTAL NO. OF DAYS",
+    ]
+    for d in range(1, days_in_month + 1):
+        header += [f"DAY {d} IN", f"DAY {d} LATE", f"DAY {d} OUT", f"DAY {d} UT"]
+    ws.append(header)
+
+    # Day columns interleaved as in, late, out, undertime with one reshape per employee
+    day_columns = np.empty((len(matrix["employees"]), days_in_month, 4), dtype=object)
+    day_columns[:, :, 0] = matrix["time_in"]
+    day_columns[:, :, 1] = np.where(matrix["present"], matrix["late"], None)
+    day_columns[:, :, 2] = matrix["time_out"]
+    day_columns[:, :, 3] = np.where(matrix["present"], matrix["undertime"], None)
+    day_columns = day_columns.reshape(len(matrix["employees"]), days_in_month * 4)
+
+    for i, emp in enumerate(matrix["employees"]):
+        late_total = int(matrix["late_totals"][i])
+        undertime_total = int(matrix["undertime_totals"][i])
+        ws.append([
+            emp.get_full_name(),
+            emp.employment_type.name if emp.employment_type else "",
+            late_total, round(late_total / MINUTES_PER_DAY, 3),
+            undertime_total, round(undertime_total / MINUTES_PER_DAY, 3),
+            late_total + undertime_total, round((late_total + undertime_total) / MINUTES_PER_DAY, 3),
+            *[v if not isinstance(v, np.integer) else int(v) for v in day_columns[i]],
+        ])
+
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
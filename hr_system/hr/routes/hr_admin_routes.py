@@ -3,7 +3,7 @@ from flask_login import login_required, current_user
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from ..models.user import User
-from ..models.hr_models import Employee, Attendance, Leave, Department, Position, LeaveType, EmploymentType, LeaveCredit
+from ..models.hr_models import Employee, Attendance, Leave, Department, Position, LeaveType, EmploymentType, LeaveCredit, AttendanceImportJob, Holiday
 from ..forms import EmployeeForm, AttendanceForm, LeaveForm, DepartmentForm
 from ..utils import admin_required, generate_employee_id, get_attendance_summary, get_current_month_range, load_excel_to_df, unlock_xlsx
 from .. import db, mail
@@ -11,6 +11,11 @@ from datetime import timedelta, datetime, date, time
 from sqlalchemy.orm import joinedload
 from collections import defaultdict
 from hr_system.hr.functions import parse_date
+from ..attendance_import import (
+    attendance_batch_page, commit_attendance_batch, discard_attendance_batch, PUNCH_LOG_EXTENSIONS,
+    is_multi_upload, collect_workbooks, start_attendance_import_job, submit_attendance_import_job
+)
+from ..reports import attendance_report_aggregate, leave_analytics
 import os
 from collections import Counter
 import csv
@@ -944,7 +949,7 @@ def attendance():
 
 
 # ----------------- CONFIG -----------------
-ALLOWED_EXTENSIONS = {'xls', 'xlsx'}
+ALLOWED_EXTENSIONS = {'xls', 'xlsx', 'zip'} | PUNCH_LOG_EXTENSIONS
 UPLOAD_FOLDER = "uploads/attendance"
 
 def allowed_file(filename):
@@ -953,7 +958,7 @@ def allowed_file(filename):
 
 
 # ----------------- CONFIG -----------------
-ALLOWED_EXTENSIONS = {'xls', 'xlsx'}
+ALLOWED_EXTENSIONS = {'xls', 'xlsx', 'zip'} | PUNCH_LOG_EXTENSIONS
 UPLOAD_FOLDER = "uploads/attendance"
 
 def allowed_file(filename):
@@ -962,191 +967,104 @@ def allowed_file(filename):
 
 @hr_admin_bp.route('/add_attendance', methods=['GET', 'POST'])
 @login_required
+@admin_required
 def add_attendance():
-    preview_data = []
-     
     employees = Employee.query.filter_by(status='Active').all()
-    if request.method == 'POST' and 'file' in request.files:
+    files = request.files.getlist('file')
+    if request.method == 'POST' and is_multi_upload(files):
+        # Several workbooks or a ZIP: parsed in parallel, in the background, into one combined preview
+        files = [f for f in files if f and f.filename]
+        if not all(allowed_file(f.filename) for f in files):
+            flash("Please upload Excel files (.xls or .xlsx) or a ZIP of them.", "danger")
+            return redirect(request.url)
+
+        try:
+            workbooks, ignored = collect_workbooks(files)
+        except Exception as e:
+            flash(f"Error reading Excel files: {e}", "danger")
+            return redirect(request.url)
+
+        job = start_attendance_import_job(
+            "workbook", filename=f"{len(workbooks)} file(s)", started_by=current_user.id
+        )
+        submit_attendance_import_job(job, workbooks)
+        if ignored:
+            flash(f"{len(ignored)} file(s) ignored.", "info")
+        return redirect(url_for('hr_admin.add_attendance', job=job.id))
+
+    elif request.method == 'POST' and 'file' in request.files:
         file = request.files.get("file")
         if not file or not allowed_file(file.filename):
-            flash("Please upload a valid Excel file (.xls or .xlsx).", "danger")
+            flash("Please upload a valid Excel file (.xls or .xlsx) or punch log (.csv, .txt, .dat).", "danger")
             return redirect(request.url)
 
-        # Save uploaded file
+        # Save uploaded file; the job removes it when done
         filename = secure_filename(file.filename)
         os.makedirs(UPLOAD_FOLDER, exist_ok=True)
         filepath = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{filename}")
         file.save(filepath)
 
-        try:
-            df = pd.read_excel(filepath, header=None)
-            records = []
-            current_id, current_name, current_dept = None, None, None
-            attendance_date = None
-
-            for _, row in df.iterrows():
-                line = " ".join(str(x) for x in row if str(x) != "nan").strip()
-                if not line or "tabling date" in line.lower():
-                    continue
-
-                if "Attendance date:" in line:
-                    attendance_date = line.split(":")[-1].strip()
-                    continue
-
-                if "User ID" in line and "Name" in line:
-                    uid_part = line.split("User ID:")[-1]
-                    name_part = uid_part.split("Name:")
-                    id_value = name_part[0].strip() if len(name_part) > 0 else None
-
-                    if len(name_part) > 1:
-                        name_dept_part = name_part[1].split("Department:")
-                        name = name_dept_part[0].strip()
-                        dept = name_dept_part[1].strip() if len(name_dept_part) > 1 else "Unknown"
-                    else:
-                        name, dept = "Unknown", "Unknown"
-
-                    current_id, current_name, current_dept = id_value, name, dept
-                    continue
-
-                if ":" in line:
-                    times = line.split()
-                    time_in = times[0] if len(times) > 0 else None
-                    time_out = times[1] if len(times) > 1 else None
-                    day_value = attendance_date or datetime.now().date().isoformat()
-
-                    emp_match = None
-                    try:
-                        emp_id_int = int(float(current_id))
-                        emp_match = Employee.query.get(emp_id_int)
-                    except:
-                        emp_match = None
-
-                    record_name = emp_match.get_full_name() if emp_match else current_name or "Unknown"
-                    matched = True if emp_match else False
-
-                    records.append({
-                        "Employee ID": current_id,
-                        "Name": record_name,
-                        "Department": getattr(emp_match.department, 'name', 'N/A') if emp_match else "Unknown",
-                        "Day": day_value,
-                        "Time In": time_in if matched else None,
-                        "Time Out": time_out if matched else None,
-                        "Matched": matched
-                    })
-
-            db_employees = Employee.query.filter_by(active=True).all()
-            excel_ids = {int(float(r["Employee ID"])) for r in records if r["Matched"]}
-
-            for emp in db_employees:
-                if emp.id not in excel_ids:
-                    records.append({
-                        "Employee ID": emp.id,
-                        "Name": emp.get_full_name(),
-                        "Department": getattr(emp.department, 'name', 'N/A') if emp.department else 'N/A',
-                        "Day": attendance_date or datetime.now().date().isoformat(),
-                        "Time In": None,
-                        "Time Out": None,
-                        "Matched": False
-                    })
-
-            if not records:
-                flash("No valid attendance records found. Please check the Excel format.", "danger")
-                return redirect(request.url)
-
-            # Store in session
-            session['import_attendance_preview'] = records
-            preview_data = records
-            flash("Preview loaded. Please confirm import.", "info")
+        # Raw device punch logs skip the preview and go straight to the bulk writer
+        kind = "punch_log" if filename.rsplit('.', 1)[1].lower() in PUNCH_LOG_EXTENSIONS else "workbook"
+        job = start_attendance_import_job(kind, filename=filename, started_by=current_user.id)
+        submit_attendance_import_job(job, filepath)
+        return redirect(url_for('hr_admin.add_attendance', job=job.id))
+
+    job = None
+    if request.args.get('job'):
+        job = AttendanceImportJob.query.filter_by(
+            id=request.args.get('job', type=int), started_by=current_user.id
+        ).first_or_404()
+        if job.status == "Failed":
+            flash(f"Error reading {job.filename}: {job.error}", "danger")
+            return redirect(url_for('hr_admin.add_attendance'))
+        if job.status == "Completed":
+            if job.batch_id:
+                # Rows are staged server-side; the session only keeps the batch id
+                if session.get('import_attendance_batch') != job.batch_id:
+                    discard_attendance_batch(session.get('import_attendance_batch'))
+                    db.session.commit()
+                session['import_attendance_batch'] = job.batch_id
+                flash(job.message, "info")
+            else:
+                flash(f"✅ {job.message}", "success")
+            return redirect(url_for('hr_admin.add_attendance'))
 
-        except Exception as e:
-            flash(f"Error reading Excel file: {e}", "danger")
-            return redirect(request.url)
+    preview = None
+    if session.get('import_attendance_batch'):
+        preview = attendance_batch_page(session['import_attendance_batch'], request.args.get('page', 1, type=int))
 
-    # Load preview from session if exists
-    if 'import_attendance_preview' in session and not preview_data:
-        preview_data = session['import_attendance_preview']
+    return render_template('hr/admin/admin_import_attendance.html', preview=preview, employees=employees, job=job)
 
-    return render_template('hr/admin/admin_import_attendance.html', preview=preview_data, employees=employees)
+
+@hr_admin_bp.route('/attendance_import_jobs/<int:job_id>')
+@login_required
+@admin_required
+def attendance_import_job_status(job_id):
+    job = AttendanceImportJob.query.filter_by(id=job_id, started_by=current_user.id).first_or_404()
+    return jsonify(job.to_dict())
 
 
 # ----------------- CONFIRM IMPORT -----------------
 @hr_admin_bp.route('/add_attendance/confirm', methods=['POST'])
 @login_required
+@admin_required
 def confirm_import_attendance():    
-    import os
-    records = session.get('import_attendance_preview', [])
-    if not records:
+    batch_id = session.get('import_attendance_batch')
+    if not batch_id:
         flash("No attendance records to import.", "danger")
         return redirect(url_for('hr_admin.add_attendance'))
 
-    imported_count = 0
-
-    for row in records:
-        emp_id = row.get("Employee ID")
-        try:
-            emp_id_int = int(float(emp_id))
-        except:
-            continue
-
-        emp = Employee.query.get(emp_id_int)
-        if not emp:
-            continue
-
-        day = row.get("Day")
-        if not day or "Tabling" in str(day):
-            continue
-
-        # Convert day string to date
-        try:
-            date_list = []
-            if "~" in day:
-                start_str, end_str = day.split("~")
-                start_date = pd.to_datetime(start_str.strip(), errors='coerce').date()
-                end_date = pd.to_datetime(end_str.strip(), errors='coerce').date()
-                if start_date and end_date:
-                    date_list = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
-            else:
-                single_date = pd.to_datetime(day.strip(), errors='coerce').date()
-                if single_date:
-                    date_list = [single_date]
-        except:
-            continue
-
-        time_in = row.get("Time In")
-        time_out = row.get("Time Out")
-
-        for att_date in date_list:
-            # ✅ Skip if already exists
-            existing = Attendance.query.filter_by(employee_id=emp.id, date=att_date).first()
-            if existing:
-                continue
-
-            time_in_obj = pd.to_datetime(time_in, errors='coerce').time() if time_in else None
-            time_out_obj = pd.to_datetime(time_out, errors='coerce').time() if time_out else None
-
-            new_att = Attendance(
-                employee_id=emp.id,
-                date=att_date,
-                time_in=time_in_obj,
-                time_out=time_out_obj,
-                status="Present" if time_in_obj else "Absent",
-                remarks=""
-            )
-            db.session.add(new_att)
-            imported_count += 1
+    counts = commit_attendance_batch(batch_id, overwrite=bool(request.form.get('overwrite')))
 
     db.session.commit()
-    session.pop('import_attendance_preview', None)
-
-    # ✅ Cleanup uploaded files
-    try:
-        if os.path.exists(UPLOAD_FOLDER):
-            for f in os.listdir(UPLOAD_FOLDER):
-                os.remove(os.path.join(UPLOAD_FOLDER, f))
-    except Exception as e:
-        print(f"⚠️ Cleanup error: {e}")
+    session.pop('import_attendance_batch', None)
 
-    flash(f"✅ Successfully imported {imported_count} attendance record(s).", "success")
+    flash(
+        f"✅ Imported {counts['inserted']} new, updated {counts['updated']} and skipped "
+        f"{counts['skipped']} attendance record(s).",
+        "success",
+    )
     return redirect(url_for('hr_admin.add_attendance'))
 
 @hr_admin_bp.route('/add_manual_attendance', methods=['POST'])
@@ -1577,6 +1495,69 @@ def edit_position(position_id):
         departments=departments
     )
 
+# ------------------------- Holidays -------------------------
+HOLIDAY_TYPES = ["Regular", "Special"]
+
+
+@hr_admin_bp.route("/holidays")
+@login_required
+@admin_required
+def view_holidays():
+    """Holidays of one year; these are the non-working days of the business calendar."""
+    year = request.args.get("year", date.today().year, type=int)
+    holidays = (
+        Holiday.query
+        .filter(Holiday.date >= date(year, 1, 1), Holiday.date <= date(year, 12, 31))
+        .order_by(Holiday.date.asc())
+        .all()
+    )
+    return render_template(
+        "hr/admin/admin_view_holidays.html",
+        holidays=holidays,
+        year=year,
+        holiday_types=HOLIDAY_TYPES
+    )
+
+
+@hr_admin_bp.route("/holidays/add", methods=["POST"])
+@login_required
+@admin_required
+def add_holiday():
+    holiday_date = parse_date(request.form.get("date", ""), "holiday date")
+    name = (request.form.get("name") or "").strip()
+    holiday_type = request.form.get("holiday_type")
+    if not holiday_date:
+        return redirect(url_for("hr_admin.view_holidays"))
+    if not name:
+        flash("Holiday name is required.", "danger")
+        return redirect(url_for("hr_admin.view_holidays", year=holiday_date.year))
+    if holiday_type not in HOLIDAY_TYPES:
+        holiday_type = HOLIDAY_TYPES[0]
+
+    if Holiday.query.filter_by(date=holiday_date).first():
+        flash(f"{holiday_date:%B %d, %Y} is already a holiday.", "danger")
+        return redirect(url_for("hr_admin.view_holidays", year=holiday_date.year))
+
+    db.session.add(Holiday(date=holiday_date, name=name, holiday_type=holiday_type))
+    db.session.commit()
+
+    flash(f"Holiday '{name}' added.", "success")
+    return redirect(url_for("hr_admin.view_holidays", year=holiday_date.year))
+
+
+@hr_admin_bp.route("/holidays/<int:holiday_id>/delete", methods=["POST"])
+@login_required
+@admin_required
+def delete_holiday(holiday_id):
+    holiday = Holiday.query.get_or_404(holiday_id)
+    year = holiday.date.year
+    db.session.delete(holiday)
+    db.session.commit()
+
+    flash(f"Holiday '{holiday.name}' removed.", "success")
+    return redirect(url_for("hr_admin.view_holidays", year=year))
+
+
 # ------------------------- Reports -------------------------
 @hr_admin_bp.route('/reports')
 @login_required
@@ -1658,91 +1639,21 @@ def attendance_report():
         end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
 
     # ------------------------------
-    # Base employee query
-    # ------------------------------
-    employees_query = Employee.query.filter(Employee.status == "Active")
-    if department_id:
-        employees_query = employees_query.filter(Employee.department_id == department_id)
-    employees = employees_query.all()
-    total_employees = len(employees)
-
-    # ------------------------------
-    # Collect attendance data per employee
+    # Per-employee totals + department rollup (one grouped query)
     # ------------------------------
-    report_data = []
-    total_hours_worked = 0
-    total_present_days = 0
-
-    for emp in employees:
-        emp_attendances = Attendance.query.filter(
-            Attendance.employee_id == emp.id,
-            Attendance.date >= start_date,
-            Attendance.date <= end_date
-        ).all()
-
-        days_present = sum(1 for a in emp_attendances if a.status in ["Present", "Late"])
-        days_absent = sum(1 for a in emp_attendances if a.status == "Absent")
-        late_count = sum(1 for a in emp_attendances if a.status == "Late")
-        hours_worked = sum(a.working_hours for a in emp_attendances)
-
-        total_hours_worked += hours_worked
-        total_present_days += days_present
-
-        report_data.append({
-            "employee_name": emp.get_full_name(),
-            "department_name": emp.department.name if emp.department else "",
-            "days_present": days_present,
-            "days_absent": days_absent,
-            "late_count": late_count,
-            "total_hours": round(hours_worked, 2)
-        })
-
-    # ------------------------------
-    # Average attendance rate
-    # ------------------------------
-    avg_attendance_rate = (
-        round((total_present_days / (total_employees * ((end_date - start_date).days + 1))) * 100, 2)
-        if total_employees > 0 else 0
-    )
-
-    # ------------------------------
-    # Department summary
-    # ------------------------------
-    department_summary = []
+    aggregate = attendance_report_aggregate(start_date, end_date, department_id=department_id)
     departments = Department.query.all()
-    for dept in departments:
-        dept_emps = [e for e in employees if e.department_id == dept.id]
-        if not dept_emps:
-            continue
-
-        dept_attendance_days = 0
-        dept_total_hours = 0
-        for emp in dept_emps:
-            emp_att = [a for a in report_data if a["employee_name"] == emp.get_full_name()]
-            if emp_att:
-                dept_attendance_days += emp_att[0]["days_present"]
-                dept_total_hours += emp_att[0]["total_hours"]
-        
-        num_days = ((end_date - start_date).days + 1) * len(dept_emps)
-        avg_att = round((dept_attendance_days / num_days) * 100, 2) if num_days > 0 else 0
-        avg_hours = round(dept_total_hours / len(dept_emps), 2) if dept_emps else 0
-
-        department_summary.append({
-            "name": dept.name,
-            "avg_attendance": avg_att,
-            "avg_hours": avg_hours
-        })
 
     # ------------------------------
     # Render template
     # ------------------------------
     return render_template(
         "hr/admin/attendance_reports.html",
-        report_data=report_data,
-        department_summary=department_summary,
-        total_employees=total_employees,
-        total_hours_worked=round(total_hours_worked, 2),
-        avg_attendance_rate=avg_attendance_rate,
+        report_data=aggregate["employees"],
+        department_summary=aggregate["departments"],
+        total_employees=aggregate["total_employees"],
+        total_hours_worked=aggregate["total_hours"],
+        avg_attendance_rate=aggregate["avg_attendance_rate"],
         start_date=start_date,
         end_date=end_date,
         department_id=int(department_id) if department_id else "",
@@ -1775,15 +1686,13 @@ def attendance_report_word():
     else:
         end_date = date.today()
 
-    total_days = (end_date - start_date).days + 1
-
     # -----------------------------
-    # Fetch employees (optional filter by department)
+    # Per-employee totals + department rollup (one grouped query)
     # -----------------------------
-    employees = Employee.query.filter(Employee.archived == False)
-    if department_id:
-        employees = employees.filter(Employee.department_id == department_id)
-    employees = employees.all()
+    aggregate = attendance_report_aggregate(
+        start_date, end_date, department_id=department_id,
+        employee_filter=Employee.archived == False
+    )
 
     # -----------------------------
     # Create Word Document
@@ -1808,78 +1717,28 @@ def attendance_report_word():
     hdr_cells[4].text = "Total Hours Worked"
 
     # Attendance data
-    for emp in employees:
-        emp_att = Attendance.query.filter(
-            Attendance.employee_id == emp.id,
-            Attendance.date >= start_date,
-            Attendance.date <= end_date
-        ).all()
-
-        days_present = sum(1 for a in emp_att if a.status in ["Present", "Late"])
-        days_absent = sum(1 for a in emp_att if a.status == "Absent")
-        total_hours = sum(a.working_hours for a in emp_att)
-
+    for row in aggregate["employees"]:
         row_cells = table.add_row().cells
-        row_cells[0].text = emp.get_full_name()
-        row_cells[1].text = emp.department.name if emp.department else "N/A"
-        row_cells[2].text = str(days_present)
-        row_cells[3].text = str(days_absent)
-        row_cells[4].text = f"{total_hours:.2f}"
+        row_cells[0].text = row["employee_name"]
+        row_cells[1].text = row["department_name"] or "N/A"
+        row_cells[2].text = str(row["days_present"])
+        row_cells[3].text = str(row["days_absent"])
+        row_cells[4].text = f"{row['total_hours']:.2f}"
 
     # -----------------------------
     # Insights Section
     # -----------------------------
     doc.add_paragraph('\nOverall Insights', style='Heading 2')
 
-    if employees:
-        total_attendance_days = sum(
-            sum(1 for a in Attendance.query.filter(
-                Attendance.employee_id == emp.id,
-                Attendance.date >= start_date,
-                Attendance.date <= end_date
-            ).all() if a.status in ["Present", "Late"]) for emp in employees
-        )
-        total_possible_days = total_days * len(employees)
-        avg_attendance = round((total_attendance_days / total_possible_days) * 100, 2) if total_possible_days > 0 else 0
-
-        total_working_hours = sum(
-            sum(a.working_hours for a in Attendance.query.filter(
-                Attendance.employee_id == emp.id,
-                Attendance.date >= start_date,
-                Attendance.date <= end_date
-            ).all()) for emp in employees
-        )
-        avg_hours_per_employee = round(total_working_hours / len(employees), 2)
-
-        doc.add_paragraph(f"Total Employees: {len(employees)}")
-        doc.add_paragraph(f"Average Attendance: {avg_attendance}%")
-        doc.add_paragraph(f"Average Hours Worked per Employee: {avg_hours_per_employee} hrs")
+    if aggregate["employees"]:
+        doc.add_paragraph(f"Total Employees: {aggregate['total_employees']}")
+        doc.add_paragraph(f"Average Attendance: {aggregate['avg_attendance_rate']}%")
+        doc.add_paragraph(f"Average Hours Worked per Employee: {aggregate['avg_hours_per_employee']} hrs")
 
     # Department-wise insights
     doc.add_paragraph('\nDepartment-wise Insights', style='Heading 2')
-    departments = Department.query.all()
-    for dept in departments:
-        dept_emps = [e for e in employees if e.department_id == dept.id]
-        if not dept_emps:
-            continue
-
-        dept_attendance_days = 0
-        dept_total_hours = 0
-
-        for emp in dept_emps:
-            emp_att = Attendance.query.filter(
-                Attendance.employee_id == emp.id,
-                Attendance.date >= start_date,
-                Attendance.date <= end_date
-            ).all()
-            dept_attendance_days += sum(1 for a in emp_att if a.status in ["Present", "Late"])
-            dept_total_hours += sum(a.working_hours for a in emp_att)
-
-        num_days = total_days * len(dept_emps)
-        avg_att = round((dept_attendance_days / num_days) * 100, 2) if num_days > 0 else 0
-        avg_hours = round(dept_total_hours / len(dept_emps), 2) if dept_emps else 0
-
-        doc.add_paragraph(f"{dept.name}: Avg Attendance: {avg_att}%, Avg Hours: {avg_hours}")
+    for dept in aggregate["departments"]:
+        doc.add_paragraph(f"{dept['name']}: Avg Attendance: {dept['avg_attendance']}%, Avg Hours: {dept['avg_hours']}")
 
     # -----------------------------
     # Return as Word file
@@ -1907,49 +1766,23 @@ def leave_report():
     start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date() if start_date_str else date.today() - timedelta(days=30)
     end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date() if end_date_str else date.today()
 
-    employees = Employee.query.filter(Employee.archived == False)
-    if department_id:
-        employees = employees.filter(Employee.department_id == department_id)
-    employees = employees.all()
-
-    leave_data = []
-    for emp in employees:
-        emp_leaves = Leave.query.filter(
-            Leave.employee_id == emp.id,
-            Leave.start_date >= start_date,
-            Leave.end_date <= end_date
-        )
-        if status_filter:
-            emp_leaves = emp_leaves.filter(Leave.status == status_filter)
-        leave_data.extend(emp_leaves.all())
-
-    # Insights
-    total_leaves = len(leave_data)
-    avg_days_per_leave = round(sum(lv.days_requested for lv in leave_data)/total_leaves,2) if total_leaves else 0
-    leave_types = [lv.leave_type.name for lv in leave_data if lv.leave_type]
-    most_common_leave_type = Counter(leave_types).most_common(1)[0][0] if leave_types else "N/A"
-
-    # Department-wise summary
-    dept_summary = {}
-    for dept in Department.query.all():
-        dept_leaves = [lv for lv in leave_data if lv.employee.department_id == dept.id]
-        if dept_leaves:
-            dept_summary[dept.name] = {
-                "total": len(dept_leaves),
-                "avg_days": round(sum(lv.days_requested for lv in dept_leaves)/len(dept_leaves), 2)
-            }
+    # Filtered leaves + department / type totals (shared leave analytics)
+    analytics = leave_analytics(
+        start_date, end_date, department_id=department_id, status=status_filter,
+        employee_filter=Employee.archived == False
+    )
 
     return render_template(
         "hr/admin/leave_reports.html",
-        leave_data=leave_data,
+        leave_data=analytics["leaves"],
         start_date=start_date,
         end_date=end_date,
         departments=Department.query.all(),
         department_id=int(department_id) if department_id else None,
-        total_leaves=total_leaves,
-        avg_days_per_leave=avg_days_per_leave,
-        most_common_leave_type=most_common_leave_type,
-        dept_summary=dept_summary
+        total_leaves=analytics["total_leaves"],
+        avg_days_per_leave=analytics["avg_days_per_leave"],
+        most_common_leave_type=analytics["most_common_leave_type"] or "N/A",
+        dept_summary=analytics["by_department"]
     )
 
 # ------------------------------
@@ -1967,16 +1800,8 @@ def leave_report_word():
     start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date() if start_date_str else None
     end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date() if end_date_str else None
 
-    # --- Fetch leaves ---
-    query = Leave.query.join(Employee).join(Department)
-    if start_date:
-        query = query.filter(Leave.start_date >= start_date)
-    if end_date:
-        query = query.filter(Leave.end_date <= end_date)
-    if department_id:
-        query = query.filter(Employee.department_id == department_id)
-
-    all_leaves = query.order_by(Leave.start_date.asc()).all()
+    # --- Filtered leaves + department totals (shared leave analytics) ---
+    analytics = leave_analytics(start_date, end_date, department_id=department_id)
 
     # --- Create Word doc ---
     doc = Document()
@@ -1991,7 +1816,7 @@ def leave_report_word():
     for i, h in enumerate(headers):
         hdr_cells[i].text = h
 
-    for leave in all_leaves:
+    for leave in analytics["leaves"]:
         row_cells = table.add_row().cells
         row_cells[0].text = leave.employee.get_full_name()
         row_cells[1].text = leave.employee.department.name if leave.employee.department else ""
@@ -2003,21 +1828,11 @@ def leave_report_word():
 
     # --- Insights ---
     doc.add_paragraph("\nInsights", style="Heading 2")
-    total_leaves = len(all_leaves)
-    avg_days = round(sum(lv.days_requested for lv in all_leaves)/total_leaves, 2) if total_leaves else 0
-    doc.add_paragraph(f"Total leaves: {total_leaves}")
-    doc.add_paragraph(f"Average leave days per record: {avg_days}")
+    doc.add_paragraph(f"Total leaves: {analytics['total_leaves']}")
+    doc.add_paragraph(f"Average leave days per record: {analytics['avg_days_per_leave']}")
 
     # --- Department-wise summary ---
-    dept_summary = {}
-    for dept in Department.query.all():
-        dept_leaves = [lv for lv in all_leaves if lv.employee.department_id == dept.id]
-        if dept_leaves:
-            dept_summary[dept.name] = {
-                "total": len(dept_leaves),
-                "avg_days": round(sum(lv.days_requested for lv in dept_leaves) / len(dept_leaves), 2)
-            }
-
+    dept_summary = analytics["by_department"]
     if dept_summary:
         doc.add_paragraph("\nDepartment-wise Summary", style="Heading 2")
         for dept, stats in dept_summary.items():
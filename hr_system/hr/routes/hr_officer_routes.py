@@ -8,13 +8,25 @@ from flask import (
     current_app,
     jsonify,
     session,
+    send_file,
 )
 from flask_login import login_required, current_user
 from datetime import datetime, date, timedelta, time
 from ..models.user import User
-from ..models.hr_models import Employee, Attendance, Leave, Department, Position, LateComputation
+from ..models.hr_models import Employee, Attendance, Leave, Department, Position, LateComputation, AttendanceImportJob
 from ..forms import EmployeeForm, AttendanceForm, LeaveForm
 from ..utils import hr_officer_required, get_attendance_summary, get_current_month_range
+from ..reports import build_late_matrix, late_matrix_rows, late_matrix_workbook
+from ..attendance_import import (
+    attendance_batch_page,
+    commit_attendance_batch,
+    discard_attendance_batch,
+    PUNCH_LOG_EXTENSIONS,
+    is_multi_upload,
+    collect_workbooks,
+    start_attendance_import_job,
+    submit_attendance_import_job,
+)
 from .. import db
 from sqlalchemy.orm import joinedload
 import os
@@ -368,7 +380,7 @@ def attendance():
 
 
 # ----------------- CONFIG -----------------
-ALLOWED_EXTENSIONS = {"xls", "xlsx"}
+ALLOWED_EXTENSIONS = {"xls", "xlsx", "zip"} | PUNCH_LOG_EXTENSIONS
 UPLOAD_FOLDER = "uploads/attendance"
 
 
@@ -381,226 +393,105 @@ def allowed_file(filename):
 @login_required
 @hr_officer_required
 def add_attendance():
-    preview_data = []
+    files = request.files.getlist("file")
+    if request.method == "POST" and is_multi_upload(files):
+        # Several workbooks or a ZIP: parsed in parallel, in the background, into one combined preview
+        files = [f for f in files if f and f.filename]
+        if not all(allowed_file(f.filename) for f in files):
+            flash("Please upload Excel files (.xls or .xlsx) or a ZIP of them.", "danger")
+            return redirect(request.url)
+
+        try:
+            workbooks, ignored = collect_workbooks(files)
+        except Exception as e:
+            flash(f"Error reading Excel files: {e}", "danger")
+            return redirect(request.url)
 
-    if request.method == "POST" and "file" in request.files:
+        job = start_attendance_import_job(
+            "workbook", filename=f"{len(workbooks)} file(s)", started_by=current_user.id
+        )
+        submit_attendance_import_job(job, workbooks)
+        if ignored:
+            flash(f"{len(ignored)} file(s) ignored.", "info")
+        return redirect(url_for("officer.add_attendance", job=job.id))
+
+    elif request.method == "POST" and "file" in request.files:
         file = request.files.get("file")
         if not file or not allowed_file(file.filename):
-            flash("Please upload a valid Excel file (.xls or .xlsx).", "danger")
+            flash("Please upload a valid Excel file (.xls or .xlsx) or punch log (.csv, .txt, .dat).", "danger")
             return redirect(request.url)
 
-        # Save uploaded file
+        # Save uploaded file; the job removes it when done
         filename = secure_filename(file.filename)
         os.makedirs(UPLOAD_FOLDER, exist_ok=True)
         filepath = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{filename}")
         file.save(filepath)
 
-        try:
-            df = pd.read_excel(filepath, header=None)
-            records = []
-            current_id, current_name, current_dept = None, None, None
-            attendance_date = None
-
-            for _, row in df.iterrows():
-                line = " ".join(str(x) for x in row if str(x) != "nan").strip()
-                if not line or "tabling date" in line.lower():
-                    continue
-
-                # Extract attendance date
-                if "Attendance date:" in line:
-                    attendance_date = line.split(":")[-1].strip()
-                    continue
-
-                # Extract employee info
-                if "User ID" in line and "Name" in line:
-                    uid_part = line.split("User ID:")[-1]
-                    name_part = uid_part.split("Name:")
-                    id_value = name_part[0].strip() if len(name_part) > 0 else None
-
-                    if len(name_part) > 1:
-                        name_dept_part = name_part[1].split("Department:")
-                        name = name_dept_part[0].strip()
-                        dept = (
-                            name_dept_part[1].strip()
-                            if len(name_dept_part) > 1
-                            else "Unknown"
-                        )
-                    else:
-                        name, dept = "Unknown", "Unknown"
-
-                    current_id, current_name, current_dept = id_value, name, dept
-                    continue
-
-                # Extract times
-                if ":" in line:
-                    times = line.split()
-                    time_in = times[0] if len(times) > 0 else None
-                    time_out = times[1] if len(times) > 1 else None
-                    day_value = attendance_date or datetime.now().date().isoformat()
-
-                    # Check DB for employee
-                    emp_match = None
-                    try:
-                        emp_id_int = int(float(current_id))
-                        emp_match = Employee.query.get(emp_id_int)
-                    except:
-                        emp_match = None
-
-                    # If matched, use DB name, else leave as Excel
-                    record_name = (
-                        emp_match.get_full_name()
-                        if emp_match
-                        else current_name or "Unknown"
-                    )
-                    matched = True if emp_match else False
-
-                    records.append(
-                        {
-                            "Employee ID": current_id,
-                            "Name": record_name,
-                            "Department": (
-                                getattr(emp_match.department, "name", "N/A")
-                                if emp_match
-                                else "Unknown"
-                            ),
-                            "Day": day_value,
-                            "Time In": time_in if matched else None,
-                            "Time Out": time_out if matched else None,
-                            "Matched": matched,
-                        }
-                    )
-
-            # Include unmatched active employees from DB not in Excel
-            db_employees = Employee.query.filter_by(active=True).all()
-            excel_ids = {int(float(r["Employee ID"])) for r in records if r["Matched"]}
-
-            for emp in db_employees:
-                if emp.id not in excel_ids:
-                    # Mark absent
-                    records.append(
-                        {
-                            "Employee ID": emp.id,
-                            "Name": emp.get_full_name(),
-                            "Department": (
-                                getattr(emp.department, "name", "N/A")
-                                if emp.department
-                                else "N/A"
-                            ),
-                            "Day": attendance_date or datetime.now().date().isoformat(),
-                            "Time In": None,
-                            "Time Out": None,
-                            "Matched": False,
-                        }
-                    )
-
-            if not records:
-                flash(
-                    "No valid attendance records found. Please check the Excel format.",
-                    "danger",
-                )
-                return redirect(request.url)
-
-            session["import_attendance_preview"] = records
-            preview_data = records
-            flash("Preview loaded. Please confirm import.", "info")
+        # Raw device punch logs skip the preview and go straight to the bulk writer
+        kind = "punch_log" if filename.rsplit(".", 1)[1].lower() in PUNCH_LOG_EXTENSIONS else "workbook"
+        job = start_attendance_import_job(kind, filename=filename, started_by=current_user.id)
+        submit_attendance_import_job(job, filepath)
+        return redirect(url_for("officer.add_attendance", job=job.id))
+
+    job = None
+    if request.args.get("job"):
+        job = AttendanceImportJob.query.filter_by(
+            id=request.args.get("job", type=int), started_by=current_user.id
+        ).first_or_404()
+        if job.status == "Failed":
+            flash(f"Error reading {job.filename}: {job.error}", "danger")
+            return redirect(url_for("officer.add_attendance"))
+        if job.status == "Completed":
+            if job.batch_id:
+                # Rows are staged server-side; the session only keeps the batch id
+                if session.get("import_attendance_batch") != job.batch_id:
+                    discard_attendance_batch(session.get("import_attendance_batch"))
+                    db.session.commit()
+                session["import_attendance_batch"] = job.batch_id
+                flash(job.message, "info")
+            else:
+                flash(f"✅ {job.message}", "success")
+            return redirect(url_for("officer.add_attendance"))
 
-        except Exception as e:
-            flash(f"Error reading Excel file: {e}", "danger")
-            return redirect(request.url)
+    preview = None
+    if session.get("import_attendance_batch"):
+        preview = attendance_batch_page(
+            session["import_attendance_batch"], request.args.get("page", 1, type=int)
+        )
 
     return render_template(
-        "hr/officer/officer_import_attendance.html", preview=preview_data
+        "hr/officer/officer_import_attendance.html", preview=preview, job=job
     )
 
 
+@hr_officer_bp.route("/attendance_import_jobs/<int:job_id>")
+@login_required
+@hr_officer_required
+def attendance_import_job_status(job_id):
+    job = AttendanceImportJob.query.filter_by(id=job_id, started_by=current_user.id).first_or_404()
+    return jsonify(job.to_dict())
+
+
 # ----------------- CONFIRM IMPORT -----------------
 @hr_officer_bp.route("/add_attendance/confirm", methods=["POST"])
 @login_required
+@hr_officer_required
 def confirm_import_attendance():
-    import os
-
-    records = session.get("import_attendance_preview", [])
-    if not records:
+    batch_id = session.get("import_attendance_batch")
+    if not batch_id:
         flash("No attendance records to import.", "danger")
         return redirect(url_for("officer.add_attendance"))
 
-    imported_count = 0
-
-    for row in records:
-        emp_id = row.get("Employee ID")
-        try:
-            emp_id_int = int(float(emp_id))
-        except:
-            continue
-
-        emp = Employee.query.get(emp_id_int)
-        if not emp:
-            continue
-
-        day = row.get("Day")
-        if not day or "Tabling" in str(day):
-            continue
-
-        # Convert day string to date
-        try:
-            date_list = []
-            if "~" in day:
-                start_str, end_str = day.split("~")
-                start_date = pd.to_datetime(start_str.strip(), errors="coerce").date()
-                end_date = pd.to_datetime(end_str.strip(), errors="coerce").date()
-                if start_date and end_date:
-                    date_list = [
-                        start_date + timedelta(days=i)
-                        for i in range((end_date - start_date).days + 1)
-                    ]
-            else:
-                single_date = pd.to_datetime(day.strip(), errors="coerce").date()
-                if single_date:
-                    date_list = [single_date]
-        except:
-            continue
-
-        time_in = row.get("Time In")
-        time_out = row.get("Time Out")
-
-        for att_date in date_list:
-            # ✅ Skip if already exists
-            existing = Attendance.query.filter_by(
-                employee_id=emp.id, date=att_date
-            ).first()
-            if existing:
-                continue
-
-            time_in_obj = (
-                pd.to_datetime(time_in, errors="coerce").time() if time_in else None
-            )
-            time_out_obj = (
-                pd.to_datetime(time_out, errors="coerce").time() if time_out else None
-            )
-
-            new_att = Attendance(
-                employee_id=emp.id,
-                date=att_date,
-                time_in=time_in_obj,
-                time_out=time_out_obj,
-                status="Present" if time_in_obj else "Absent",
-                remarks="",
-            )
-            db.session.add(new_att)
-            imported_count += 1
+    counts = commit_attendance_batch(batch_id, overwrite=bool(request.form.get("overwrite")))
 
     db.session.commit()
-    session.pop("import_attendance_preview", None)
-
-    # ✅ Cleanup uploaded files
-    try:
-        if os.path.exists(UPLOAD_FOLDER):
-            for f in os.listdir(UPLOAD_FOLDER):
-                os.remove(os.path.join(UPLOAD_FOLDER, f))
-    except Exception as e:
-        print(f"⚠️ Cleanup error: {e}")
+    session.pop("import_attendance_batch", None)
 
-    flash(f"✅ Successfully imported {imported_count} attendance record(s).", "success")
+    flash(
+        f"✅ Imported {counts['inserted']} new, updated {counts['updated']} and skipped "
+        f"{counts['skipped']} attendance record(s).",
+        "success",
+    )
     return redirect(url_for("officer.add_attendance"))
 
 
@@ -637,59 +528,10 @@ def late_computation():
     month = int(request.args.get("month", today.month))
     months = list(enumerate(calendar.month_name))[1:]
 
-    days_in_month = monthrange(year, month)[1]
-
-    employees = Employee.query.order_by(Employee.last_name).all()
-    data = []
-
-    for emp in employees:
-        row = {
-            "employee": emp,
-            "days": {},
-            "total_late_minutes": 0,
-            "total_undertime_minutes": 0,
-        }
-
-        for d in range(1, days_in_month + 1):
-            current_date = date(year, month, d)
-
-            att = Attendance.query.filter_by(
-                employee_id=emp.id,
-                date=current_date
-            ).first()
-
-            if not att:
-                continue
-
-            # LATE
-            late_minutes = 0
-            if att.time_in and att.time_in > time(8, 0):
-                late_minutes = int(
-                    (datetime.combine(current_date, att.time_in) -
-                     datetime.combine(current_date, time(8, 0))
-                    ).total_seconds() / 60
-                )
-
-            # UNDERTIME
-            undertime_minutes = 0
-            if att.time_out and att.time_out < time(17, 0):
-                undertime_minutes = int(
-                    (datetime.combine(current_date, time(17, 0)) -
-                     datetime.combine(current_date, att.time_out)
-                    ).total_seconds() / 60
-                )
-
-            row["days"][d] = {
-                "time_in": att.time_in.strftime("%I:%M %p") if att.time_in else "",
-                "late": late_minutes,
-                "time_out": att.time_out.strftime("%I:%M %p") if att.time_out else "",
-                "undertime": undertime_minutes
-            }
-
-            row["total_late_minutes"] += late_minutes
-            row["total_undertime_minutes"] += undertime_minutes
-
-        data.append(row)
+    # Month loaded in one query, pivoted to employees x days arrays
+    matrix = build_late_matrix(year, month)
+    days_in_month = matrix["days_in_month"]
+    data = late_matrix_rows(matrix)
 
     return render_template(
         "hr/officer/late_computation.html",
@@ -703,6 +545,24 @@ def late_computation():
 
 
 
+@hr_officer_bp.route('/late_computation/export')
+@login_required
+def export_late_computation():
+    today = date.today()
+    year = int(request.args.get("year", today.year))
+    month = int(request.args.get("month", today.month))
+
+    output = late_matrix_workbook(
+        build_late_matrix(year, month), f"Late Computation - {calendar.month_name[month]} {year}"
+    )
+    return send_file(
+        output,
+        as_attachment=True,
+        download_name=f"Late_Computation_{year}_{month:02d}.xlsx",
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
+
 # ----------------- OFFICER EDIT PASSWORD ROUTE -----------------
 @hr_officer_bp.route("/edit_password", methods=["GET", "POST"])
 @login_required
@@ -3,12 +3,14 @@ from flask import (
     render_template,
     request,
     jsonify,
-    abort
+    abort,
+    send_file
 )
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta,   date
 from ..models.hr_models import Employee, Leave, Department, LeaveType
 from ..utils import leave_officer_required, get_current_month_range
+from ..reports import leave_analytics, build_late_matrix, late_matrix_rows, late_matrix_workbook
 import os
 from .. import db
 import calendar
@@ -280,52 +282,25 @@ def leave_report():
     end_date = request.args.get('end_date')
     department_id = request.args.get('department_id', type=int)
 
-    # --- Base query for leave records ---
-    query = Leave.query.join(Employee).join(Employee.department).join(Leave.leave_type)
+    # --- Filtered leaves + department / type totals (shared leave analytics) ---
+    analytics = leave_analytics(start_date, end_date, department_id=department_id, newest_first=True)
 
-    # --- Apply filters ---
-    if start_date:
-        query = query.filter(Leave.start_date >= start_date)
-    if end_date:
-        query = query.filter(Leave.end_date <= end_date)
-    if department_id:
-        query = query.filter(Employee.department_id == department_id)
-
-    leave_data = query.order_by(Leave.start_date.desc()).all()
-
-    # --- Compute insights ---
-    total_leaves = len(leave_data)
-    avg_days_per_leave = round(sum(lv.days_requested for lv in leave_data) / total_leaves, 2) if total_leaves else 0
-
-    # Most common leave type
-    most_common_leave_type = None
-    if leave_data:
-        leave_type_counts = db.session.query(
-            Leave.leave_type_id, func.count(Leave.id)
-        ).group_by(Leave.leave_type_id).all()
-        if leave_type_counts:
-            # Get leave_type_id with max count
-            most_common_id = max(leave_type_counts, key=lambda x: x[1])[0]
-            most_common_leave_type = LeaveType.query.get(most_common_id).name
-
-    # Department-wise summary
-    dept_summary = {}
+    # Department-wise summary (every department, zero when it has no leaves)
     departments = Department.query.all()
-    for dept in departments:
-        dept_leaves = [lv for lv in leave_data if lv.employee.department_id == dept.id]
-        total = len(dept_leaves)
-        avg_days = round(sum(lv.days_requested for lv in dept_leaves)/total, 2) if total else 0
-        dept_summary[dept.name] = {"total": total, "avg_days": avg_days}
+    dept_summary = {
+        dept.name: analytics["by_department"].get(dept.name, {"total": 0, "avg_days": 0})
+        for dept in departments
+    }
 
     return render_template(
         'hr/leave_officer/leave_report.html',
-        leave_data=leave_data,
+        leave_data=analytics["leaves"],
         start_date=start_date,
         end_date=end_date,
         department_id=department_id,
-        total_leaves=total_leaves,
-        avg_days_per_leave=avg_days_per_leave,
-        most_common_leave_type=most_common_leave_type,
+        total_leaves=analytics["total_leaves"],
+        avg_days_per_leave=analytics["avg_days_per_leave"],
+        most_common_leave_type=analytics["most_common_leave_type"],
         dept_summary=dept_summary,
         departments=departments
     )
@@ -341,32 +316,12 @@ def late_computation():
     month = request.args.get("month", type=int, default=datetime.now().month)
     year = request.args.get("year", type=int, default=datetime.now().year)
 
-    days_in_month = calendar.monthrange(year, month)[1]
-
     # ----------------------------
-    # DATA (replace with real logic)
+    # DATA: month loaded in one query, pivoted to employees x days arrays
     # ----------------------------
-    employees = Employee.query.all()
-
-    data = []
-    for emp in employees:
-        row = {
-            "employee": emp,
-            "total_late_minutes": 0,
-            "total_undertime_minutes": 0,
-            "days": {}
-        }
-
-        # SAMPLE empty day data (prevents template errors)
-        for d in range(1, days_in_month + 1):
-            row["days"][d] = {
-                "time_in": "-",
-                "late": "-",
-                "time_out": "-",
-                "undertime": "-"
-            }
-
-        data.append(row)
+    matrix = build_late_matrix(year, month)
+    days_in_month = matrix["days_in_month"]
+    data = late_matrix_rows(matrix)
 
     # ----------------------------
     return render_template(
@@ -380,6 +335,24 @@ def late_computation():
 
 
 
+@leave_officer_bp.route("/late-computation/export", methods=["GET"])
+@login_required
+def export_late_computation():
+    month = request.args.get("month", type=int, default=datetime.now().month)
+    year = request.args.get("year", type=int, default=datetime.now().year)
+
+    output = late_matrix_workbook(
+        build_late_matrix(year, month), f"Late Computation - {calendar.month_name[month]} {year}"
+    )
+    return send_file(
+        output,
+        as_attachment=True,
+        download_name=f"Late_Computation_{year}_{month:02d}.xlsx",
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+
+
+
 @leave_officer_bp.route("/attendance")
 @login_required
 @leave_officer_required
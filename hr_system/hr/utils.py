@@ -4,7 +4,7 @@ from flask import current_app, request, jsonify
 from flask_login import current_user
 from hr_system.hr.models.hr_models import Department, Employee, Leave, LeaveType, LeaveCredit
 import requests
-import zipfile, tempfile, shutil, re
+import zipfile, shutil, re
 import pandas as pd
 from sqlalchemy import func, case
 # utils/pdf_generator.py
@@ -71,22 +71,6 @@ def employee_required(f):
 # Date & Leave Utilities
 # ------------------------
 
-def calculate_working_days(start_date, end_date):
-    """Calculate working days between two dates (excluding weekends)"""
-    if start_date > end_date:
-        return 0
-    
-    working_days = 0
-    current_date = start_date
-    
-    while current_date <= end_date:
-        # Monday = 0, Sunday = 6
-        if current_date.weekday() < 5:
-            working_days += 1
-        current_date += timedelta(days=1)
-    
-    return working_days
-
 def generate_employee_id(department_id):
     dept = Department.query.get(department_id)
     if not dept:
@@ -284,54 +268,66 @@ def get_current_month_range():
 
 
 # ----------------- HELPER FUNCTIONS -----------------
-def unlock_xlsx(file_path, unlocked_path):
-    tmpdir = tempfile.mkdtemp()
-    try:
-        with zipfile.ZipFile(file_path, "r") as z:
-            z.extractall(tmpdir)
-
-        # remove protection tags
-        pat = re.compile(r"<(sheetProtection|workbookProtection)\b[^>]*/>", re.IGNORECASE)
-        targets = []
-
-        wb = os.path.join(tmpdir, "xl", "workbook.xml")
-        if os.path.exists(wb):
-            targets.append(wb)
-
-        wsdir = os.path.join(tmpdir, "xl", "worksheets")
-        if os.path.isdir(wsdir):
-            for f in os.listdir(wsdir):
-                if f.endswith(".xml"):
-                    targets.append(os.path.join(wsdir, f))
-
-        for f in targets:
-            with open(f, "r", encoding="utf-8") as fh:
-                txt = fh.read()
-            new = pat.sub("", txt)
-            if new != txt:
-                with open(f, "w", encoding="utf-8") as fh:
-                    fh.write(new)
-
-        # rezip as unlocked xlsx
-        with zipfile.ZipFile(unlocked_path, "w", zipfile.ZIP_DEFLATED) as z:
-            for folder, _, files in os.walk(tmpdir):
-                for file in files:
-                    full = os.path.join(folder, file)
-                    arc = os.path.relpath(full, tmpdir).replace("\\", "/")
-                    z.write(full, arc)
-    finally:
-        shutil.rmtree(tmpdir)
-
-
-
-
-def load_excel_to_df(file_path):
-    unlocked_path = file_path.replace(".xlsx", "_unlocked.xlsx")
+# Self-closing protection tags (optionally namespace-prefixed)
+PROTECTION_TAG = re.compile(rb"<(?:\w+:)?(?:sheetProtection|workbookProtection)\b[^>]*/>", re.IGNORECASE)
+UNLOCK_CHUNK_SIZE = 1024 * 1024
+
+
+def _is_protectable(member_name):
+    return member_name == "xl/workbook.xml" or (
+        member_name.startswith("xl/worksheets/") and member_name.endswith(".xml")
+    )
+
+
+def _strip_protection(src, dst, chunk_size=UNLOCK_CHUNK_SIZE):
+    """
+    Copy one XML member, dropping protection tags on the fly. Everything
+    from the last "<" of a chunk is held back so a tag is never split.
+    """
+    carry = b""
+    while True:
+        chunk = src.read(chunk_size)
+        data = carry + chunk
+        if not chunk:
+            dst.write(PROTECTION_TAG.sub(b"", data))
+            return
+        cut = data.rfind(b"<")
+        if cut == -1:
+            cut = len(data)
+        dst.write(PROTECTION_TAG.sub(b"", data[:cut]))
+        carry = data[cut:]
+
+
+def unlock_xlsx(source):
+    """
+    In-memory copy of an .xlsx (path or file-like) without
+    sheetProtection / workbookProtection. Members are streamed from the
+    upload into a BytesIO zip chunk by chunk; nothing touches disk.
+    Returns the buffer, rewound.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(source, "r") as zin, \
+            zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zout:
+        for info in zin.infolist():
+            target = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+            target.compress_type = zipfile.ZIP_DEFLATED
+            target.external_attr = info.external_attr
+            with zin.open(info) as src, zout.open(target, "w") as dst:
+                if _is_protectable(info.filename):
+                    _strip_protection(src, dst)
+                else:
+                    shutil.copyfileobj(src, dst, UNLOCK_CHUNK_SIZE)
+    buffer.seek(0)
+    return buffer
+
+
+def load_excel_to_df(source):
     try:
-        unlock_xlsx(file_path, unlocked_path)
-        df = pd.read_excel(unlocked_path)
+        df = pd.read_excel(unlock_xlsx(source))
     except Exception:
-        df = pd.read_excel(file_path)
+        if hasattr(source, "seek"):
+            source.seek(0)
+        df = pd.read_excel(source)
     return df
 
 
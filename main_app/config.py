@@ -17,6 +17,19 @@ class Config:
     # API Configuration
     API_TIMEOUT = 30
 
+    # Payroll run (sharded mode): worker processes, None = CPU count
+    PAYROLL_SHARD_WORKERS = None
+
+    # Payroll run (default mode): employees committed per checkpointed chunk
+    PAYROLL_RUN_CHUNK_SIZE = 500
+
+    # Attendance upload (several workbooks / ZIP): processes in the shared spawn-context
+    # parse pool, None = CPU count
+    ATTENDANCE_IMPORT_WORKERS = None
+
+    # Background attendance import jobs: worker threads in the web process
+    ATTENDANCE_JOB_WORKERS = 2
+
     MAIL_SERVER = 'smtp.gmail.com'
     MAIL_PORT = 465
     MAIL_USE_SSL = True
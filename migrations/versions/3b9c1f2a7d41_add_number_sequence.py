@@ -0,0 +1,29 @@
+"""Add number_sequence counter table
+
+Revision ID: 3b9c1f2a7d41
+Revises: ee3e65a96dd9
+Create Date: 2026-10-17 09:12:04.218733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9c1f2a7d41'
+down_revision = 'ee3e65a96dd9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    number_sequence = op.create_table('number_sequence',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('next_value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(number_sequence, [{'name': 'payslip', 'next_value': 1}])
+
+
+def downgrade():
+    op.drop_table('number_sequence')
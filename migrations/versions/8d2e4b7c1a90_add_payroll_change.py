@@ -0,0 +1,33 @@
+"""Add payroll_change dirty-tracking table
+
+Revision ID: 8d2e4b7c1a90
+Revises: 3b9c1f2a7d41
+Create Date: 2026-10-17 10:41:27.530912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e4b7c1a90'
+down_revision = '3b9c1f2a7d41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('payroll_change',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('pay_period_id', sa.Integer(), nullable=False),
+    sa.Column('marked_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employee.id'], ),
+    sa.ForeignKeyConstraint(['pay_period_id'], ['payroll_period.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('employee_id', 'pay_period_id', name='uq_payroll_change_employee_period')
+    )
+
+
+def downgrade():
+    op.drop_table('payroll_change')
@@ -0,0 +1,29 @@
+"""Add payroll.source to tell engine rows from manual entries
+
+Revision ID: a6d2f9c4e813
+Revises: f3c6d8e1a507
+Create Date: 2026-10-17 19:12:36.204517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d2f9c4e813'
+down_revision = 'f3c6d8e1a507'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows cannot be attributed reliably, so they are treated as
+    # manual entries and never overwritten by the incremental recompute.
+    with op.batch_alter_table('payroll') as batch_op:
+        batch_op.add_column(sa.Column('source', sa.String(length=20), nullable=False,
+                                      server_default='Manual'))
+
+
+def downgrade():
+    with op.batch_alter_table('payroll') as batch_op:
+        batch_op.drop_column('source')
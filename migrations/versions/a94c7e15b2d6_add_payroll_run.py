@@ -0,0 +1,39 @@
+"""Add payroll_run job table
+
+Revision ID: a94c7e15b2d6
+Revises: f2b86c4d0e53
+Create Date: 2026-10-17 13:48:30.215774
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a94c7e15b2d6'
+down_revision = 'f2b86c4d0e53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('payroll_run',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('pay_period_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('chunk_size', sa.Integer(), nullable=False),
+    sa.Column('last_employee_id', sa.Integer(), nullable=False),
+    sa.Column('processed_count', sa.Integer(), nullable=False),
+    sa.Column('generated_count', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('started_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['pay_period_id'], ['payroll_period.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('payroll_run')
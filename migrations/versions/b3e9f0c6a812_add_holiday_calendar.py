@@ -0,0 +1,46 @@
+"""Add holiday table for the business calendar
+
+Revision ID: b3e9f0c6a812
+Revises: a94c7e15b2d6
+Create Date: 2026-10-17 14:21:07.380259
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import date
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e9f0c6a812'
+down_revision = 'a94c7e15b2d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    holiday = op.create_table('holiday',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('holiday_type', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('date')
+    )
+    # 2025 Philippine holidays (previously hard-coded in test_api.py)
+    op.bulk_insert(holiday, [
+        {'date': date(2025, 1, 1), 'name': "New Year's Day", 'holiday_type': 'Regular'},
+        {'date': date(2025, 2, 25), 'name': 'EDSA People Power Revolution Anniversary', 'holiday_type': 'Special'},
+        {'date': date(2025, 3, 31), 'name': "Eid'l Fitr", 'holiday_type': 'Regular'},
+        {'date': date(2025, 4, 9), 'name': 'Araw ng Kagitingan', 'holiday_type': 'Regular'},
+        {'date': date(2025, 5, 1), 'name': 'Labor Day', 'holiday_type': 'Regular'},
+        {'date': date(2025, 6, 12), 'name': 'Independence Day', 'holiday_type': 'Regular'},
+        {'date': date(2025, 8, 21), 'name': 'Ninoy Aquino Day', 'holiday_type': 'Special'},
+        {'date': date(2025, 8, 25), 'name': 'National Heroes Day', 'holiday_type': 'Regular'},
+        {'date': date(2025, 11, 1), 'name': "All Saints' Day", 'holiday_type': 'Special'},
+        {'date': date(2025, 11, 2), 'name': "All Souls' Day", 'holiday_type': 'Special'},
+    ])
+
+
+def downgrade():
+    op.drop_table('holiday')
@@ -0,0 +1,34 @@
+"""Add contribution_schedule rate table
+
+Revision ID: c51f0a9e3b27
+Revises: 8d2e4b7c1a90
+Create Date: 2026-10-17 11:26:53.104382
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c51f0a9e3b27'
+down_revision = '8d2e4b7c1a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('contribution_schedule',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('contribution', sa.String(length=20), nullable=False),
+    sa.Column('min_salary', sa.Float(), nullable=False),
+    sa.Column('max_salary', sa.Float(), nullable=False),
+    sa.Column('rate', sa.Float(), nullable=True),
+    sa.Column('fixed_amount', sa.Float(), nullable=True),
+    sa.Column('active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('contribution_schedule')
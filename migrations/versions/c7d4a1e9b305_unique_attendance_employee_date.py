@@ -0,0 +1,33 @@
+"""Unique attendance row per employee and date
+
+Revision ID: c7d4a1e9b305
+Revises: b3e9f0c6a812
+Create Date: 2026-10-17 15:06:42.118904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d4a1e9b305'
+down_revision = 'b3e9f0c6a812'
+branch_labels = None
+depends_on = None
+
+
+# Older imports could store the same day twice; the latest row wins
+DUPLICATE_IDS = (
+    "SELECT a.id FROM attendance a WHERE a.id < "
+    "(SELECT MAX(b.id) FROM attendance b WHERE b.employee_id = a.employee_id AND b.date = a.date)"
+)
+
+
+def upgrade():
+    op.execute(f"DELETE FROM late_computation WHERE attendance_id IN ({DUPLICATE_IDS})")
+    op.execute(f"DELETE FROM attendance WHERE id IN ({DUPLICATE_IDS})")
+    op.create_index('uq_attendance_employee_date', 'attendance', ['employee_id', 'date'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_attendance_employee_date', table_name='attendance')
@@ -0,0 +1,49 @@
+"""Add attendance_import_batch staging table
+
+Revision ID: d5f8b2a4c916
+Revises: c7d4a1e9b305
+Create Date: 2026-10-17 15:48:33.604127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f8b2a4c916'
+down_revision = 'c7d4a1e9b305'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('attendance_import_batch',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('batch_id', sa.String(length=32), nullable=False),
+    sa.Column('employee_ref', sa.String(length=50), nullable=True),
+    sa.Column('name', sa.String(length=255), nullable=True),
+    sa.Column('department', sa.String(length=100), nullable=True),
+    sa.Column('day', sa.String(length=50), nullable=True),
+    sa.Column('matched', sa.Boolean(), nullable=True),
+    sa.Column('employee_id', sa.Integer(), nullable=True),
+    sa.Column('date', sa.Date(), nullable=True),
+    sa.Column('time_in', sa.Time(), nullable=True),
+    sa.Column('time_out', sa.Time(), nullable=True),
+    sa.Column('status', sa.String(length=50), nullable=True),
+    sa.Column('working_hours', sa.Float(), nullable=True),
+    sa.Column('late_hours', sa.Integer(), nullable=True),
+    sa.Column('late_minutes', sa.Integer(), nullable=True),
+    sa.Column('day_equivalent', sa.Float(), nullable=True),
+    sa.Column('already_exists', sa.Boolean(), nullable=True),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['created_by'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['employee_id'], ['employee.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_attendance_import_batch_batch_id'), 'attendance_import_batch', ['batch_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_attendance_import_batch_batch_id'), table_name='attendance_import_batch')
+    op.drop_table('attendance_import_batch')
@@ -0,0 +1,76 @@
+"""Add employee_compensation_profile table
+
+Revision ID: e7a3d92c5f18
+Revises: c51f0a9e3b27
+Create Date: 2026-10-17 12:08:41.662590
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3d92c5f18'
+down_revision = 'c51f0a9e3b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    profile = op.create_table('employee_compensation_profile',
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('allowance_total', sa.BigInteger(), nullable=True),
+    sa.Column('sss', sa.BigInteger(), nullable=True),
+    sa.Column('philhealth', sa.BigInteger(), nullable=True),
+    sa.Column('pagibig', sa.BigInteger(), nullable=True),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employee.id'], ),
+    sa.PrimaryKeyConstraint('employee_id')
+    )
+
+    # Backfill from the existing benefit links. Amounts are stored as integer
+    # centavos (the Money type); the source columns are still float pesos here.
+    employee = sa.table('employee', sa.column('id', sa.Integer))
+    allowance = sa.table('allowance', sa.column('id', sa.Integer), sa.column('amount', sa.Float))
+    deduction = sa.table('deduction', sa.column('id', sa.Integer), sa.column('name', sa.String),
+                         sa.column('amount', sa.Float))
+    employee_allowances = sa.table('employee_allowances', sa.column('employee_id', sa.Integer),
+                                   sa.column('allowance_id', sa.Integer))
+    employee_deductions = sa.table('employee_deductions', sa.column('employee_id', sa.Integer),
+                                   sa.column('deduction_id', sa.Integer))
+
+    bind = op.get_bind()
+    now = datetime.utcnow()
+    def centavos(amount):
+        return int((Decimal(str(amount or 0)) * 100).to_integral_value(ROUND_HALF_UP))
+
+    rows = {
+        emp_id: {'employee_id': emp_id, 'allowance_total': 0, 'sss': 0, 'philhealth': 0,
+                 'pagibig': 0, 'refreshed_at': now}
+        for emp_id in bind.execute(sa.select(employee.c.id)).scalars()
+    }
+
+    for emp_id, amount in bind.execute(
+        sa.select(employee_allowances.c.employee_id, allowance.c.amount)
+        .join(allowance, allowance.c.id == employee_allowances.c.allowance_id)
+    ):
+        if emp_id in rows:
+            rows[emp_id]['allowance_total'] += centavos(amount)
+
+    shares = {'sss': 'sss', 'philhealth': 'philhealth', 'pag-ibig': 'pagibig', 'pagibig': 'pagibig'}
+    for emp_id, name, amount in bind.execute(
+        sa.select(employee_deductions.c.employee_id, deduction.c.name, deduction.c.amount)
+        .join(deduction, deduction.c.id == employee_deductions.c.deduction_id)
+    ):
+        key = shares.get((name or '').lower())
+        if emp_id in rows and key:
+            rows[emp_id][key] += centavos(amount)
+
+    if rows:
+        op.bulk_insert(profile, list(rows.values()))
+
+
+def downgrade():
+    op.drop_table('employee_compensation_profile')
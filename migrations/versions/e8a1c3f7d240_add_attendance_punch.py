@@ -0,0 +1,42 @@
+"""Add append-only attendance_punch and attendance_daily_summary
+
+Revision ID: e8a1c3f7d240
+Revises: d5f8b2a4c916
+Create Date: 2026-10-17 17:20:41.552087
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a1c3f7d240'
+down_revision = 'd5f8b2a4c916'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('attendance_punch',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('punched_at', sa.Integer(), nullable=False),
+    sa.Column('device_id', sa.SmallInteger(), nullable=False),
+    sa.Column('flag', sa.SmallInteger(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('employee_id', 'punched_at', 'device_id', name='uq_attendance_punch')
+    )
+    op.create_table('attendance_daily_summary',
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('time_in', sa.Time(), nullable=True),
+    sa.Column('time_out', sa.Time(), nullable=True),
+    sa.Column('punch_count', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('employee_id', 'date')
+    )
+
+
+def downgrade():
+    op.drop_table('attendance_daily_summary')
+    op.drop_table('attendance_punch')
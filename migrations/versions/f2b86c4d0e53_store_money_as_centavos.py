@@ -0,0 +1,54 @@
+"""Store money columns as integer centavos
+
+Revision ID: f2b86c4d0e53
+Revises: e7a3d92c5f18
+Create Date: 2026-10-17 13:02:15.947120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b86c4d0e53'
+down_revision = 'e7a3d92c5f18'
+branch_labels = None
+depends_on = None
+
+
+MONEY_COLUMNS = {
+    'payroll': ['basic_salary', 'overtime_pay', 'holiday_pay', 'night_differential', 'gross_pay',
+                'sss_contribution', 'philhealth_contribution', 'pagibig_contribution', 'tax_withheld',
+                'other_deductions', 'total_deductions', 'net_pay'],
+    'payslip': ['basic_salary', 'overtime_pay', 'holiday_pay', 'night_differential', 'allowances',
+                'gross_pay', 'sss_contribution', 'philhealth_contribution', 'pagibig_contribution',
+                'tax_withheld', 'other_deductions', 'total_deductions', 'net_pay'],
+    'deduction': ['amount'],
+    'allowance': ['amount'],
+    'tax': ['min_income', 'max_income', 'fixed_amount'],
+    'contribution_schedule': ['min_salary', 'max_salary', 'fixed_amount'],
+}
+
+
+def upgrade():
+    for table, columns in MONEY_COLUMNS.items():
+        # pesos -> centavos while the columns are still floating point
+        op.execute(
+            f"UPDATE {table} SET "
+            + ", ".join(f"{c} = ROUND({c} * 100)" for c in columns)
+        )
+        with op.batch_alter_table(table) as batch_op:
+            for c in columns:
+                batch_op.alter_column(c, existing_type=sa.Float(), type_=sa.BigInteger(),
+                                      postgresql_using=f'{c}::bigint')
+
+
+def downgrade():
+    for table, columns in MONEY_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for c in columns:
+                batch_op.alter_column(c, existing_type=sa.BigInteger(), type_=sa.Float())
+        op.execute(
+            f"UPDATE {table} SET "
+            + ", ".join(f"{c} = {c} / 100.0" for c in columns)
+        )
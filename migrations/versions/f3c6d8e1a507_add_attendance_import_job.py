@@ -0,0 +1,44 @@
+"""Add attendance_import_job table for background imports
+
+Revision ID: f3c6d8e1a507
+Revises: e8a1c3f7d240
+Create Date: 2026-10-17 18:05:12.640318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c6d8e1a507'
+down_revision = 'e8a1c3f7d240'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('attendance_import_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('rows_parsed', sa.Integer(), nullable=False),
+    sa.Column('rows_matched', sa.Integer(), nullable=False),
+    sa.Column('rows_inserted', sa.Integer(), nullable=False),
+    sa.Column('rows_updated', sa.Integer(), nullable=False),
+    sa.Column('rows_skipped', sa.Integer(), nullable=False),
+    sa.Column('batch_id', sa.String(length=32), nullable=True),
+    sa.Column('message', sa.String(length=255), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('started_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_attendance_import_job_batch_id'), 'attendance_import_job', ['batch_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_attendance_import_job_batch_id'), table_name='attendance_import_job')
+    op.drop_table('attendance_import_job')
@@ -0,0 +1,156 @@
+from main_app.extensions import db
+from payroll_system.payroll.models.payroll_models import Tax, ContributionSchedule
+from sqlalchemy import select, func, cast, Float
+import numpy as np
+
+
+# =========================================================
+# DEFAULT RATE TABLES
+# =========================================================
+# Brackets are (min, max, rate, fixed_amount):
+#   amount = fixed_amount + rate * (value - min)   for min < value <= max
+# Used when the database has no active rows for a table.
+INF = float("inf")
+
+DEFAULT_CONTRIBUTION_SCHEDULES = {
+    # SSS (2025, employee share): 135 floor, 4.5%, 1,125 ceiling
+    "sss": [
+        (0, 3250, 0, 135),
+        (3250, 24749.99, 0.045, 146.25),
+        (24749.99, INF, 0, 1125),
+    ],
+    # PhilHealth (2025): 5% of salary within 10k-100k, split equally
+    "philhealth": [
+        (0, 10000, 0, 250),
+        (10000, 100000, 0.025, 250),
+        (100000, INF, 0, 2500),
+    ],
+    # Pag-IBIG: 1% up to 1,500, 2% above
+    "pagibig": [
+        (0, 1500, 0.01, 0),
+        (1500, INF, 0.02, 30),
+    ],
+}
+
+# Withholding tax on monthly gross (TRAIN law)
+DEFAULT_TAX_BRACKETS = [
+    (0, 20833, 0, 0),
+    (20833, 33333, 0.20, 0),
+    (33333, 66667, 0.25, 2500),
+    (66667, 166667, 0.30, 10833),
+    (166667, 666667, 0.32, 40833.33),
+    (666667, INF, 0.35, 200833.33),
+]
+
+
+# =========================================================
+# COMPILED RATE TABLE
+# =========================================================
+class RateTable:
+    """A bracket schedule compiled to sorted arrays, evaluated with np.searchsorted."""
+
+    def __init__(self, brackets):
+        brackets = sorted(brackets, key=lambda b: b[1])
+        self.lower = np.array([b[0] for b in brackets], dtype=float)
+        self.upper = np.array([b[1] for b in brackets], dtype=float)
+        self.rate = np.array([b[2] for b in brackets], dtype=float)
+        self.fixed = np.array([b[3] for b in brackets], dtype=float)
+
+    def __call__(self, values):
+        values = np.nan_to_num(np.asarray(values, dtype=float))
+        if len(self.upper) == 0:
+            return np.zeros(values.shape, dtype=float)
+
+        # First bracket whose upper bound is >= value; above the top bracket stays in it
+        idx = np.minimum(np.searchsorted(self.upper, values, side="left"), len(self.upper) - 1)
+        return self.fixed[idx] + self.rate[idx] * np.maximum(values - self.lower[idx], 0)
+
+    def __len__(self):
+        return len(self.upper)
+
+
+# =========================================================
+# CACHE
+# =========================================================
+# Compiled once per process and reused while the version of the active
+# Tax / ContributionSchedule rows is unchanged. The version is read from the
+# database on every lookup, so edits from other workers, bulk update(),
+# migrations or raw SQL are picked up too.
+_rate_tables = {"version": None, "tables": None}
+
+
+def _rate_table_fingerprint(table, *values):
+    """Row count, max id and a weighted checksum of one table's active rows."""
+    checksum = sum((table.c.id + weight) * func.coalesce(value, 0)
+                   for weight, value in enumerate(values, start=1))
+    return [
+        select(column).where(table.c.active.is_(True)).scalar_subquery()
+        for column in (func.count(), func.max(table.c.id), cast(func.sum(checksum), Float))
+    ]
+
+
+def rate_table_version(session=None):
+    """Cheap version of the active tax brackets and contribution schedules (one query)."""
+    session = session or db.session
+    tax, schedule = Tax.__table__, ContributionSchedule.__table__
+    return tuple(session.execute(select(
+        *_rate_table_fingerprint(tax, tax.c.min_income, tax.c.max_income, tax.c.tax_rate,
+                                 tax.c.fixed_amount),
+        *_rate_table_fingerprint(schedule, func.length(schedule.c.contribution), schedule.c.min_salary,
+                                 schedule.c.max_salary, schedule.c.rate, schedule.c.fixed_amount),
+    )).one())
+
+
+def load_rate_tables(session=None):
+    """Compile the active tax brackets and contribution schedules (with defaults)."""
+    session = session or db.session
+
+    tax_rows = session.query(
+        Tax.min_income, Tax.max_income, Tax.tax_rate, Tax.fixed_amount
+    ).filter(Tax.active.is_(True)).all()
+    tables = {
+        "tax": RateTable(
+            [(t.min_income, t.max_income, (t.tax_rate or 0) / 100, t.fixed_amount or 0) for t in tax_rows]
+            or DEFAULT_TAX_BRACKETS
+        )
+    }
+
+    schedule_rows = session.query(
+        ContributionSchedule.contribution, ContributionSchedule.min_salary,
+        ContributionSchedule.max_salary, ContributionSchedule.rate, ContributionSchedule.fixed_amount
+    ).filter(ContributionSchedule.active.is_(True)).all()
+    for name, defaults in DEFAULT_CONTRIBUTION_SCHEDULES.items():
+        rows = [
+            (r.min_salary, r.max_salary, (r.rate or 0) / 100, r.fixed_amount or 0)
+            for r in schedule_rows if r.contribution == name
+        ]
+        tables[name] = RateTable(rows or defaults)
+
+    return tables
+
+
+def get_rate_tables(session=None):
+    """Compiled rate tables, recompiled only when the rate table version changes."""
+    version = rate_table_version(session)
+    if _rate_tables["version"] != version:
+        _rate_tables.update(version=version, tables=load_rate_tables(session))
+    return _rate_tables["tables"]
+
+
+# =========================================================
+# BATCH API
+# =========================================================
+def compute_contributions(basic_salary, gross_pay, session=None):
+    """
+    Government contributions and withholding tax for whole salary vectors.
+    SSS / PhilHealth / Pag-IBIG use the basic salary, tax uses gross pay.
+    Returns a dict of arrays.
+    """
+    tables = get_rate_tables(session)
+    basic_salary = np.asarray(basic_salary, dtype=float)
+    return {
+        "sss_contribution": tables["sss"](basic_salary),
+        "philhealth_contribution": tables["philhealth"](basic_salary),
+        "pagibig_contribution": tables["pagibig"](basic_salary),
+        "tax_withheld": tables["tax"](gross_pay),
+    }
@@ -0,0 +1,116 @@
+from main_app.extensions import db
+from hr_system.hr.models.hr_models import Employee, Department
+from payroll_system.payroll.models.payroll_models import (
+    Payroll, Deduction, Allowance, EmployeeDeduction, EmployeeAllowance
+)
+from sqlalchemy import select, func
+from tempfile import SpooledTemporaryFile
+import xlsxwriter
+
+
+# =========================================================
+# PAYROLL REGISTER EXPORT (streaming)
+# =========================================================
+# Rows are read with yield_per and written through xlsxwriter in
+# constant_memory mode into a spooled temp file, so memory stays
+# bounded by one fetch batch and one worksheet row at any size.
+EXPORT_YIELD_PER = 2000                 # payroll rows fetched per round trip
+EXPORT_SPOOL_SIZE = 16 * 1024 * 1024    # bytes kept in memory before spilling to disk
+
+PAYROLL_EXPORT_HEADERS = [
+    "Employee ID", "Name", "Department", "Basic Salary", "Overtime Hours", "Overtime Pay",
+    "Holiday Pay", "Night Differential", "Allowances", "Gross Pay", "SSS", "PhilHealth",
+    "Pag-IBIG", "Tax Withheld", "Other Deductions", "Linked Deductions", "Total Deductions",
+    "Net Pay", "Status", "Pay Period",
+]
+
+
+def _linked_totals(link, item, fk):
+    """employee id -> sum of active linked allowance / deduction amounts (one grouped query)."""
+    rows = db.session.execute(
+        select(link.employee_id, func.sum(item.amount))
+        .join(item, fk == item.id)
+        .where(item.active.is_(True))
+        .group_by(link.employee_id)
+    )
+    return {employee_id: total or 0 for employee_id, total in rows}
+
+
+def payroll_export_rows(search="", department_id=None, pay_period_id=None):
+    """
+    Yield one register row (list, PAYROLL_EXPORT_HEADERS order) per payroll
+    matching the filters. Payroll columns are streamed with yield_per;
+    linked allowance / deduction totals are loaded once per employee.
+    """
+    deductions = _linked_totals(EmployeeDeduction, Deduction, EmployeeDeduction.deduction_id)
+    allowances = _linked_totals(EmployeeAllowance, Allowance, EmployeeAllowance.allowance_id)
+
+    stmt = (
+        select(
+            Payroll.employee_id, Employee.employee_id.label("employee_code"),
+            Employee.first_name, Employee.last_name, Department.name.label("department_name"),
+            Payroll.basic_salary, Payroll.overtime_hours, Payroll.overtime_pay, Payroll.holiday_pay,
+            Payroll.night_differential, Payroll.gross_pay, Payroll.sss_contribution,
+            Payroll.philhealth_contribution, Payroll.pagibig_contribution, Payroll.tax_withheld,
+            Payroll.other_deductions, Payroll.total_deductions, Payroll.net_pay, Payroll.status,
+            Payroll.pay_period_start, Payroll.pay_period_end,
+        )
+        .join(Employee, Payroll.employee_id == Employee.id)
+        .outerjoin(Department, Employee.department_id == Department.id)
+        .order_by(Payroll.id)
+        .execution_options(yield_per=EXPORT_YIELD_PER)
+    )
+    if search:
+        stmt = stmt.where(
+            Employee.first_name.ilike(f"%{search}%") | Employee.last_name.ilike(f"%{search}%")
+        )
+    if department_id:
+        stmt = stmt.where(Employee.department_id == department_id)
+    if pay_period_id:
+        stmt = stmt.where(Payroll.pay_period_id == pay_period_id)
+
+    for p in db.session.execute(stmt):
+        linked_deductions = deductions.get(p.employee_id, 0)
+        total_allowances = allowances.get(p.employee_id, 0)
+        yield [
+            p.employee_code,
+            f"{p.first_name} {p.last_name}",
+            p.department_name or "-",
+            p.basic_salary or 0,
+            p.overtime_hours or 0,
+            p.overtime_pay or 0,
+            p.holiday_pay or 0,
+            p.night_differential or 0,
+            total_allowances,
+            (p.gross_pay or 0) + total_allowances,
+            p.sss_contribution or 0,
+            p.philhealth_contribution or 0,
+            p.pagibig_contribution or 0,
+            p.tax_withheld or 0,
+            p.other_deductions or 0,
+            linked_deductions,
+            (p.total_deductions or 0) + linked_deductions,
+            p.net_pay or 0,
+            p.status,
+            f"{p.pay_period_start} - {p.pay_period_end}",
+        ]
+
+
+def write_payroll_register(rows, sheet_name="Payroll"):
+    """
+    Write register rows to an .xlsx in a SpooledTemporaryFile, rewound
+    and ready for send_file. xlsxwriter's constant_memory mode flushes
+    each row to disk as soon as the next one starts.
+    """
+    output = SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True, "in_memory": False})
+    worksheet = workbook.add_worksheet(sheet_name)
+    bold = workbook.add_format({"bold": True})
+
+    worksheet.write_row(0, 0, PAYROLL_EXPORT_HEADERS, bold)
+    for row_num, row in enumerate(rows, start=1):
+        worksheet.write_row(row_num, 0, row)
+
+    workbook.close()
+    output.seek(0)
+    return output
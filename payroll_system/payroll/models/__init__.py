@@ -6,9 +6,14 @@ from .payroll_models import (
     Deduction,
     Allowance,
     Tax,
+    ContributionSchedule,
     PayrollPeriod,
+    PayrollRun,
     EmployeeAllowance,
-    EmployeeDeduction
+    EmployeeDeduction,
+    NumberSequence,
+    PayrollChange,
+    EmployeeCompensationProfile
 )
 
 # Import Employee separately from HR module
@@ -19,8 +24,13 @@ __all__ = [
     "Deduction",
     "Allowance",
     "Tax",
+    "ContributionSchedule",
     "PayrollPeriod",
+    "PayrollRun",
     "EmployeeAllowance",
     "EmployeeDeduction",
+    "NumberSequence",
+    "PayrollChange",
+    "EmployeeCompensationProfile",
     "Employee"
 ]
\ No newline at end of file
@@ -1,6 +1,55 @@
 from main_app.extensions import db
 from datetime import datetime
-from hr_system.hr.models.hr_models import Employee
+from itertools import chain
+from sqlalchemy import event, inspect, select, insert, delete, func, case
+from sqlalchemy.orm import Session
+from sqlalchemy.types import TypeDecorator, BigInteger
+from decimal import Decimal, ROUND_HALF_UP
+from hr_system.hr.models.hr_models import Employee, Attendance
+
+
+# =========================================================
+# CONSTANTS
+# =========================================================
+MONTHLY_WORK_HOURS = 160    # full-time hours per month (hourly rate basis)
+OVERTIME_MULTIPLIER = 1.25  # overtime premium over the hourly rate
+
+# Payroll.source: who wrote the row. Only engine rows are refreshed by recompute.
+PAYROLL_SOURCE_MANUAL = "Manual"   # regular / casual / part-time entry screens
+PAYROLL_SOURCE_RUN = "Run"         # period payroll engine (payroll_run.py)
+
+
+# =========================================================
+# MONEY COLUMN TYPE
+# =========================================================
+def to_centavos(value):
+    """Pesos -> integer centavos, rounded half-up (how Money stores amounts)."""
+    return int((Decimal(str(value)) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def round_money(value):
+    """Pesos rounded to the centavo exactly as a Money column stores them."""
+    return to_centavos(value or 0) / 100
+
+
+class Money(TypeDecorator):
+    """
+    Currency stored as integer centavos (exact SUMs in SQL).
+    Python side stays in pesos: floats in, floats out, rounded half-up
+    to the centavo on write.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return to_centavos(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return value / 100
 
 
 # =========================================================
@@ -14,26 +63,28 @@ class Payroll(db.Model):
     pay_period_id = db.Column(db.Integer, db.ForeignKey('payroll_period.id'), nullable=False)
     pay_period_start = db.Column(db.Date, nullable=False)
     pay_period_end = db.Column(db.Date, nullable=False)
-    basic_salary = db.Column(db.Float, nullable=False)
+    basic_salary = db.Column(Money, nullable=False)
 
     # 🕒 Added for time-based computation
     working_hours = db.Column(db.Float, default=0)
 
     overtime_hours = db.Column(db.Float, default=0)
-    overtime_pay = db.Column(db.Float, default=0)
-    holiday_pay = db.Column(db.Float, default=0)
-    night_differential = db.Column(db.Float, default=0)
-    gross_pay = db.Column(db.Float, nullable=False, default=0)
-
-    sss_contribution = db.Column(db.Float, default=0)
-    philhealth_contribution = db.Column(db.Float, default=0)
-    pagibig_contribution = db.Column(db.Float, default=0)
-    tax_withheld = db.Column(db.Float, default=0)
-    other_deductions = db.Column(db.Float, default=0)
-    total_deductions = db.Column(db.Float, default=0)
-    net_pay = db.Column(db.Float, nullable=False, default=0)
+    overtime_pay = db.Column(Money, default=0)
+    holiday_pay = db.Column(Money, default=0)
+    night_differential = db.Column(Money, default=0)
+    gross_pay = db.Column(Money, nullable=False, default=0)
+
+    sss_contribution = db.Column(Money, default=0)
+    philhealth_contribution = db.Column(Money, default=0)
+    pagibig_contribution = db.Column(Money, default=0)
+    tax_withheld = db.Column(Money, default=0)
+    other_deductions = db.Column(Money, default=0)
+    total_deductions = db.Column(Money, default=0)
+    net_pay = db.Column(Money, nullable=False, default=0)
 
     status = db.Column(db.String(50), default="Draft")
+    source = db.Column(db.String(20), nullable=False, default=PAYROLL_SOURCE_MANUAL,
+                       server_default=PAYROLL_SOURCE_MANUAL)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -54,11 +105,11 @@ class Payroll(db.Model):
         night_diff = self.night_differential or 0
 
         # 🕒 Hourly rate (assuming 160 hrs per month = full-time)
-        hourly_rate = basic / 160 if basic > 0 else 0
+        hourly_rate = basic / MONTHLY_WORK_HOURS if basic > 0 else 0
         base_earnings = hourly_rate * work_hours
 
         # 💪 Overtime = 1.25x hourly rate × overtime hours
-        self.overtime_pay = hourly_rate * 1.25 * overtime_hours
+        self.overtime_pay = hourly_rate * OVERTIME_MULTIPLIER * overtime_hours
 
         # 💰 Compute gross pay
         self.gross_pay = base_earnings + self.overtime_pay + holiday + night_diff
@@ -114,19 +165,19 @@ class Payslip(db.Model):
     payslip_number = db.Column(db.String(50), unique=True, nullable=False)
     pay_period_start = db.Column(db.Date, nullable=False)
     pay_period_end = db.Column(db.Date, nullable=False)
-    basic_salary = db.Column(db.Float, nullable=False)
-    overtime_pay = db.Column(db.Float, default=0)
-    holiday_pay = db.Column(db.Float, default=0)
-    night_differential = db.Column(db.Float, default=0)
-    allowances = db.Column(db.Float, default=0)
-    gross_pay = db.Column(db.Float, nullable=False)
-    sss_contribution = db.Column(db.Float, default=0)
-    philhealth_contribution = db.Column(db.Float, default=0)
-    pagibig_contribution = db.Column(db.Float, default=0)
-    tax_withheld = db.Column(db.Float, default=0)
-    other_deductions = db.Column(db.Float, default=0)
-    total_deductions = db.Column(db.Float, default=0)
-    net_pay = db.Column(db.Float, nullable=False)
+    basic_salary = db.Column(Money, nullable=False)
+    overtime_pay = db.Column(Money, default=0)
+    holiday_pay = db.Column(Money, default=0)
+    night_differential = db.Column(Money, default=0)
+    allowances = db.Column(Money, default=0)
+    gross_pay = db.Column(Money, nullable=False)
+    sss_contribution = db.Column(Money, default=0)
+    philhealth_contribution = db.Column(Money, default=0)
+    pagibig_contribution = db.Column(Money, default=0)
+    tax_withheld = db.Column(Money, default=0)
+    other_deductions = db.Column(Money, default=0)
+    total_deductions = db.Column(Money, default=0)
+    net_pay = db.Column(Money, nullable=False)
     generated_at = db.Column(db.DateTime, default=datetime.utcnow)
     generated_by = db.Column(db.Integer)
     status = db.Column(db.String(50), default="Generated")
@@ -144,6 +195,19 @@ class Payslip(db.Model):
         return f'<Payslip {self.payslip_number}>'
 
 
+# =========================================================
+# NUMBER SEQUENCE (payslip numbers, etc.)
+# =========================================================
+class NumberSequence(db.Model):
+    __tablename__ = "number_sequence"
+
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False, default=1)
+
+    def __repr__(self):
+        return f'<NumberSequence {self.name}={self.next_value}>'
+
+
 # =========================================================
 # DEDUCTION / ALLOWANCE / TAX
 # =========================================================
@@ -154,7 +218,7 @@ class Deduction(db.Model):
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     type = db.Column(db.String(50), nullable=False)
-    amount = db.Column(db.Float, default=0)
+    amount = db.Column(Money, default=0)
     percentage = db.Column(db.Float, default=0)
     is_mandatory = db.Column(db.Boolean, default=False)
     active = db.Column(db.Boolean, default=True)
@@ -173,7 +237,7 @@ class Allowance(db.Model):
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     type = db.Column(db.String(50), nullable=False)
-    amount = db.Column(db.Float, default=0)
+    amount = db.Column(Money, default=0)
     percentage = db.Column(db.Float, default=0)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -188,10 +252,10 @@ class Tax(db.Model):
     __tablename__ = "tax"
 
     id = db.Column(db.Integer, primary_key=True)
-    min_income = db.Column(db.Float, nullable=False)
-    max_income = db.Column(db.Float, nullable=False)
+    min_income = db.Column(Money, nullable=False)
+    max_income = db.Column(Money, nullable=False)
     tax_rate = db.Column(db.Float, nullable=False)
-    fixed_amount = db.Column(db.Float, default=0)
+    fixed_amount = db.Column(Money, default=0)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -199,6 +263,23 @@ class Tax(db.Model):
         return f'<Tax {self.min_income} - {self.max_income}>'
 
 
+class ContributionSchedule(db.Model):
+    """Salary brackets for SSS / PhilHealth / Pag-IBIG (employee share)."""
+    __tablename__ = "contribution_schedule"
+
+    id = db.Column(db.Integer, primary_key=True)
+    contribution = db.Column(db.String(20), nullable=False)   # sss, philhealth, pagibig
+    min_salary = db.Column(Money, nullable=False)
+    max_salary = db.Column(Money, nullable=False)
+    rate = db.Column(db.Float, default=0)                      # % of salary above min_salary
+    fixed_amount = db.Column(Money, default=0)
+    active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ContributionSchedule {self.contribution} {self.min_salary} - {self.max_salary}>'
+
+
 # =========================================================
 # PAYROLL PERIOD
 # =========================================================
@@ -219,6 +300,47 @@ class PayrollPeriod(db.Model):
         return f'<PayrollPeriod {self.period_name}>'
 
 
+# =========================================================
+# PAYROLL RUN JOBS (chunked, resumable)
+# =========================================================
+class PayrollRun(db.Model):
+    __tablename__ = "payroll_run"
+
+    id = db.Column(db.Integer, primary_key=True)
+    pay_period_id = db.Column(db.Integer, db.ForeignKey('payroll_period.id'), nullable=False)
+    status = db.Column(db.String(20), default="Pending")   # Pending, Running, Failed, Completed
+    chunk_size = db.Column(db.Integer, nullable=False, default=500)
+
+    # Checkpoint: every employee with id <= last_employee_id is done
+    last_employee_id = db.Column(db.Integer, nullable=False, default=0)
+    processed_count = db.Column(db.Integer, nullable=False, default=0)
+    generated_count = db.Column(db.Integer, nullable=False, default=0)
+
+    error = db.Column(db.Text)
+    started_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    pay_period = db.relationship('PayrollPeriod', lazy=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "pay_period_id": self.pay_period_id,
+            "status": self.status,
+            "chunk_size": self.chunk_size,
+            "last_employee_id": self.last_employee_id,
+            "processed_count": self.processed_count,
+            "generated_count": self.generated_count,
+            "error": self.error,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f'<PayrollRun {self.id} period={self.pay_period_id} {self.status}>'
+
+
 # =========================================================
 # ASSOCIATION / LINK TABLES
 # =========================================================
@@ -240,3 +362,193 @@ class EmployeeAllowance(db.Model):
 
     employee = db.relationship("Employee", back_populates="employee_allowances")
     allowance = db.relationship("Allowance", back_populates="employee_links")
+
+
+# =========================================================
+# PAYROLL CHANGE TRACKING (dirty employee / period pairs)
+# =========================================================
+class PayrollChange(db.Model):
+    __tablename__ = "payroll_change"
+
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey("employee.id"), nullable=False)
+    pay_period_id = db.Column(db.Integer, db.ForeignKey("payroll_period.id"), nullable=False)
+    marked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("employee_id", "pay_period_id", name="uq_payroll_change_employee_period"),
+    )
+
+    def __repr__(self):
+        return f"<PayrollChange employee={self.employee_id} period={self.pay_period_id}>"
+
+
+def mark_payroll_changes(connection, attendance_keys=(), employee_ids=()):
+    """
+    Record (employee, pay period) pairs whose payroll is out of date.
+    attendance_keys: (employee_id, date) pairs -> periods covering the date.
+    employee_ids: benefit link changes -> every open period.
+    Pairs already marked are skipped. Returns the number of new marks.
+    """
+    period = PayrollPeriod.__table__
+    pairs = set()
+
+    if attendance_keys:
+        dates = [d for _, d in attendance_keys]
+        periods = connection.execute(
+            select(period.c.id, period.c.start_date, period.c.end_date)
+            .where(period.c.start_date <= max(dates), period.c.end_date >= min(dates))
+        ).all()
+        for emp_id, day in attendance_keys:
+            pairs.update((emp_id, p.id) for p in periods if p.start_date <= day <= p.end_date)
+
+    if employee_ids:
+        open_ids = connection.execute(
+            select(period.c.id).where(period.c.status == "Open")
+        ).scalars().all()
+        pairs.update((emp_id, pid) for emp_id in employee_ids for pid in open_ids)
+
+    if not pairs:
+        return 0
+
+    change = PayrollChange.__table__
+    existing = set(connection.execute(
+        select(change.c.employee_id, change.c.pay_period_id)
+        .where(change.c.employee_id.in_({emp_id for emp_id, _ in pairs}))
+    ).all())
+
+    now = datetime.utcnow()
+    rows = [
+        {"employee_id": emp_id, "pay_period_id": pid, "marked_at": now}
+        for emp_id, pid in sorted(pairs - existing)
+    ]
+    if rows:
+        connection.execute(insert(change), rows)
+    return len(rows)
+
+
+def _history_values(state, key):
+    """Current and pre-flush values of an attribute (both sides of an edit)."""
+    return {v for v in state.attrs[key].history.sum() if v is not None}
+
+
+@event.listens_for(Session, "after_flush")
+def track_payroll_changes(session, flush_context):
+    """Mark payrolls touched by attendance or benefit link writes in this flush."""
+    attendance_keys = set()
+    employee_ids = set()
+
+    modified = (obj for obj in session.dirty if session.is_modified(obj))
+    for obj in chain(session.new, modified, session.deleted):
+        if isinstance(obj, Attendance):
+            state = inspect(obj)
+            for emp_id in _history_values(state, "employee_id"):
+                attendance_keys.update((emp_id, d) for d in _history_values(state, "date"))
+        elif isinstance(obj, (EmployeeAllowance, EmployeeDeduction)):
+            employee_ids.update(_history_values(inspect(obj), "employee_id"))
+
+    if attendance_keys or employee_ids:
+        mark_payroll_changes(session.connection(), attendance_keys, employee_ids)
+
+
+# =========================================================
+# EMPLOYEE COMPENSATION PROFILE (maintained per-employee totals)
+# =========================================================
+class EmployeeCompensationProfile(db.Model):
+    """Allowance / contribution totals per employee, kept in sync on write."""
+    __tablename__ = "employee_compensation_profile"
+
+    employee_id = db.Column(db.Integer, db.ForeignKey("employee.id"), primary_key=True)
+    allowance_total = db.Column(Money, default=0)
+    sss = db.Column(Money, default=0)
+    philhealth = db.Column(Money, default=0)
+    pagibig = db.Column(Money, default=0)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<EmployeeCompensationProfile {self.employee_id}>"
+
+
+PROFILE_REFRESH_CHUNK = 500
+
+
+def refresh_compensation_profiles(connection, employee_ids):
+    """Rebuild the compensation profile rows of the given employees."""
+    ids = sorted(set(employee_ids))
+    for offset in range(0, len(ids), PROFILE_REFRESH_CHUNK):
+        _refresh_profile_chunk(connection, ids[offset:offset + PROFILE_REFRESH_CHUNK])
+    return len(ids)
+
+
+def _refresh_profile_chunk(connection, ids):
+    ea, allowance = EmployeeAllowance.__table__, Allowance.__table__
+    ed, deduction = EmployeeDeduction.__table__, Deduction.__table__
+    profile = EmployeeCompensationProfile.__table__
+
+    now = datetime.utcnow()
+    rows = {
+        emp_id: {"employee_id": emp_id, "allowance_total": 0.0, "sss": 0.0, "philhealth": 0.0,
+                 "pagibig": 0.0, "refreshed_at": now}
+        for emp_id in ids
+    }
+
+    allowance_totals = connection.execute(
+        select(ea.c.employee_id, func.sum(allowance.c.amount))
+        .join(allowance, allowance.c.id == ea.c.allowance_id)
+        .where(ea.c.employee_id.in_(ids))
+        .group_by(ea.c.employee_id)
+    )
+    for emp_id, total in allowance_totals:
+        rows[emp_id]["allowance_total"] = total or 0
+
+    name = func.lower(deduction.c.name)
+
+    def share(*names):
+        return func.sum(case((name.in_(names), deduction.c.amount), else_=0))
+
+    contribution_totals = connection.execute(
+        select(ed.c.employee_id, share("sss"), share("philhealth"), share("pag-ibig", "pagibig"))
+        .join(deduction, deduction.c.id == ed.c.deduction_id)
+        .where(ed.c.employee_id.in_(ids))
+        .group_by(ed.c.employee_id)
+    )
+    for emp_id, sss, philhealth, pagibig in contribution_totals:
+        rows[emp_id].update(sss=sss or 0, philhealth=philhealth or 0, pagibig=pagibig or 0)
+
+    connection.execute(delete(profile).where(profile.c.employee_id.in_(ids)))
+    connection.execute(insert(profile), list(rows.values()))
+
+
+@event.listens_for(Session, "after_flush")
+def track_compensation_profiles(session, flush_context):
+    """Refresh profiles touched by benefit link or benefit item writes."""
+    employee_ids = set()
+    allowance_ids = set()
+    deduction_ids = set()
+
+    modified = (obj for obj in session.dirty if session.is_modified(obj))
+    for obj in chain(session.new, modified, session.deleted):
+        if isinstance(obj, (EmployeeAllowance, EmployeeDeduction)):
+            employee_ids.update(_history_values(inspect(obj), "employee_id"))
+        elif isinstance(obj, Allowance) and obj.id is not None:
+            allowance_ids.add(obj.id)
+        elif isinstance(obj, Deduction) and obj.id is not None:
+            deduction_ids.add(obj.id)
+
+    if not (employee_ids or allowance_ids or deduction_ids):
+        return
+
+    connection = session.connection()
+    if allowance_ids:
+        link = EmployeeAllowance.__table__
+        employee_ids.update(connection.execute(
+            select(link.c.employee_id).where(link.c.allowance_id.in_(allowance_ids))
+        ).scalars())
+    if deduction_ids:
+        link = EmployeeDeduction.__table__
+        employee_ids.update(connection.execute(
+            select(link.c.employee_id).where(link.c.deduction_id.in_(deduction_ids))
+        ).scalars())
+
+    if employee_ids:
+        refresh_compensation_profiles(connection, employee_ids)
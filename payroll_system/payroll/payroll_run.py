@@ -0,0 +1,583 @@
+from main_app.extensions import db
+from hr_system.hr.models.hr_models import Employee, Attendance
+from payroll_system.payroll.models.payroll_models import (
+    Payroll, PayrollPeriod, PayrollRun, PayrollChange, Allowance, Deduction,
+    EmployeeAllowance, EmployeeDeduction, MONTHLY_WORK_HOURS, OVERTIME_MULTIPLIER,
+    PAYROLL_SOURCE_RUN, round_money
+)
+from payroll_system.payroll.contributions import compute_contributions
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import Session
+from datetime import datetime
+import numpy as np
+import multiprocessing
+import os
+import threading
+import time
+
+
+# =========================================================
+# PERIOD PAYROLL RUN ENGINE
+# =========================================================
+# Set-based replacement for the per-employee loop in
+# generate_payrolls: the whole period is loaded with a few
+# column queries, computed as NumPy arrays and bulk-inserted.
+
+# Columns written to the payroll table by a run
+PAYROLL_RUN_COLUMNS = [
+    "basic_salary", "working_hours", "overtime_hours", "overtime_pay",
+    "holiday_pay", "night_differential", "gross_pay",
+    "sss_contribution", "philhealth_contribution", "pagibig_contribution",
+    "tax_withheld", "other_deductions", "total_deductions", "net_pay",
+]
+
+
+def _time_to_seconds(value):
+    """Seconds since midnight for a datetime.time."""
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _column(values, size):
+    """Return values as a float array, or zeros when not supplied."""
+    if values is None:
+        return np.zeros(size, dtype=float)
+    return np.nan_to_num(np.asarray(values, dtype=float))
+
+
+def _group_sum(ids, keys, weights):
+    """Sum weights per entry of the sorted ids array (unknown keys ignored)."""
+    if len(ids) == 0 or len(keys) == 0:
+        return np.zeros(len(ids), dtype=float)
+    pos = np.clip(np.searchsorted(ids, keys), 0, len(ids) - 1)
+    known = ids[pos] == keys
+    return np.bincount(pos[known], weights=weights[known], minlength=len(ids))
+
+
+# =========================================================
+# LOADERS
+# =========================================================
+def load_period_inputs(start_date, end_date, employee_ids=None, session=None):
+    """
+    Load compensation and attendance for a period in two queries.
+    Returns a dict of arrays aligned on employee_ids (sorted):
+    - employee_ids, basic_salary, working_hours
+    """
+    session = session or db.session
+
+    emp_query = session.query(Employee.id, Employee.salary)
+    if employee_ids is not None:
+        emp_query = emp_query.filter(Employee.id.in_(list(employee_ids)))
+    employees = emp_query.order_by(Employee.id).all()
+
+    ids = np.array([e.id for e in employees], dtype=np.int64)
+    basic_salary = np.array([e.salary or 0 for e in employees], dtype=float)
+    working_hours = np.zeros(len(ids), dtype=float)
+
+    if len(ids) == 0:
+        return {"employee_ids": ids, "basic_salary": basic_salary, "working_hours": working_hours}
+
+    att_query = session.query(
+        Attendance.employee_id, Attendance.time_in, Attendance.time_out
+    ).filter(
+        Attendance.date >= start_date,
+        Attendance.date <= end_date,
+        Attendance.time_in.isnot(None),
+        Attendance.time_out.isnot(None)
+    )
+    if employee_ids is not None:
+        att_query = att_query.filter(Attendance.employee_id.in_(ids.tolist()))
+    logs = att_query.all()
+
+    if logs:
+        log_emp = np.array([l.employee_id for l in logs], dtype=np.int64)
+        log_hours = np.array(
+            [_time_to_seconds(l.time_out) - _time_to_seconds(l.time_in) for l in logs],
+            dtype=float
+        ) / 3600
+        working_hours = _group_sum(ids, log_emp, log_hours)
+
+    return {"employee_ids": ids, "basic_salary": basic_salary, "working_hours": working_hours}
+
+
+def load_benefit_rates(ids, session=None):
+    """
+    Linked allowances/deductions per employee, split into fixed amounts and
+    percentages of gross pay (same rules as apply_allowances_and_deductions).
+    Returns arrays aligned on ids: allowance_fixed, allowance_percent,
+    deduction_fixed, deduction_percent.
+    """
+    session = session or db.session
+    rates = {}
+
+    for prefix, link, item, fk in (
+        ("allowance", EmployeeAllowance, Allowance, EmployeeAllowance.allowance_id),
+        ("deduction", EmployeeDeduction, Deduction, EmployeeDeduction.deduction_id),
+    ):
+        query = session.query(
+            link.employee_id, item.type, item.amount, item.percentage
+        ).join(item, fk == item.id).filter(item.active.is_(True))
+        if len(ids):
+            query = query.filter(link.employee_id.in_(ids.tolist()))
+        rows = query.all() if len(ids) else []
+
+        keys = np.array([r.employee_id for r in rows], dtype=np.int64)
+        is_fixed = np.array([(r.type or "").lower() == "fixed" for r in rows], dtype=bool)
+        amount = np.array([r.amount or 0 for r in rows], dtype=float)
+        percent = np.array([r.percentage or 0 for r in rows], dtype=float)
+
+        rates[f"{prefix}_fixed"] = _group_sum(ids, keys, np.where(is_fixed, amount, 0.0))
+        rates[f"{prefix}_percent"] = _group_sum(ids, keys, np.where(is_fixed, 0.0, percent))
+
+    return rates
+
+
+# =========================================================
+# COMPUTATION
+# =========================================================
+def compute_period_earnings(basic_salary, working_hours, overtime_hours=None,
+                            holiday_pay=None, night_differential=None,
+                            sss_contribution=None, philhealth_contribution=None,
+                            pagibig_contribution=None, tax_withheld=None,
+                            other_deductions=None, allowances=None):
+    """
+    Vectorized Payroll.calculate_earnings().
+    Every argument is an array (or None for zeros); returns a dict of arrays
+    with the same keys the Payroll columns use, plus `allowances`, which is
+    added to net pay like the payroll entry screens do.
+    """
+    basic = _column(basic_salary, len(basic_salary))
+    n = len(basic)
+    hours = _column(working_hours, n)
+    overtime_hours = _column(overtime_hours, n)
+    holiday_pay = _column(holiday_pay, n)
+    night_differential = _column(night_differential, n)
+    sss = _column(sss_contribution, n)
+    philhealth = _column(philhealth_contribution, n)
+    pagibig = _column(pagibig_contribution, n)
+    tax = _column(tax_withheld, n)
+    other = _column(other_deductions, n)
+    allowances = _column(allowances, n)
+
+    hourly_rate = np.where(basic > 0, basic / MONTHLY_WORK_HOURS, 0.0)
+    base_earnings = hourly_rate * hours
+    overtime_pay = hourly_rate * OVERTIME_MULTIPLIER * overtime_hours
+    gross_pay = base_earnings + overtime_pay + holiday_pay + night_differential
+    total_deductions = sss + philhealth + pagibig + tax + other
+    net_pay = gross_pay + allowances - total_deductions
+
+    return {
+        "basic_salary": basic,
+        "working_hours": hours,
+        "overtime_hours": overtime_hours,
+        "overtime_pay": overtime_pay,
+        "holiday_pay": holiday_pay,
+        "night_differential": night_differential,
+        "gross_pay": gross_pay,
+        "allowances": allowances,
+        "sss_contribution": sss,
+        "philhealth_contribution": philhealth,
+        "pagibig_contribution": pagibig,
+        "tax_withheld": tax,
+        "other_deductions": other,
+        "total_deductions": total_deductions,
+        "net_pay": net_pay,
+    }
+
+
+def compute_period_payroll(start_date, end_date, employee_ids=None, session=None):
+    """
+    Load and compute a period's payroll (hours, gross pay, government
+    contributions and tax, linked allowances and deductions, net pay)
+    without writing anything.
+    Returns (employee_ids, earnings) where earnings is a dict of arrays.
+    """
+    inputs = load_period_inputs(start_date, end_date, employee_ids, session)
+    ids = inputs["employee_ids"]
+
+    base = compute_period_earnings(inputs["basic_salary"], inputs["working_hours"])
+    rates = load_benefit_rates(ids, session)
+    gross = base["gross_pay"]
+
+    allowances = rates["allowance_fixed"] + gross * rates["allowance_percent"] / 100
+    other_deductions = rates["deduction_fixed"] + gross * rates["deduction_percent"] / 100
+    contributions = compute_contributions(inputs["basic_salary"], gross, session)
+
+    earnings = compute_period_earnings(
+        inputs["basic_salary"], inputs["working_hours"],
+        other_deductions=other_deductions, allowances=allowances,
+        **contributions
+    )
+    return ids, earnings
+
+
+def build_payroll_mappings(payroll_period, employee_ids, earnings, mask=None):
+    """Turn computed arrays into Payroll insert mappings (plain Python values)."""
+    if mask is None:
+        mask = np.ones(len(employee_ids), dtype=bool)
+
+    ids = np.asarray(employee_ids)[mask].tolist()
+    columns = {key: np.asarray(earnings[key])[mask].tolist() for key in PAYROLL_RUN_COLUMNS}
+
+    mappings = []
+    for i, emp_id in enumerate(ids):
+        row = {key: values[i] for key, values in columns.items()}
+        row.update({
+            "employee_id": emp_id,
+            "pay_period_id": payroll_period.id,
+            "pay_period_start": payroll_period.start_date,
+            "pay_period_end": payroll_period.end_date,
+            "source": PAYROLL_SOURCE_RUN,
+        })
+        mappings.append(row)
+    return mappings
+
+
+def existing_payroll_employee_ids(payroll_period, employee_ids=None):
+    """Employee IDs that already have a Payroll row for the period."""
+    query = db.session.query(Payroll.employee_id).filter(
+        Payroll.pay_period_id == payroll_period.id
+    )
+    if employee_ids is not None:
+        query = query.filter(Payroll.employee_id.in_(list(employee_ids)))
+    return np.array([r.employee_id for r in query.all()], dtype=np.int64)
+
+
+def _pending_mask(payroll_period, ids, earnings, employee_ids=None):
+    """Employees with hours in the period and no payroll yet."""
+    existing = existing_payroll_employee_ids(payroll_period, employee_ids)
+    return (earnings["working_hours"] > 0) & ~np.isin(ids, existing)
+
+
+# =========================================================
+# DRY RUN / PREVIEW
+# =========================================================
+PREVIEW_CHUNK_SIZE = 500    # employees computed per streamed chunk
+
+
+def preview_period_payroll(payroll_period, employee_ids=None, chunk_size=PREVIEW_CHUNK_SIZE):
+    """
+    Dry run of a period: yields one dict per employee with the payroll a run
+    would compute, the existing Payroll row (if any) and the changed fields.
+    Employees are computed chunk by chunk so rows can be streamed; nothing
+    is added to the session.
+    Status is "new" (a run would create it), "changed" or "unchanged".
+    """
+    query = db.session.query(Employee.id).order_by(Employee.id)
+    if employee_ids is not None:
+        query = query.filter(Employee.id.in_(list(employee_ids)))
+    all_ids = [r.id for r in query.all()]
+
+    for offset in range(0, len(all_ids), chunk_size):
+        chunk = all_ids[offset:offset + chunk_size]
+        ids, earnings = compute_period_payroll(payroll_period.start_date, payroll_period.end_date, chunk)
+
+        existing = {
+            row.employee_id: row
+            for row in db.session.query(
+                Payroll.employee_id, *[getattr(Payroll, key) for key in PAYROLL_RUN_COLUMNS]
+            ).filter(Payroll.pay_period_id == payroll_period.id, Payroll.employee_id.in_(chunk))
+        }
+        names = dict(
+            db.session.query(Employee.id, Employee.first_name + " " + Employee.last_name)
+            .filter(Employee.id.in_(chunk))
+        )
+        # Both sides rounded half-up to the centavo, as the Money columns store them
+        columns = {key: [round_money(v) for v in np.asarray(earnings[key]).tolist()]
+                   for key in PAYROLL_RUN_COLUMNS}
+
+        for i, emp_id in enumerate(ids.tolist()):
+            computed = {key: values[i] for key, values in columns.items()}
+            current = existing.get(emp_id)
+
+            if current is None:
+                if computed["working_hours"] <= 0:
+                    continue   # a run skips employees without hours
+                status, before, changes = "new", None, {}
+            else:
+                before = {key: round_money(getattr(current, key)) for key in PAYROLL_RUN_COLUMNS}
+                changes = {
+                    key: [before[key], computed[key]]
+                    for key in PAYROLL_RUN_COLUMNS if before[key] != computed[key]
+                }
+                status = "changed" if changes else "unchanged"
+
+            yield {
+                "employee_id": emp_id,
+                "employee_name": names.get(emp_id),
+                "status": status,
+                "computed": computed,
+                "existing": before,
+                "changes": changes,
+            }
+
+
+# =========================================================
+# RUN MODES
+# =========================================================
+def _insert_payrolls(mappings):
+    """Bulk-insert payroll rows."""
+    if not mappings:
+        return
+    db.session.bulk_insert_mappings(Payroll, mappings)
+
+
+def run_period_payroll(payroll_period, employee_ids=None):
+    """
+    Generate Payroll rows for every employee with attendance hours in the
+    period, skipping employees that already have one. Rows are bulk-inserted
+    into the current session; the caller commits.
+    Returns the number of payrolls generated.
+    """
+    ids, earnings = compute_period_payroll(
+        payroll_period.start_date, payroll_period.end_date, employee_ids
+    )
+    if len(ids) == 0:
+        return 0
+
+    mappings = build_payroll_mappings(payroll_period, ids, earnings, _pending_mask(payroll_period, ids, earnings))
+    _insert_payrolls(mappings)
+    return len(mappings)
+
+
+_shard_pool = None
+_shard_pool_lock = threading.Lock()
+
+
+def _get_shard_pool(max_workers=None):
+    """
+    One long-lived process pool for department shards, shared by every
+    request. Workers are started with the spawn context, so they never
+    inherit the web process's threads, locks or database connections.
+    """
+    global _shard_pool
+    with _shard_pool_lock:
+        if _shard_pool is None:
+            _shard_pool = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _shard_pool
+
+
+def _compute_shard(database_uri, department_id, employee_ids, start_date, end_date):
+    """
+    Process-pool worker: compute one department shard on its own engine.
+    Returns plain arrays plus timings so the parent can merge and report.
+    """
+    started = time.perf_counter()
+    engine = create_engine(database_uri)
+    try:
+        with Session(engine) as session:
+            ids, earnings = compute_period_payroll(start_date, end_date, employee_ids, session)
+    finally:
+        engine.dispose()
+
+    return {
+        "department_id": department_id,
+        "employee_ids": ids,
+        "earnings": earnings,
+        "employees": len(ids),
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+
+
+def department_shards(employee_ids=None):
+    """Group employee IDs by department: {department_id or None: [ids]}."""
+    query = db.session.query(Employee.department_id, Employee.id)
+    if employee_ids is not None:
+        query = query.filter(Employee.id.in_(list(employee_ids)))
+
+    shards = {}
+    for dept_id, emp_id in query.order_by(Employee.department_id, Employee.id).all():
+        shards.setdefault(dept_id, []).append(emp_id)
+    return shards
+
+
+def run_period_payroll_sharded(payroll_period, max_workers=None, employee_ids=None):
+    """
+    Same result as run_period_payroll, but each department is computed in a
+    worker of the shared shard pool with its own database engine. Shard
+    results are merged in employee ID order and bulk-inserted into the
+    current session (one transaction; the caller commits).
+    Returns (generated_count, shard_timings).
+    """
+    shards = department_shards(employee_ids)
+    if not shards:
+        return 0, []
+
+    database_uri = db.engine.url.render_as_string(hide_password=False)
+    pool = _get_shard_pool(max_workers)
+    futures = [
+        pool.submit(_compute_shard, database_uri, dept_id, emp_ids,
+                    payroll_period.start_date, payroll_period.end_date)
+        for dept_id, emp_ids in shards.items()
+    ]
+    results = [f.result() for f in futures]
+
+    # Deterministic merge: concatenate shards, then order by employee ID
+    ids = np.concatenate([r["employee_ids"] for r in results])
+    order = np.argsort(ids, kind="stable")
+    ids = ids[order]
+    earnings = {
+        key: np.concatenate([r["earnings"][key] for r in results])[order]
+        for key in results[0]["earnings"]
+    }
+
+    mappings = build_payroll_mappings(payroll_period, ids, earnings, _pending_mask(payroll_period, ids, earnings))
+    _insert_payrolls(mappings)
+
+    timings = sorted(
+        ({"department_id": r["department_id"], "employees": r["employees"], "seconds": r["seconds"]}
+         for r in results),
+        key=lambda t: t["seconds"], reverse=True
+    )
+    return len(mappings), timings
+
+
+# =========================================================
+# CHECKPOINTED RUNS (payroll_run jobs)
+# =========================================================
+PAYROLL_RUN_CHUNK_SIZE = 500    # employees committed per chunk
+RESUMABLE_STATUSES = ("Pending", "Running", "Failed")
+
+
+def start_payroll_run(payroll_period, chunk_size=PAYROLL_RUN_CHUNK_SIZE, started_by=None):
+    """
+    Return the period's unfinished run so it can be resumed, or create a
+    new one. Commits the new job row.
+    """
+    run = PayrollRun.query.filter(
+        PayrollRun.pay_period_id == payroll_period.id,
+        PayrollRun.status.in_(RESUMABLE_STATUSES)
+    ).order_by(PayrollRun.id.desc()).first()
+
+    if run is None:
+        run = PayrollRun(
+            pay_period_id=payroll_period.id,
+            chunk_size=chunk_size or PAYROLL_RUN_CHUNK_SIZE,
+            status="Pending",
+            started_by=started_by
+        )
+        db.session.add(run)
+        db.session.commit()
+    return run
+
+
+def execute_payroll_run(run):
+    """
+    Process a payroll run chunk by chunk (employee ID order) starting after
+    its checkpoint. Each chunk's Payroll rows and the advanced checkpoint
+    are committed in the same transaction, so a restarted run continues
+    after the last committed chunk without redoing it or duplicating rows.
+    The checkpoint only advances from the value this worker read; if
+    another worker moved it, the chunk is rolled back.
+    On error the run is marked Failed (resumable) and the error re-raised.
+    """
+    period = run.pay_period
+    run.status = "Running"
+    run.error = None
+    db.session.commit()
+
+    try:
+        while True:
+            checkpoint = run.last_employee_id
+            chunk = [
+                r.id for r in db.session.query(Employee.id)
+                .filter(Employee.id > checkpoint)
+                .order_by(Employee.id)
+                .limit(run.chunk_size)
+            ]
+            if not chunk:
+                break
+
+            ids, earnings = compute_period_payroll(period.start_date, period.end_date, chunk)
+            mask = _pending_mask(period, ids, earnings, chunk)
+            mappings = build_payroll_mappings(period, ids, earnings, mask)
+            _insert_payrolls(mappings)
+
+            advanced = db.session.execute(
+                update(PayrollRun)
+                .where(PayrollRun.id == run.id, PayrollRun.last_employee_id == checkpoint)
+                .values(
+                    last_employee_id=chunk[-1],
+                    processed_count=PayrollRun.processed_count + len(chunk),
+                    generated_count=PayrollRun.generated_count + len(mappings),
+                    updated_at=datetime.utcnow()
+                )
+            ).rowcount
+            if not advanced:
+                raise RuntimeError(f"Payroll run {run.id} checkpoint was moved by another worker")
+
+            db.session.commit()
+            db.session.refresh(run)
+
+        run.status = "Completed"
+        run.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        run.status = "Failed"
+        run.error = str(e)[:1000]
+        db.session.commit()
+        raise
+
+    return run
+
+
+# =========================================================
+# INCREMENTAL RECOMPUTE (payroll_change marks)
+# =========================================================
+def recompute_changed_payrolls(pay_period_id=None):
+    """
+    Refresh only the Payroll rows whose (employee, period) pair was marked
+    in payroll_change by attendance or benefit link writes. Only rows the
+    run engine wrote are refreshed; approved payrolls and rows entered on
+    the payroll entry screens are left untouched and counted as skipped
+    ("manual" counts the latter). Processed marks are cleared; the caller
+    commits. Returns {"refreshed", "skipped", "manual", "changes"}.
+    """
+    query = db.session.query(PayrollChange.id, PayrollChange.employee_id, PayrollChange.pay_period_id)
+    if pay_period_id is not None:
+        query = query.filter(PayrollChange.pay_period_id == pay_period_id)
+    changes = query.all()
+
+    by_period = {}
+    for change in changes:
+        by_period.setdefault(change.pay_period_id, set()).add(change.employee_id)
+
+    refreshed = skipped = manual = 0
+    for period_id, emp_ids in by_period.items():
+        period = db.session.get(PayrollPeriod, period_id)
+        rows = db.session.query(Payroll.id, Payroll.employee_id, Payroll.status, Payroll.source).filter(
+            Payroll.pay_period_id == period_id,
+            Payroll.employee_id.in_(emp_ids)
+        ).all()
+
+        targets = [r for r in rows if r.status != "Approved" and r.source == PAYROLL_SOURCE_RUN]
+        manual += sum(1 for r in rows if r.status != "Approved" and r.source != PAYROLL_SOURCE_RUN)
+        skipped += len(rows) - len(targets)
+        if not targets:
+            continue
+
+        ids, earnings = compute_period_payroll(
+            period.start_date, period.end_date, {r.employee_id for r in targets}
+        )
+        position = {emp_id: i for i, emp_id in enumerate(ids.tolist())}
+        columns = {key: np.asarray(earnings[key]).tolist() for key in PAYROLL_RUN_COLUMNS}
+
+        updates = []
+        for r in targets:
+            i = position[r.employee_id]
+            row = {key: values[i] for key, values in columns.items()}
+            row["id"] = r.id
+            updates.append(row)
+        db.session.bulk_update_mappings(Payroll, updates)
+        refreshed += len(updates)
+
+    if changes:
+        db.session.query(PayrollChange).filter(
+            PayrollChange.id.in_([c.id for c in changes])
+        ).delete(synchronize_session=False)
+
+    return {"refreshed": refreshed, "skipped": skipped, "manual": manual, "changes": len(changes)}
@@ -0,0 +1,135 @@
+from main_app.extensions import db
+from payroll_system.payroll.models.payroll_models import Payroll, Payslip, NumberSequence
+from sqlalchemy import select, update, insert
+
+
+# =========================================================
+# PAYSLIP NUMBERS
+# =========================================================
+PAYSLIP_SEQUENCE = "payslip"
+PAYSLIP_CHUNK_SIZE = 1000   # payslips inserted (and numbers reserved) per batch
+
+
+def allocate_numbers(name, count):
+    """
+    Reserve `count` consecutive values from a named counter.
+    Returns the first reserved value. The counter row is locked by the
+    UPDATE until the transaction ends, so concurrent runs get disjoint blocks.
+    """
+    seq = NumberSequence.__table__
+    result = db.session.execute(
+        update(seq)
+        .where(seq.c.name == name)
+        .values(next_value=seq.c.next_value + count)
+    )
+    if result.rowcount == 0:
+        # First use of this counter
+        db.session.execute(insert(seq).values(name=name, next_value=1 + count))
+        return 1
+
+    next_value = db.session.execute(
+        select(seq.c.next_value).where(seq.c.name == name)
+    ).scalar_one()
+    return next_value - count
+
+
+def format_payslip_number(pay_period_start, sequence):
+    """e.g. PS-202501-000042"""
+    return f"PS-{pay_period_start.strftime('%Y%m')}-{sequence:06d}"
+
+
+# =========================================================
+# SINGLE PAYSLIP
+# =========================================================
+def generate_payslip(payroll, generated_by_id=None):
+    """Create (and add to the session) the payslip for one payroll."""
+    sequence = allocate_numbers(PAYSLIP_SEQUENCE, 1)
+    payslip = Payslip(
+        employee_id=payroll.employee_id,
+        payroll_id=payroll.id,
+        payslip_number=format_payslip_number(payroll.pay_period_start, sequence),
+        pay_period_start=payroll.pay_period_start,
+        pay_period_end=payroll.pay_period_end,
+        basic_salary=payroll.basic_salary,
+        overtime_pay=payroll.overtime_pay,
+        holiday_pay=payroll.holiday_pay,
+        night_differential=payroll.night_differential,
+        gross_pay=payroll.gross_pay,
+        sss_contribution=payroll.sss_contribution,
+        philhealth_contribution=payroll.philhealth_contribution,
+        pagibig_contribution=payroll.pagibig_contribution,
+        tax_withheld=payroll.tax_withheld,
+        total_deductions=payroll.total_deductions,
+        net_pay=payroll.net_pay,
+        generated_by=generated_by_id
+    )
+    db.session.add(payslip)
+    return payslip
+
+
+# =========================================================
+# BULK PAYSLIPS FOR A PAYROLL PERIOD
+# =========================================================
+# Payroll columns copied onto the payslip (same as generate_payslip)
+PAYSLIP_SOURCE_COLUMNS = [
+    Payroll.id,
+    Payroll.employee_id,
+    Payroll.pay_period_start,
+    Payroll.pay_period_end,
+    Payroll.basic_salary,
+    Payroll.overtime_pay,
+    Payroll.holiday_pay,
+    Payroll.night_differential,
+    Payroll.gross_pay,
+    Payroll.sss_contribution,
+    Payroll.philhealth_contribution,
+    Payroll.pagibig_contribution,
+    Payroll.tax_withheld,
+    Payroll.total_deductions,
+    Payroll.net_pay,
+]
+
+
+def generate_period_payslips(pay_period_id, generated_by_id=None, chunk_size=PAYSLIP_CHUNK_SIZE):
+    """
+    Generate payslips for every payroll of a period that does not have one.
+    Payrolls that already have a payslip are excluded with one anti-join,
+    numbers are reserved one block per chunk and rows are bulk-inserted.
+    The caller commits. Returns the number of payslips generated.
+    """
+    pending = (
+        db.session.query(*PAYSLIP_SOURCE_COLUMNS)
+        .outerjoin(Payslip, Payslip.payroll_id == Payroll.id)
+        .filter(Payroll.pay_period_id == pay_period_id, Payslip.id.is_(None))
+        .order_by(Payroll.id)
+        .all()
+    )
+
+    for offset in range(0, len(pending), chunk_size):
+        chunk = pending[offset:offset + chunk_size]
+        first = allocate_numbers(PAYSLIP_SEQUENCE, len(chunk))
+
+        mappings = []
+        for i, p in enumerate(chunk):
+            mappings.append({
+                "employee_id": p.employee_id,
+                "payroll_id": p.id,
+                "payslip_number": format_payslip_number(p.pay_period_start, first + i),
+                "pay_period_start": p.pay_period_start,
+                "pay_period_end": p.pay_period_end,
+                "basic_salary": p.basic_salary,
+                "overtime_pay": p.overtime_pay,
+                "holiday_pay": p.holiday_pay,
+                "night_differential": p.night_differential,
+                "gross_pay": p.gross_pay,
+                "sss_contribution": p.sss_contribution,
+                "philhealth_contribution": p.philhealth_contribution,
+                "pagibig_contribution": p.pagibig_contribution,
+                "tax_withheld": p.tax_withheld,
+                "total_deductions": p.total_deductions,
+                "net_pay": p.net_pay,
+                "generated_by": generated_by_id,
+            })
+        db.session.bulk_insert_mappings(Payslip, mappings)
+
+    return len(pending)
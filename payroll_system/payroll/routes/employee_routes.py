@@ -1,9 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from payroll_system.payroll.models.user import PayrollUser
-from payroll_system.payroll.models.payroll_models import Employee, Payroll, Payslip
+from payroll_system.payroll.models.payroll_models import Employee, Payroll, Payslip, Allowance, EmployeeAllowance
 from payroll_system.payroll.forms import PayslipSearchForm
 from payroll_system.payroll import db
+from sqlalchemy import func
 from datetime import datetime, date
 import os
 from random import randint
@@ -24,18 +25,22 @@ payroll_employee_bp = Blueprint(
 @login_required
 def dashboard():
     employee = Employee.query.filter_by(user_id=current_user.id).first()
-    # Payroll stats
-    payrolls = Payroll.query.filter_by(employee_id=employee.id).order_by(Payroll.created_at.asc()).all()
-
-    total_disbursed = sum((p.net_pay or 0) for p in payrolls)
-    total_deductions = sum((p.total_deductions or 0) for p in payrolls)
-    total_allowances = sum(
-        (link.allowance.amount or 0)
-        for link in employee.employee_allowances
-        if link.allowance and link.allowance.active
-    )
+    # Payroll stats (integer centavo SUMs in SQL)
+    total_disbursed, total_deductions = db.session.query(
+        func.coalesce(func.sum(Payroll.net_pay), 0),
+        func.coalesce(func.sum(Payroll.total_deductions), 0)
+    ).filter(Payroll.employee_id == employee.id).one()
+    total_allowances = db.session.query(
+        func.coalesce(func.sum(Allowance.amount), 0)
+    ).join(EmployeeAllowance, EmployeeAllowance.allowance_id == Allowance.id).filter(
+        EmployeeAllowance.employee_id == employee.id,
+        Allowance.active.is_(True)
+    ).scalar()
 
     # Chart Data (per payroll period)
+    payrolls = db.session.query(
+        Payroll.pay_period_start, Payroll.gross_pay, Payroll.total_deductions, Payroll.net_pay
+    ).filter(Payroll.employee_id == employee.id).order_by(Payroll.created_at.asc()).all()
     payroll_labels = [p.pay_period_start.strftime("%b %d") for p in payrolls]
     gross_earnings = [p.gross_pay or 0 for p in payrolls]
     deductions = [p.total_deductions or 0 for p in payrolls]
@@ -185,22 +190,31 @@ def payroll_summary():
     
     year = request.args.get('year', date.today().year, type=int)
     
-    # Get payroll summary for the year
-    payrolls = Payroll.query.filter(
+    # Get payroll summary for the year (integer centavo SUMs in SQL)
+    count, gross, deductions, net, sss, philhealth, pagibig, tax = db.session.query(
+        func.count(Payroll.id),
+        func.coalesce(func.sum(Payroll.gross_pay), 0),
+        func.coalesce(func.sum(Payroll.total_deductions), 0),
+        func.coalesce(func.sum(Payroll.net_pay), 0),
+        func.coalesce(func.sum(Payroll.sss_contribution), 0),
+        func.coalesce(func.sum(Payroll.philhealth_contribution), 0),
+        func.coalesce(func.sum(Payroll.pagibig_contribution), 0),
+        func.coalesce(func.sum(Payroll.tax_withheld), 0)
+    ).filter(
         Payroll.employee_id == employee.id,
         Payroll.pay_period_start >= date(year, 1, 1),
         Payroll.pay_period_start <= date(year, 12, 31)
-    ).all()
+    ).one()
     
     summary = {
-        'total_gross_pay': sum(p.gross_pay for p in payrolls),
-        'total_deductions': sum(p.total_deductions for p in payrolls),
-        'total_net_pay': sum(p.net_pay for p in payrolls),
-        'total_sss': sum(p.sss_contribution for p in payrolls),
-        'total_philhealth': sum(p.philhealth_contribution for p in payrolls),
-        'total_pagibig': sum(p.pagibig_contribution for p in payrolls),
-        'total_tax': sum(p.tax_withheld for p in payrolls),
-        'payroll_count': len(payrolls)
+        'total_gross_pay': gross,
+        'total_deductions': deductions,
+        'total_net_pay': net,
+        'total_sss': sss,
+        'total_philhealth': philhealth,
+        'total_pagibig': pagibig,
+        'total_tax': tax,
+        'payroll_count': count
     }
     
     # Get available years
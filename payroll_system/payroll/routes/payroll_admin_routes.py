@@ -1,9 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import (
+    Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file, current_app,
+    Response, stream_template, stream_with_context
+)
 from flask_login import login_required, current_user
 from payroll_system.payroll.models.user import PayrollUser
 from g4f.client import Client
 from payroll_system.payroll.models.payroll_models import (
-    Employee, Payroll, Payslip, PayrollPeriod, Deduction, Allowance, Tax, EmployeeDeduction, EmployeeAllowance
+    Employee, Payroll, Payslip, PayrollPeriod, PayrollRun, Deduction, Allowance, Tax, EmployeeDeduction, EmployeeAllowance,
+    Money, mark_payroll_changes, refresh_compensation_profiles
 )
 from payroll_system.payroll.forms import (
     PayrollPeriodForm, PayrollForm, PayslipForm,
@@ -12,11 +16,19 @@ from payroll_system.payroll.forms import (
 from payroll_system.payroll.utils import (
     admin_required, calculate_payroll_summary, get_current_payroll_period,
     get_payroll_summary,generate_ai_report, generate_department_chart,
-    create_payroll_period, generate_payroll_insights, sync_all_employees_from_hr
+    create_payroll_period, generate_payroll_insights, sync_all_employees_from_hr,
+    get_employee_compensation_data
+)
+from payroll_system.payroll.payroll_run import (
+    run_period_payroll_sharded, start_payroll_run, execute_payroll_run,
+    recompute_changed_payrolls, preview_period_payroll
 )
+from payroll_system.payroll.payslips import generate_payslip, generate_period_payslips
+from payroll_system.payroll.exports import payroll_export_rows, write_payroll_register
 from payroll_system.payroll import db
 from hr_system.hr.models.user import User
 from hr_system.hr.models.hr_models import Department, Employee as HREmployee, Attendance, EmploymentType, Leave
+from hr_system.hr.calendar import working_days_between
 from datetime import datetime, date, timedelta, time
 import os
 from reportlab.lib.pagesizes import A4
@@ -24,6 +36,7 @@ from sqlalchemy import func, case, extract, asc
 from sqlalchemy.orm import joinedload
 from io import BytesIO
 import io
+import json
 import pandas as pd
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
@@ -68,7 +81,7 @@ def payroll_dashboard():
     ).filter(Payroll.pay_period_start >= start_month).scalar() or 0
 
     avg_salary = db.session.query(
-        func.avg(Payroll.net_pay)
+        func.avg(Payroll.net_pay, type_=Money)
     ).filter(Payroll.pay_period_start >= start_month).scalar() or 0
 
     leave_impact = db.session.query(
@@ -182,13 +195,6 @@ def parttime_payroll():
     department_id = request.args.get('department_id', type=int)
     payroll_periods = PayrollPeriod.query.order_by(PayrollPeriod.start_date.desc()).all()
 
-    # Filter employees by department AND employment type "Part-Time"
-    query = Employee.query.filter_by(status="Active")
-    if department_id:
-        query = query.filter_by(department_id=department_id)
-    
-    employees = query.join(Employee.employment_type).filter(EmploymentType.name.ilike("part-time")).all()
-
     # Get selected department name if any
     selected_department = None
     if department_id:
@@ -237,6 +243,8 @@ def parttime_payroll():
             pagibig_contribution=pagibig,
             tax_withheld=tax,
             other_deductions=other,
+            gross_pay=gross_pay,
+            total_deductions=sss + philhealth + pagibig + tax + other,
             net_pay=net_pay
         )
 
@@ -245,26 +253,8 @@ def parttime_payroll():
 
         return jsonify({"status": "success", "net_pay": net_pay, "gross_pay": gross_pay})
 
-    # Pre-fill allowances and deductions
-    employee_data = []
-    for emp in employees:
-        allowance_total = sum([ea.allowance.amount for ea in emp.employee_allowances])
-        sss_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() == "sss"])
-        philhealth_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() == "philhealth"])
-        pagibig_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() in ["pag-ibig", "pagibig"]])
-        existing_payrolls = [p.pay_period_id for p in emp.payrolls]
-
-        employee_data.append({
-            "id": emp.id,
-            "full_name": emp.get_full_name(),
-            "basic_salary": emp.salary or 0,
-            "employment_type": emp.employment_type.name if emp.employment_type else "N/A",
-            "allowance": allowance_total,
-            "sss": sss_total,
-            "philhealth": philhealth_total,
-            "pagibig": pagibig_total,
-            "existing_payrolls": existing_payrolls
-        })
+    # Pre-fill allowances and deductions (compensation profile)
+    employee_data = get_employee_compensation_data("part-time", department_id)
 
     return render_template(
         'payroll/admin/parttime_payroll.html',  
@@ -316,13 +306,6 @@ def regular_payroll():
         if 28 <= (period.end_date - period.start_date).days + 1 <= 31
     ]
 
-    # Filter employees by department AND employment type "Regular"
-    query = Employee.query.filter_by(status="Active")
-    if department_id:
-        query = query.filter_by(department_id=department_id)
-
-    employees = query.join(Employee.employment_type).filter(EmploymentType.name.ilike("regular")).all()
-
     selected_department = None
     if department_id:
         department = Department.query.get(department_id)
@@ -364,6 +347,8 @@ def regular_payroll():
             pagibig_contribution=pagibig,
             tax_withheld=tax,
             other_deductions=other,
+            gross_pay=prorated_salary,
+            total_deductions=total_deductions,
             net_pay=net_pay
         )
 
@@ -378,28 +363,8 @@ def regular_payroll():
             "pay_period": f"{payroll_period.start_date} - {payroll_period.end_date}"
         })
 
-    # Pre-fill allowances, deductions, and existing payrolls
-    employee_data = []
-    for emp in employees:
-        allowance_total = sum([ea.allowance.amount for ea in emp.employee_allowances])
-        sss_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() == "sss"])
-        philhealth_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() == "philhealth"])
-        pagibig_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() in ["pag-ibig", "pagibig"]])
-        
-        payrolls_dict = {p.pay_period_id: p for p in emp.payrolls}
-
-        employee_data.append({
-            "id": emp.id,
-            "full_name": emp.get_full_name(),
-            "basic_salary": emp.salary or 0,
-            "employment_type": emp.employment_type.name if emp.employment_type else "N/A",
-            "allowance": allowance_total,
-            "sss": sss_total,
-            "philhealth": philhealth_total,
-            "pagibig": pagibig_total,
-            "existing_payrolls": list(payrolls_dict.keys()),
-            "payrolls_dict": payrolls_dict
-        })
+    # Pre-fill allowances, deductions, and existing payrolls (compensation profile)
+    employee_data = get_employee_compensation_data("regular", department_id)
 
     return render_template(
         'payroll/admin/regular_payroll.html',
@@ -423,11 +388,8 @@ def get_the_working_days_for_a_month():
     start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
     end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
 
-    # Count all working days in the period (Mon-Fri)
-    total_working_days = sum(
-        1 for d in (start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1))
-        if d.weekday() < 5
-    )
+    # Count all working days in the period (Mon-Fri minus holidays, business calendar)
+    total_working_days = working_days_between(start_date, end_date)
 
     # Count absences from Attendance table
     attendances = Attendance.query.filter(
@@ -454,13 +416,6 @@ def casual_payroll():
     department_id = request.args.get('department_id', type=int)
     payroll_periods = PayrollPeriod.query.order_by(PayrollPeriod.start_date.desc()).all()
 
-    # Filter employees by department AND employment type "Casual"
-    query = Employee.query.filter_by(status="Active")
-    if department_id:
-        query = query.filter_by(department_id=department_id)
-
-    employees = query.join(Employee.employment_type).filter(EmploymentType.name.ilike("casual")).all()
-
     selected_department = None
     if department_id:
         department = Department.query.get(department_id)
@@ -506,6 +461,8 @@ def casual_payroll():
             pagibig_contribution=pagibig,
             tax_withheld=tax,
             other_deductions=other,
+            gross_pay=gross_pay,
+            total_deductions=total_deductions,
             net_pay=net_pay
         )
 
@@ -522,25 +479,7 @@ def casual_payroll():
     # ------------------------------------------
     # GET — Render Casual Payroll Page
     # ------------------------------------------
-    employee_data = []
-    for emp in employees:
-        allowance_total = sum([ea.allowance.amount for ea in emp.employee_allowances])
-        sss_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() == "sss"])
-        philhealth_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() == "philhealth"])
-        pagibig_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() in ["pag-ibig", "pagibig"]])
-        existing_payrolls = [p.pay_period_id for p in emp.payrolls]
-
-        employee_data.append({
-            "id": emp.id,
-            "full_name": emp.get_full_name(),
-            "basic_salary": emp.salary or 0,
-            "employment_type": emp.employment_type.name if emp.employment_type else "N/A",
-            "allowance": allowance_total,
-            "sss": sss_total,
-            "philhealth": philhealth_total,
-            "pagibig": pagibig_total,
-            "existing_payrolls": existing_payrolls
-        })
+    employee_data = get_employee_compensation_data("casual", department_id)
 
     return render_template(
         'payroll/admin/casual_payroll.html',
@@ -702,80 +641,10 @@ def export_payroll_excel():
     department_id = request.args.get('department_id')
     pay_period_id = request.args.get('pay_period_id')
 
-    # Base query with eager loading for related data
-    query = Payroll.query.options(
-        joinedload(Payroll.employee)
-            .joinedload(Employee.employee_deductions)
-            .joinedload(EmployeeDeduction.deduction),
-        joinedload(Payroll.employee)
-            .joinedload(Employee.employee_allowances)
-            .joinedload(EmployeeAllowance.allowance),
-        joinedload(Payroll.employee)
-            .joinedload(Employee.department)
-    ).join(Payroll.employee)
-
-    # Apply filters
-    if search:
-        query = query.filter(
-            (Payroll.employee.first_name.ilike(f"%{search}%")) |
-            (Payroll.employee.last_name.ilike(f"%{search}%"))
-        )
-    if department_id:
-        query = query.filter(Payroll.employee.department_id == department_id)
-    if pay_period_id:
-        query = query.filter(Payroll.pay_period_id == pay_period_id)
-
-    payrolls = query.all()
-
-    # Build DataFrame
-    data = []
-    for p in payrolls:
-        # Safely compute linked deductions and allowances
-        total_linked_deductions = sum(
-            (ed.deduction.amount or 0)
-            for ed in getattr(p.employee, 'employee_deductions', [])
-            if ed.deduction and ed.deduction.active
-        )
-        total_allowances = sum(
-            (ea.allowance.amount or 0)
-            for ea in getattr(p.employee, 'employee_allowances', [])
-            if ea.allowance and ea.allowance.active
-        )
-
-        # Compute totals
-        total_deductions = (p.total_deductions or 0) + total_linked_deductions
-        gross_pay_with_allowances = (p.gross_pay or 0) + total_allowances
-
-        data.append({
-            "Employee ID": p.employee.employee_id,
-            "Name": f"{p.employee.first_name} {p.employee.last_name}",
-            "Department": p.employee.department.name if p.employee.department else "-",
-            "Basic Salary": p.basic_salary or 0,
-            "Overtime Hours": p.overtime_hours or 0,
-            "Overtime Pay": p.overtime_pay or 0,
-            "Holiday Pay": p.holiday_pay or 0,
-            "Night Differential": p.night_differential or 0,
-            "Allowances": total_allowances,
-            "Gross Pay": gross_pay_with_allowances,
-            "SSS": p.sss_contribution or 0,
-            "PhilHealth": p.philhealth_contribution or 0,
-            "Pag-IBIG": p.pagibig_contribution or 0,
-            "Tax Withheld": p.tax_withheld or 0,
-            "Other Deductions": p.other_deductions or 0,
-            "Linked Deductions": total_linked_deductions,
-            "Total Deductions": total_deductions,
-            "Net Pay": p.net_pay or 0,
-            "Status": p.status,
-            "Pay Period": f"{p.pay_period_start} - {p.pay_period_end}"
-        })
-
-    df = pd.DataFrame(data)
-
-    # Save to Excel in memory
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Payroll')
-    output.seek(0)
+    # Stream rows from the database straight into the workbook (bounded memory)
+    output = write_payroll_register(
+        payroll_export_rows(search, department_id=department_id, pay_period_id=pay_period_id)
+    )
 
     # Send file to user
     filename = f"Payroll_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
@@ -1001,6 +870,21 @@ def edit_payroll_period(period_id):
 
 
 
+@payroll_admin_bp.route('/payroll-periods/<int:period_id>/preview')
+@login_required
+@admin_required
+def preview_payroll_period(period_id):
+    """Dry run of a period (no DB writes), streamed as NDJSON or chunked HTML."""
+    period = PayrollPeriod.query.get_or_404(period_id)
+    rows = preview_period_payroll(period)
+
+    if request.args.get('format') == 'ndjson':
+        lines = (json.dumps(row) + "\n" for row in rows)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+    return Response(stream_template('payroll/admin/preview_payroll.html', period=period, rows=rows))
+
+
 @payroll_admin_bp.route('/payroll-periods/delete/<int:period_id>', methods=['POST'])
 @login_required
 @admin_required
@@ -1030,13 +914,12 @@ def payroll_details(period_id):
         .all()
     )
 
-    # Ensure calculations are correct
-    for p in payrolls:
-        p.calculate_earnings()  # updates gross_pay, total_deductions, net_pay
-
-    total_gross = sum(p.gross_pay for p in payrolls)
-    total_deductions = sum(p.total_deductions for p in payrolls)
-    total_net = sum(p.net_pay for p in payrolls)
+    # Totals as integer centavo SUMs in SQL (stored values are authoritative)
+    total_gross, total_deductions, total_net = db.session.query(
+        func.coalesce(func.sum(Payroll.gross_pay), 0),
+        func.coalesce(func.sum(Payroll.total_deductions), 0),
+        func.coalesce(func.sum(Payroll.net_pay), 0)
+    ).filter(Payroll.pay_period_id == period_id).one()
 
     return render_template(
         'payroll/admin/payroll_details.html',
@@ -1214,22 +1097,14 @@ def generate_payslips_by_period():
             flash("Please select a payroll period.", "warning")
             return redirect(url_for('payroll_admin.generate_payslips_by_period'))
 
-        # Fetch payrolls for selected period
-        payrolls = Payroll.query.filter_by(pay_period_id=pay_period_id).all()
-        if not payrolls:
+        # Check the selected period has payrolls
+        has_payrolls = db.session.query(Payroll.id).filter_by(pay_period_id=pay_period_id).first()
+        if not has_payrolls:
             flash("No payrolls found for this pay period.", "warning")
             return redirect(url_for('payroll_admin.generate_payslips_by_period'))
 
-        generated_by_id = current_user.id
-        generated_count = 0
-
-        for payroll in payrolls:
-            existing = Payslip.query.filter_by(payroll_id=payroll.id).first()
-            if existing:
-                continue  # Skip if payslip already exists
-            payslip = generate_payslip(payroll, generated_by_id)
-            db.session.add(payslip)
-            generated_count += 1
+        # Bulk-generate payslips for payrolls that don't have one yet
+        generated_count = generate_period_payslips(pay_period_id, current_user.id)
 
         db.session.commit()
         flash(f"{generated_count} payslips successfully generated for the selected period.", "success")
@@ -1254,40 +1129,13 @@ def generate_single_payslip(payroll_id):
         flash("Payslip already exists for this employee.", "info")
         return redirect(url_for('payroll_admin.view_payslips'))
 
-    payslip = generate_payslip(payroll, current_user.id)
-    db.session.add(payslip)
+    generate_payslip(payroll, current_user.id)
     db.session.commit()
 
     flash(f"Payslip generated for employee ID {payroll.employee_id}.", "success")
     return redirect(url_for('payroll_admin.view_payslips'))
 
 
-# =========================================================
-# HELPER FUNCTION
-# =========================================================
-def generate_payslip(payroll, generated_by_id=None):
-    payslip = Payslip(
-        employee_id=payroll.employee_id,
-        payroll_id=payroll.id,
-        payslip_number=f"PS-{payroll.id}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
-        pay_period_start=payroll.pay_period_start,
-        pay_period_end=payroll.pay_period_end,
-        basic_salary=payroll.basic_salary,
-        overtime_pay=payroll.overtime_pay,
-        holiday_pay=payroll.holiday_pay,
-        night_differential=payroll.night_differential,
-        gross_pay=payroll.gross_pay,
-        sss_contribution=payroll.sss_contribution,
-        philhealth_contribution=payroll.philhealth_contribution,
-        pagibig_contribution=payroll.pagibig_contribution,
-        tax_withheld=payroll.tax_withheld,
-        total_deductions=payroll.total_deductions,
-        net_pay=payroll.net_pay,
-        generated_by=generated_by_id
-    )
-    db.session.add(payslip)
-    return payslip
-
 # =========================================================
 # REVIEW & APPROVE PAYSLIPS (TABLE VIEW)
 # =========================================================
@@ -1802,56 +1650,89 @@ def generate_payrolls():
 
     if not payroll_period:
         payroll_period = PayrollPeriod(
+            period_name=f"{start_date.strftime('%B %Y')} Payroll",
             start_date=start_date,
             end_date=end_date,
-            description=f"{start_date.strftime('%B %Y')} Payroll"
+            pay_date=end_date
         )
         db.session.add(payroll_period)
         db.session.commit()
 
-    # ✅ Step 3: Generate payrolls for each employee
-    employees = Employee.query.all()
-    generated_count = 0
-
-    for emp in employees:
-        logs = Attendance.query.filter(
-            Attendance.employee_id == emp.id,
-            Attendance.date >= start_date,
-            Attendance.date <= end_date
-        ).all()
-
-        total_hours = 0
-        for log in logs:
-            if log.time_in and log.time_out:
-                delta = log.time_out - log.time_in
-                total_hours += delta.total_seconds() / 3600
-
-        if total_hours <= 0:
-            continue
+    # ✅ Step 3: Generate payrolls for the period (set-based, per chunk or per shard)
+    if request.form.get('mode') == 'sharded':
+        # One process-pool worker per department shard
+        generated_count, shard_timings = run_period_payroll_sharded(
+            payroll_period, max_workers=current_app.config.get('PAYROLL_SHARD_WORKERS')
+        )
+        for t in shard_timings:
+            current_app.logger.info(
+                f"Payroll shard dept={t['department_id']} employees={t['employees']} took {t['seconds']}s"
+            )
+        db.session.commit()
+    else:
+        # Chunked, checkpointed run; resubmitting resumes an unfinished one
+        run = start_payroll_run(
+            payroll_period,
+            chunk_size=current_app.config.get('PAYROLL_RUN_CHUNK_SIZE'),
+            started_by=current_user.id
+        )
+        try:
+            execute_payroll_run(run)
+        except Exception as e:
+            current_app.logger.exception(f"Payroll run {run.id} failed")
+            flash(f"Payroll run #{run.id} stopped after employee ID {run.last_employee_id}: {e}. "
+                  f"Generate again to resume.", "danger")
+            return redirect(url_for('payroll_admin.earnings_report'))
+        generated_count = run.generated_count
 
-        existing_payroll = Payroll.query.filter_by(
-            employee_id=emp.id,
-            pay_period_id=payroll_period.id
-        ).first()
+    flash(f"Payroll generated for {generated_count} employees for {start_date.strftime('%B %Y')}.", "success")
+    return redirect(url_for('payroll_admin.earnings_report'))
 
-        if existing_payroll:
-            continue  # skip if already generated
 
-        payroll = Payroll(
-            employee_id=emp.id,
-            pay_period_id=payroll_period.id,
-            pay_period_start=start_date,
-            pay_period_end=end_date,
-            basic_salary=emp.basic_salary or 0,
-            working_hours=total_hours
-        )
-        payroll.calculate_earnings()
-        db.session.add(payroll)
-        generated_count += 1
+@payroll_admin_bp.route('/payroll/admin/payroll_runs/<int:run_id>')
+@admin_required
+@login_required
+def payroll_run_status(run_id):
+    run = PayrollRun.query.get_or_404(run_id)
+    return jsonify(run.to_dict())
+
+
+@payroll_admin_bp.route('/payroll/admin/payroll_runs/<int:run_id>/resume', methods=['POST'])
+@admin_required
+@login_required
+def resume_payroll_run(run_id):
+    run = PayrollRun.query.get_or_404(run_id)
+    if run.status == "Completed":
+        return jsonify({"status": "error", "message": "Payroll run already completed.", "run": run.to_dict()}), 400
+
+    try:
+        execute_payroll_run(run)
+    except Exception as e:
+        current_app.logger.exception(f"Payroll run {run.id} failed")
+        return jsonify({"status": "error", "message": str(e), "run": run.to_dict()}), 500
+
+    return jsonify({"status": "success", "run": run.to_dict()})
 
+
+@payroll_admin_bp.route('/payroll/admin/recompute_payrolls', methods=['POST'])
+@admin_required
+@login_required
+def recompute_payrolls():
+    """Refresh only the payrolls marked dirty by attendance / benefit changes."""
+    pay_period_id = request.form.get('pay_period_id', type=int)
+
+    result = recompute_changed_payrolls(pay_period_id)
     db.session.commit()
-    flash(f"Payroll generated for {generated_count} employees for {start_date.strftime('%B %Y')}.", "success")
-    return redirect(url_for('payroll_admin.earnings_report'))
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({"status": "success", **result})
+
+    message = f"Recomputed {result['refreshed']} payroll(s) from {result['changes']} change(s)."
+    if result['skipped']:
+        message += (f" {result['skipped']} approved or manually entered payroll(s) were left unchanged"
+                    f" ({result['manual']} manual).")
+    flash(message, "success")
+    return redirect(url_for('payroll_admin.view_payrolls', pay_period_id=pay_period_id))
 
 
 @payroll_admin_bp.route('/payroll/admin/earnings_report')
@@ -2044,6 +1925,9 @@ def manage_employee_benefits(employee_id, benefit_type):
                 for aid in selected_ids:
                     db.session.add(EmployeeAllowance(employee_id=employee.id, allowance_id=aid))
 
+            # Bulk delete above bypasses the flush listeners, so mark explicitly
+            mark_payroll_changes(db.session.connection(), employee_ids=[employee.id])
+            refresh_compensation_profiles(db.session.connection(), [employee.id])
             db.session.commit()
             success_message = f"{benefit_type.capitalize()} updated for {employee.first_name}!"
 
@@ -3,7 +3,11 @@ from flask_login import login_required, current_user
 from payroll_system.payroll.models.user import PayrollUser
 from payroll_system.payroll.models.payroll_models import Employee, Payroll, Payslip, PayrollPeriod, EmployeeDeduction, EmployeeAllowance
 from payroll_system.payroll.forms import PayslipForm, PayrollSummaryForm
-from payroll_system.payroll.utils import staff_required, calculate_payroll_summary, get_current_payroll_period
+from payroll_system.payroll.utils import (
+    staff_required, calculate_payroll_summary, get_current_payroll_period, get_employee_compensation_data
+)
+from payroll_system.payroll.payslips import generate_period_payslips
+from payroll_system.payroll.exports import payroll_export_rows, write_payroll_register
 from payroll_system.payroll import db
 from datetime import datetime, date, timedelta
 import os
@@ -15,6 +19,7 @@ from sqlalchemy import case, func, asc
 import random
 from hr_system.hr.models.user import User
 from hr_system.hr.models.hr_models import Attendance, Department, Position, EmploymentType
+from hr_system.hr.calendar import working_days_between
 
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../"))
@@ -206,80 +211,10 @@ def export_payroll_excel():
     department_id = request.args.get('department_id')
     pay_period_id = request.args.get('pay_period_id')
 
-    # Base query with eager loading for related data
-    query = Payroll.query.options(
-        joinedload(Payroll.employee)
-            .joinedload(Employee.employee_deductions)
-            .joinedload(EmployeeDeduction.deduction),
-        joinedload(Payroll.employee)
-            .joinedload(Employee.employee_allowances)
-            .joinedload(EmployeeAllowance.allowance),
-        joinedload(Payroll.employee)
-            .joinedload(Employee.department)
-    ).join(Payroll.employee)
-
-    # Apply filters
-    if search:
-        query = query.filter(
-            (Payroll.employee.first_name.ilike(f"%{search}%")) |
-            (Payroll.employee.last_name.ilike(f"%{search}%"))
-        )
-    if department_id:
-        query = query.filter(Payroll.employee.department_id == department_id)
-    if pay_period_id:
-        query = query.filter(Payroll.pay_period_id == pay_period_id)
-
-    payrolls = query.all()
-
-    # Build DataFrame
-    data = []
-    for p in payrolls:
-        # Safely compute linked deductions and allowances
-        total_linked_deductions = sum(
-            (ed.deduction.amount or 0)
-            for ed in getattr(p.employee, 'employee_deductions', [])
-            if ed.deduction and ed.deduction.active
-        )
-        total_allowances = sum(
-            (ea.allowance.amount or 0)
-            for ea in getattr(p.employee, 'employee_allowances', [])
-            if ea.allowance and ea.allowance.active
-        )
-
-        # Compute totals
-        total_deductions = (p.total_deductions or 0) + total_linked_deductions
-        gross_pay_with_allowances = (p.gross_pay or 0) + total_allowances
-
-        data.append({
-            "Employee ID": p.employee.employee_id,
-            "Name": f"{p.employee.first_name} {p.employee.last_name}",
-            "Department": p.employee.department.name if p.employee.department else "-",
-            "Basic Salary": p.basic_salary or 0,
-            "Overtime Hours": p.overtime_hours or 0,
-            "Overtime Pay": p.overtime_pay or 0,
-            "Holiday Pay": p.holiday_pay or 0,
-            "Night Differential": p.night_differential or 0,
-            "Allowances": total_allowances,
-            "Gross Pay": gross_pay_with_allowances,
-            "SSS": p.sss_contribution or 0,
-            "PhilHealth": p.philhealth_contribution or 0,
-            "Pag-IBIG": p.pagibig_contribution or 0,
-            "Tax Withheld": p.tax_withheld or 0,
-            "Other Deductions": p.other_deductions or 0,
-            "Linked Deductions": total_linked_deductions,
-            "Total Deductions": total_deductions,
-            "Net Pay": p.net_pay or 0,
-            "Status": p.status,
-            "Pay Period": f"{p.pay_period_start} - {p.pay_period_end}"
-        })
-
-    df = pd.DataFrame(data)
-
-    # Save to Excel in memory
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Payroll')
-    output.seek(0)
+    # Stream rows from the database straight into the workbook (bounded memory)
+    output = write_payroll_register(
+        payroll_export_rows(search, department_id=department_id, pay_period_id=pay_period_id)
+    )
 
     # Send file to user
     filename = f"Payroll_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
@@ -346,13 +281,6 @@ def parttime_payroll():
     department_id = request.args.get('department_id', type=int)
     payroll_periods = PayrollPeriod.query.order_by(PayrollPeriod.start_date.desc()).all()
 
-    # Filter employees by department AND employment type "Part-Time"
-    query = Employee.query.filter_by(active=True)
-    if department_id:
-        query = query.filter_by(department_id=department_id)
-    
-    employees = query.join(Employee.employment_type).filter(EmploymentType.name.ilike("part-time")).all()
-
     # Get selected department name if any
     selected_department = None
     if department_id:
@@ -401,6 +329,8 @@ def parttime_payroll():
             pagibig_contribution=pagibig,
             tax_withheld=tax,
             other_deductions=other,
+            gross_pay=gross_pay,
+            total_deductions=sss + philhealth + pagibig + tax + other,
             net_pay=net_pay
         )
 
@@ -409,26 +339,8 @@ def parttime_payroll():
 
         return jsonify({"status": "success", "net_pay": net_pay, "gross_pay": gross_pay})
 
-    # Pre-fill allowances and deductions
-    employee_data = []
-    for emp in employees:
-        allowance_total = sum([ea.allowance.amount for ea in emp.employee_allowances])
-        sss_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() == "sss"])
-        philhealth_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() == "philhealth"])
-        pagibig_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() in ["pag-ibig", "pagibig"]])
-        existing_payrolls = [p.pay_period_id for p in emp.payrolls]
-
-        employee_data.append({
-            "id": emp.id,
-            "full_name": emp.get_full_name(),
-            "basic_salary": emp.salary or 0,
-            "employment_type": emp.employment_type.name if emp.employment_type else "N/A",
-            "allowance": allowance_total,
-            "sss": sss_total,
-            "philhealth": philhealth_total,
-            "pagibig": pagibig_total,
-            "existing_payrolls": existing_payrolls
-        })
+    # Pre-fill allowances and deductions (compensation profile)
+    employee_data = get_employee_compensation_data("part-time", department_id)
 
     return render_template(
         'payroll/staff/parttime_payroll.html',  
@@ -480,13 +392,6 @@ def regular_payroll():
         if 28 <= (period.end_date - period.start_date).days + 1 <= 31
     ]
 
-    # Filter employees by department AND employment type "Regular"
-    query = Employee.query.filter_by(active=True)
-    if department_id:
-        query = query.filter_by(department_id=department_id)
-
-    employees = query.join(Employee.employment_type).filter(EmploymentType.name.ilike("regular")).all()
-
     selected_department = None
     if department_id:
         department = Department.query.get(department_id)
@@ -528,6 +433,8 @@ def regular_payroll():
             pagibig_contribution=pagibig,
             tax_withheld=tax,
             other_deductions=other,
+            gross_pay=prorated_salary,
+            total_deductions=total_deductions,
             net_pay=net_pay
         )
 
@@ -542,28 +449,8 @@ def regular_payroll():
             "pay_period": f"{payroll_period.start_date} - {payroll_period.end_date}"
         })
 
-    # Pre-fill allowances, deductions, and existing payrolls
-    employee_data = []
-    for emp in employees:
-        allowance_total = sum([ea.allowance.amount for ea in emp.employee_allowances])
-        sss_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() == "sss"])
-        philhealth_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() == "philhealth"])
-        pagibig_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() in ["pag-ibig", "pagibig"]])
-        
-        payrolls_dict = {p.pay_period_id: p for p in emp.payrolls}
-
-        employee_data.append({
-            "id": emp.id,
-            "full_name": emp.get_full_name(),
-            "basic_salary": emp.salary or 0,
-            "employment_type": emp.employment_type.name if emp.employment_type else "N/A",
-            "allowance": allowance_total,
-            "sss": sss_total,
-            "philhealth": philhealth_total,
-            "pagibig": pagibig_total,
-            "existing_payrolls": list(payrolls_dict.keys()),
-            "payrolls_dict": payrolls_dict
-        })
+    # Pre-fill allowances, deductions, and existing payrolls (compensation profile)
+    employee_data = get_employee_compensation_data("regular", department_id)
 
     return render_template(
         'payroll/staff/regular_payroll.html',
@@ -587,11 +474,8 @@ def get_the_working_days_for_a_month():
     start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
     end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
 
-    # Count all working days in the period (Mon-Fri)
-    total_working_days = sum(
-        1 for d in (start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1))
-        if d.weekday() < 5
-    )
+    # Count all working days in the period (Mon-Fri minus holidays, business calendar)
+    total_working_days = working_days_between(start_date, end_date)
 
     # Count absences from Attendance table
     attendances = Attendance.query.filter(
@@ -618,13 +502,6 @@ def casual_payroll():
     department_id = request.args.get('department_id', type=int)
     payroll_periods = PayrollPeriod.query.order_by(PayrollPeriod.start_date.desc()).all()
 
-    # Filter employees by department AND employment type "Casual"
-    query = Employee.query.filter_by(active=True)
-    if department_id:
-        query = query.filter_by(department_id=department_id)
-
-    employees = query.join(Employee.employment_type).filter(EmploymentType.name.ilike("casual")).all()
-
     selected_department = None
     if department_id:
         department = Department.query.get(department_id)
@@ -670,6 +547,8 @@ def casual_payroll():
             pagibig_contribution=pagibig,
             tax_withheld=tax,
             other_deductions=other,
+            gross_pay=gross_pay,
+            total_deductions=total_deductions,
             net_pay=net_pay
         )
 
@@ -686,25 +565,7 @@ def casual_payroll():
     # ------------------------------------------
     # GET — Render Casual Payroll Page
     # ------------------------------------------
-    employee_data = []
-    for emp in employees:
-        allowance_total = sum([ea.allowance.amount for ea in emp.employee_allowances])
-        sss_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() == "sss"])
-        philhealth_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() == "philhealth"])
-        pagibig_total = sum([ed.deduction.amount for ed in emp.employee_deductions if ed.deduction.name.lower() in ["pag-ibig", "pagibig"]])
-        existing_payrolls = [p.pay_period_id for p in emp.payrolls]
-
-        employee_data.append({
-            "id": emp.id,
-            "full_name": emp.get_full_name(),
-            "basic_salary": emp.salary or 0,
-            "employment_type": emp.employment_type.name if emp.employment_type else "N/A",
-            "allowance": allowance_total,
-            "sss": sss_total,
-            "philhealth": philhealth_total,
-            "pagibig": pagibig_total,
-            "existing_payrolls": existing_payrolls
-        })
+    employee_data = get_employee_compensation_data("casual", department_id)
 
     return render_template(
         'payroll/staff/casual_payroll.html',
@@ -826,32 +687,6 @@ def distribute_payslip(payslip_id):
     flash(f"Payslip {payslip.payslip_number} marked as distributed and claimed.", "success")
     return redirect(url_for('payroll_staff.view_payslips'))
 
-# =========================================================
-# HELPER FUNCTION
-# =========================================================
-def generate_payslip(payroll, generated_by_id=None):
-    payslip = Payslip(
-        employee_id=payroll.employee_id,
-        payroll_id=payroll.id,
-        payslip_number=f"PS-{payroll.id}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
-        pay_period_start=payroll.pay_period_start,
-        pay_period_end=payroll.pay_period_end,
-        basic_salary=payroll.basic_salary,
-        overtime_pay=payroll.overtime_pay,
-        holiday_pay=payroll.holiday_pay,
-        night_differential=payroll.night_differential,
-        gross_pay=payroll.gross_pay,
-        sss_contribution=payroll.sss_contribution,
-        philhealth_contribution=payroll.philhealth_contribution,
-        pagibig_contribution=payroll.pagibig_contribution,
-        tax_withheld=payroll.tax_withheld,
-        total_deductions=payroll.total_deductions,
-        net_pay=payroll.net_pay,
-        generated_by=generated_by_id
-    )
-    db.session.add(payslip)
-    return payslip
-
 
 # =========================================================
 # GENERATE PAYSLIPS BY PAYROLL PERIOD (SELECT PERIOD)
@@ -869,22 +704,14 @@ def generate_payslips_by_period():
             flash("Please select a payroll period.", "warning")
             return redirect(url_for('payroll_staff.generate_payslips_by_period'))
 
-        # Fetch payrolls for selected period
-        payrolls = Payroll.query.filter_by(pay_period_id=pay_period_id).all()
-        if not payrolls:
+        # Check the selected period has payrolls
+        has_payrolls = db.session.query(Payroll.id).filter_by(pay_period_id=pay_period_id).first()
+        if not has_payrolls:
             flash("No payrolls found for this pay period.", "warning")
             return redirect(url_for('payroll_staff.generate_payslips_by_period'))
 
-        generated_by_id = current_user.id
-        generated_count = 0
-
-        for payroll in payrolls:
-            existing = Payslip.query.filter_by(payroll_id=payroll.id).first()
-            if existing:
-                continue  # Skip if payslip already exists
-            payslip = generate_payslip(payroll, generated_by_id)
-            db.session.add(payslip)
-            generated_count += 1
+        # Bulk-generate payslips for payrolls that don't have one yet
+        generated_count = generate_period_payslips(pay_period_id, current_user.id)
 
         db.session.commit()
         flash(f"{generated_count} payslips successfully generated for the selected period.", "success")
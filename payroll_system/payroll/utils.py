@@ -4,7 +4,8 @@ from payroll_system.payroll.models.user import PayrollUser
 from g4f.client import Client
 #from g4f.providers import Aichat
 from payroll_system.payroll.models.payroll_models import (
-    Employee, Payroll, Payslip, PayrollPeriod, Deduction, Allowance, Tax, EmployeeDeduction, EmployeeAllowance
+    Employee, Payroll, Payslip, PayrollPeriod, Deduction, Allowance, Tax, EmployeeDeduction, EmployeeAllowance,
+    EmployeeCompensationProfile
 )
 from payroll_system.payroll.forms import (
     PayrollPeriodForm, PayrollForm, PayslipForm,
@@ -12,16 +13,20 @@ from payroll_system.payroll.forms import (
 )
 from payroll_system.payroll import db
 from hr_system.hr.models.user import User
-from hr_system.hr.models.hr_models import Department, Employee as HREmployee, Attendance
+from hr_system.hr.models.hr_models import Department, Employee as HREmployee, Attendance, EmploymentType
 from datetime import datetime, date, timedelta
+from collections import defaultdict
 import os
 from sqlalchemy import func, case
 from sqlalchemy.orm import joinedload
 import io
 import pandas as pd
+import numpy as np
+from payroll_system.payroll.contributions import compute_contributions, get_rate_tables
 
 import matplotlib.pyplot as plt
 from datetime import datetime, date, timedelta
+from collections import defaultdict
 from functools import wraps
 from flask import current_app, request, jsonify, abort
 
@@ -85,31 +90,44 @@ def compute_payroll_from_excel(row):
     Compute payroll using the logic shown in the sample payroll Excel file
     and standard PH contribution formulas.
     """
+    frame = pd.DataFrame([{
+        "Monthly Rate": row['Monthly Rate'],
+        "Overtime Hours": row.get('Overtime Hours', 0),
+        "Holiday Hours": row.get('Holiday Hours', 0),
+        "Night Hours": row.get('Night Hours', 0),
+    }])
+    result = compute_payroll_from_excel_frame(frame)
+    return {key: float(values[0]) for key, values in result.items()}
+
+
+def compute_payroll_from_excel_frame(df):
+    """
+    Batch version of compute_payroll_from_excel for a whole sheet.
+    Takes a DataFrame with a 'Monthly Rate' column (optional 'Overtime Hours',
+    'Holiday Hours', 'Night Hours') and returns a dict of arrays.
+    """
+    def hours(column):
+        if column not in df:
+            return np.zeros(len(df))
+        return pd.to_numeric(df[column], errors='coerce').fillna(0).to_numpy(dtype=float)
 
     # --- 1️⃣ Basic Pay ---
-    basic_salary = row['Monthly Rate']  # Monthly salary
+    basic_salary = pd.to_numeric(df['Monthly Rate'], errors='coerce').fillna(0).to_numpy(dtype=float)
     daily_rate = basic_salary / 22  # assuming 22 working days
     hourly_rate = daily_rate / 8
 
-    overtime_hours = row.get('Overtime Hours', 0)
-    holiday_hours = row.get('Holiday Hours', 0)
-    night_hours = row.get('Night Hours', 0)
-
     # --- 2️⃣ Earnings ---
-    overtime_pay = overtime_hours * hourly_rate * 1.25          # 25% OT premium
-    holiday_pay = holiday_hours * hourly_rate * 2.0              # 200% for regular holiday
-    night_differential = night_hours * hourly_rate * 0.10        # 10% of hourly rate
+    overtime_pay = hours('Overtime Hours') * hourly_rate * 1.25    # 25% OT premium
+    holiday_pay = hours('Holiday Hours') * hourly_rate * 2.0        # 200% for regular holiday
+    night_differential = hours('Night Hours') * hourly_rate * 0.10  # 10% of hourly rate
 
     gross_pay = basic_salary + overtime_pay + holiday_pay + night_differential
 
-    # --- 3️⃣ Mandatory Deductions (estimated PH computation) ---
-    sss_contribution = calculate_sss_contribution(basic_salary)
-    philhealth_contribution = calculate_philhealth_contribution(basic_salary)
-    pagibig_contribution = calculate_pagibig_contribution(basic_salary)
-    tax_withheld = calculate_tax_withheld(gross_pay)
+    # --- 3️⃣ Mandatory Deductions (rate tables) ---
+    contributions = compute_contributions(basic_salary, gross_pay)
 
     # --- 4️⃣ Totals ---
-    total_deductions = sss_contribution + philhealth_contribution + pagibig_contribution + tax_withheld
+    total_deductions = sum(contributions.values())
     net_pay = gross_pay - total_deductions
 
     return {
@@ -118,51 +136,29 @@ def compute_payroll_from_excel(row):
         "holiday_pay": holiday_pay,
         "night_differential": night_differential,
         "gross_pay": gross_pay,
-        "sss_contribution": sss_contribution,
-        "philhealth_contribution": philhealth_contribution,
-        "pagibig_contribution": pagibig_contribution,
-        "tax_withheld": tax_withheld,
+        **contributions,
         "total_deductions": total_deductions,
         "net_pay": net_pay
     }
 
 
 # === Helper Functions ===
+# Scalar wrappers over the compiled rate tables (payroll/contributions.py)
 def calculate_sss_contribution(salary):
-    """Approximate SSS contribution (2025 rates)."""
-    if salary <= 3250:
-        return 135
-    elif salary >= 24750:
-        return 1125
-    else:
-        return 0.045 * salary  # 4.5% (employee share)
+    """SSS employee share for one salary."""
+    return float(get_rate_tables()["sss"]([salary])[0])
 
 def calculate_philhealth_contribution(salary):
-    """PhilHealth 2025: 5% of monthly basic salary, divided equally (employee share = 2.5%)."""
-    base = min(max(salary, 10000), 100000)  # salary floor/ceiling
-    return (base * 0.05) / 2
+    """PhilHealth employee share for one salary."""
+    return float(get_rate_tables()["philhealth"]([salary])[0])
 
 def calculate_pagibig_contribution(salary):
-    """Pag-IBIG: 1% or 2% depending on salary."""
-    if salary <= 1500:
-        return salary * 0.01
-    else:
-        return salary * 0.02
+    """Pag-IBIG employee share for one salary."""
+    return float(get_rate_tables()["pagibig"]([salary])[0])
 
 def calculate_tax_withheld(gross_pay):
-    """Approximate tax using PH TRAIN law brackets."""
-    if gross_pay <= 20833:
-        return 0
-    elif gross_pay <= 33333:
-        return (gross_pay - 20833) * 0.20
-    elif gross_pay <= 66667:
-        return 2500 + (gross_pay - 33333) * 0.25
-    elif gross_pay <= 166667:
-        return 10833 + (gross_pay - 66667) * 0.30
-    elif gross_pay <= 666667:
-        return 40833.33 + (gross_pay - 166667) * 0.32
-    else:
-        return 200833.33 + (gross_pay - 666667) * 0.35
+    """Withholding tax from the active tax brackets."""
+    return float(get_rate_tables()["tax"]([gross_pay])[0])
 
 def calculate_overtime_pay(basic_salary, overtime_hours):
     """Calculate overtime pay"""
@@ -229,25 +225,36 @@ def get_payroll_periods():
     return PayrollPeriod.query.filter_by(status='Open').all()
 
 def calculate_payroll_summary(period_id, department=None):
-    """Calculate payroll summary for a period"""
-    from payroll.models.payroll_models import Payroll, Employee
-    
-    query = Payroll.query.filter_by(id=period_id)
-    
+    """Calculate payroll summary for a period (integer centavo SUMs in SQL)"""
+    query = db.session.query(
+        func.count(Payroll.id),
+        func.coalesce(func.sum(Payroll.gross_pay), 0),
+        func.coalesce(func.sum(Payroll.total_deductions), 0),
+        func.coalesce(func.sum(Payroll.net_pay), 0),
+        func.coalesce(func.sum(Payroll.sss_contribution), 0),
+        func.coalesce(func.sum(Payroll.philhealth_contribution), 0),
+        func.coalesce(func.sum(Payroll.pagibig_contribution), 0),
+        func.coalesce(func.sum(Payroll.tax_withheld), 0)
+    ).filter(Payroll.pay_period_id == period_id)
+
     if department:
-        query = query.join(Employee).filter(Employee.department == department)
-    
-    payrolls = query.all()
-    
+        query = query.join(Employee, Payroll.employee_id == Employee.id)
+        if str(department).isdigit():
+            query = query.filter(Employee.department_id == int(department))
+        else:
+            query = query.join(Department, Employee.department_id == Department.id).filter(Department.name == department)
+
+    count, gross, deductions, net, sss, philhealth, pagibig, tax = query.one()
+
     summary = {
-        'total_employees': len(payrolls),
-        'total_gross_pay': sum(p.gross_pay for p in payrolls),
-        'total_deductions': sum(p.total_deductions for p in payrolls),
-        'total_net_pay': sum(p.net_pay for p in payrolls),
-        'total_sss': sum(p.sss_contribution for p in payrolls),
-        'total_philhealth': sum(p.philhealth_contribution for p in payrolls),
-        'total_pagibig': sum(p.pagibig_contribution for p in payrolls),
-        'total_tax': sum(p.tax_withheld for p in payrolls)
+        'total_employees': count,
+        'total_gross_pay': gross,
+        'total_deductions': deductions,
+        'total_net_pay': net,
+        'total_sss': sss,
+        'total_philhealth': philhealth,
+        'total_pagibig': pagibig,
+        'total_tax': tax
     }
     
     return summary
@@ -468,11 +475,12 @@ def process_payroll_for_employee(employee_id, period_id):
     # Calculate gross pay
     gross_pay = basic_salary + overtime_pay + holiday_pay + night_differential
     
-    # Calculate deductions
-    sss_contribution = calculate_sss_contribution(basic_salary)
-    philhealth_contribution = calculate_philhealth_contribution(basic_salary)
-    pagibig_contribution = calculate_pagibig_contribution(basic_salary)
-    tax_withheld = calculate_tax_withheld(gross_pay)
+    # Calculate deductions (one rate table lookup for all four)
+    contributions = {key: float(values[0]) for key, values in compute_contributions([basic_salary], [gross_pay]).items()}
+    sss_contribution = contributions["sss_contribution"]
+    philhealth_contribution = contributions["philhealth_contribution"]
+    pagibig_contribution = contributions["pagibig_contribution"]
+    tax_withheld = contributions["tax_withheld"]
     
     total_deductions = sss_contribution + philhealth_contribution + pagibig_contribution + tax_withheld
     
@@ -507,3 +515,53 @@ def process_payroll_for_employee(employee_id, period_id):
         return None
 
 
+# =========================================================
+# PAYROLL ENTRY SCREENS (regular / casual / part-time)
+# =========================================================
+def get_employee_compensation_data(employment_type, department_id=None):
+    """
+    Active employees of one employment type with their pre-filled allowance
+    and contributions (read from the maintained employee_compensation_profile
+    table) and existing payroll periods (one grouped payroll query).
+    """
+    query = (
+        db.session.query(
+            Employee.id, Employee.first_name, Employee.middle_name, Employee.last_name,
+            Employee.salary, EmploymentType.name.label("employment_type"),
+            EmployeeCompensationProfile.allowance_total,
+            EmployeeCompensationProfile.sss,
+            EmployeeCompensationProfile.philhealth,
+            EmployeeCompensationProfile.pagibig,
+        )
+        .join(EmploymentType, Employee.employment_type_id == EmploymentType.id)
+        .outerjoin(EmployeeCompensationProfile, EmployeeCompensationProfile.employee_id == Employee.id)
+        .filter(Employee.status == "Active", EmploymentType.name.ilike(employment_type))
+    )
+    if department_id:
+        query = query.filter(Employee.department_id == department_id)
+
+    rows = query.order_by(Employee.id).all()
+    periods = defaultdict(list)
+    period_rows = (
+        db.session.query(Payroll.employee_id, Payroll.pay_period_id)
+        .filter(Payroll.employee_id.in_(query.with_entities(Employee.id)))
+        .distinct()
+        .order_by(Payroll.employee_id, Payroll.pay_period_id)
+    )
+    for employee_id, pay_period_id in period_rows:
+        periods[employee_id].append(pay_period_id)
+
+    employee_data = []
+    for row in rows:
+        employee_data.append({
+            "id": row.id,
+            "full_name": f"{row.first_name} {row.middle_name or ''} {row.last_name}".strip(),
+            "basic_salary": row.salary or 0,
+            "employment_type": row.employment_type or "N/A",
+            "allowance": row.allowance_total or 0,
+            "sss": row.sss or 0,
+            "philhealth": row.philhealth or 0,
+            "pagibig": row.pagibig or 0,
+            "existing_payrolls": periods[row.id]
+        })
+    return employee_data
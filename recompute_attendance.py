@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Recompute attendance working hours, status and late computations
+for a date range, e.g. after the office schedule rule changes.
+
+    python recompute_attendance.py --start 2025-01-01 --end 2025-12-31
+    python recompute_attendance.py --start 2025-01-01 --end 2025-03-31 --department "Hospital"
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from main_app import create_app, db
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}', expected YYYY-MM-DD")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute attendance working hours, status and tardiness.")
+    parser.add_argument("--start", type=parse_date, required=True, help="first date (YYYY-MM-DD)")
+    parser.add_argument("--end", type=parse_date, required=True, help="last date (YYYY-MM-DD)")
+    parser.add_argument("--department", help="department id or name (default: all)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="rows per batch")
+    args = parser.parse_args(argv)
+
+    if args.start > args.end:
+        parser.error("--start must not be after --end")
+
+    app = create_app()
+    with app.app_context():
+        from hr_system.hr.models.hr_models import Department
+        from hr_system.hr.attendance_import import recompute_attendance, RECOMPUTE_CHUNK_SIZE
+
+        department_id = None
+        if args.department:
+            department = (
+                Department.query.get(int(args.department)) if args.department.isdigit()
+                else Department.query.filter_by(name=args.department).first()
+            )
+            if not department:
+                print(f"❌ Department not found: {args.department}")
+                return 1
+            department_id = department.id
+
+        def progress(done, total):
+            print(f"\r   {done}/{total} rows ({done * 100 // max(total, 1)}%)", end="", flush=True)
+
+        print(f"🔄 Recomputing attendance {args.start} to {args.end}"
+              + (f" for department {args.department}" if args.department else ""))
+        started = time.perf_counter()
+        result = recompute_attendance(
+            args.start, args.end, department_id,
+            chunk_size=args.chunk_size or RECOMPUTE_CHUNK_SIZE, progress=progress,
+        )
+        print()
+        print(f"✅ {result['rows']} rows checked, {result['updated']} updated, "
+              f"{result['late']} late, in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
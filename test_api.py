@@ -2,6 +2,7 @@ from main_app.extensions import db
 from main_app import create_app
 from hr_system.hr.models.hr_models import Employee, Attendance
 from hr_system.hr.models.user import User
+from hr_system.hr.calendar import get_business_calendar
 from datetime import datetime, date, timedelta, time
 import random
 
@@ -29,28 +30,17 @@ def generate_attendance_jan_to_nov():
         end_date = date(2025, 12, 30)
         delta = timedelta(days=1)
 
-        # Philippine holidays
-        holidays = [
-            date(2025, 1, 1),
-            date(2025, 2, 25),
-            date(2025, 3, 31),
-            date(2025, 4, 9),
-            date(2025, 5, 1),
-            date(2025, 6, 12),
-            date(2025, 8, 21),
-            date(2025, 8, 25),
-            date(2025, 11, 1),
-            date(2025, 11, 2),
-        ]
+        # Weekdays minus holidays (business calendar / holiday table)
+        calendar = get_business_calendar(start_date, end_date)
+        working_dates = []
+        current_date = start_date
+        while current_date <= end_date:
+            if calendar.is_working_day(current_date):
+                working_dates.append(current_date)
+            current_date += delta
 
         for emp in employees:
-            current_date = start_date
-            attendance_dates = []
-
-            while current_date <= end_date:
-                if current_date.weekday() < 5 and current_date not in holidays:
-                    attendance_dates.append(current_date)
-                current_date += delta
+            attendance_dates = list(working_dates)
 
             total_days = len(attendance_dates)
             late_count = max(5, total_days // 20)